@@ -0,0 +1,493 @@
+import logging
+import os
+import queue
+import re
+import socket
+import tempfile
+import threading
+import time
+
+
+class LocalFtpServer(object):
+    '''
+    pyftpdlib FTP server over a local folder, counting the commands it serves
+    '''
+
+    def __init__(self,
+                 root_path: str,
+                 username: str='fetch_dlz',
+                 password: str='fetch_dlz',
+                 host: str='127.0.0.1',
+                 port: int=0):
+
+        self.root_path = root_path
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = port
+
+        self.command_count = 0
+
+        self._server = None
+        self._thread = None
+
+
+    def start(self):
+
+        from pyftpdlib.authorizers import DummyAuthorizer
+        from pyftpdlib.handlers import FTPHandler
+        from pyftpdlib.ioloop import IOLoop
+        from pyftpdlib.servers import ThreadedFTPServer
+
+        # with a handler already in place pyftpdlib leaves the level alone
+        ftpd_logger = logging.getLogger('pyftpdlib')
+        if not ftpd_logger.handlers:
+            ftpd_logger.addHandler(logging.NullHandler())
+        ftpd_logger.setLevel(logging.WARNING)
+
+        local_server = self
+
+        class CountingFtpHandler(FTPHandler):
+
+            def pre_process_command(self, line, cmd, arg):
+                local_server.command_count += 1
+                return super().pre_process_command(line, cmd, arg)
+
+        authorizer = DummyAuthorizer()
+        authorizer.add_user(self.username, self.password, self.root_path, perm='elradfmwMT')
+        CountingFtpHandler.authorizer = authorizer
+        CountingFtpHandler.banner = 'FtpFetcher benchmark server'
+
+        # an IOLoop of its own, as closing the shared one breaks later servers
+        self._server = ThreadedFTPServer((self.host, self.port), CountingFtpHandler, ioloop=IOLoop())
+        self.port = self._server.address[1]
+
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={'timeout': 0.5},
+                                        name='LocalFtpServer')
+        self._thread.daemon = True
+        self._thread.start()
+
+        return self.port
+
+
+    def stop(self):
+
+        if self._server is not None:
+            self._server.close_all()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+        return
+
+
+class LocalSftpServer(object):
+    '''
+    paramiko SFTP server over a local folder, counting the requests it serves
+    '''
+
+    def __init__(self,
+                 root_path: str,
+                 username: str='fetch_dlz',
+                 password: str='fetch_dlz',
+                 host: str='127.0.0.1',
+                 port: int=0):
+
+        self.root_path = root_path
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = port
+
+        self.command_count = 0
+        self.known_hosts_file = None
+
+        self._host_key = None
+        self._listen_sock = None
+        self._transports = []
+        self._is_running = False
+
+
+    def start(self):
+
+        import paramiko
+
+        self._host_key = paramiko.RSAKey.generate(2048)
+
+        server_logger = logging.getLogger('Benchmarks.sftp_server')
+        server_logger.addHandler(logging.NullHandler())
+        server_logger.propagate = False
+
+        self._listen_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listen_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listen_sock.bind((self.host, self.port))
+        self._listen_sock.listen(64)
+        self.port = self._listen_sock.getsockname()[1]
+
+        # pysftp looks host keys up by host name alone, whatever the port,
+        # and paramiko, as OpenSSH does, by [host]:port off port 22
+        known_hosts_fd, self.known_hosts_file = tempfile.mkstemp(prefix='known_hosts_')
+        os.close(known_hosts_fd)
+        self.add_known_host(self.host)
+        self.add_known_host(self.host, self.port)
+
+        self._is_running = True
+        accept_thread = threading.Thread(target=self._accept_loop, name='LocalSftpServer')
+        accept_thread.daemon = True
+        accept_thread.start()
+
+        return self.port
+
+
+    def add_known_host(self,
+                       host: str,
+                       port: int=22):
+        '''
+        Vouch for the host key under another address, e.g. that of a proxy
+        '''
+
+        known_host = host if port == 22 else '[%s]:%d' % (host, port)
+        with open(self.known_hosts_file, 'a') as known_hosts:
+            known_hosts.write('%s %s %s\n' % (known_host, self._host_key.get_name(), self._host_key.get_base64()))
+
+        return
+
+
+    def stop(self):
+
+        self._is_running = False
+        if self._listen_sock is not None:
+            self._listen_sock.close()
+            self._listen_sock = None
+        for transport in self._transports:
+            transport.close()
+        self._transports = []
+        if self.known_hosts_file is not None and os.path.exists(self.known_hosts_file):
+            os.remove(self.known_hosts_file)
+
+        return
+
+
+    def _accept_loop(self):
+
+        import paramiko
+
+        local_server = self
+
+        class PasswordServer(paramiko.ServerInterface):
+
+            def check_auth_password(self, username, password):
+                if username == local_server.username and password == local_server.password:
+                    return paramiko.AUTH_SUCCESSFUL
+                return paramiko.AUTH_FAILED
+
+            def get_allowed_auths(self, username):
+                return 'password'
+
+            def check_channel_request(self, kind, chanid):
+                if kind == 'session':
+                    return paramiko.OPEN_SUCCEEDED
+                return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+        class CountingSftpServer(paramiko.SFTPServer):
+
+            def _process(self, t, request_number, msg):
+                local_server.command_count += 1
+                return super()._process(t, request_number, msg)
+
+        sftp_interface_class = _get_sftp_interface_class()
+
+        while self._is_running:
+            try:
+                client_sock, _client_addr = self._listen_sock.accept()
+            except OSError:
+                break
+            # as sshd does, so small replies are not held back by Nagle
+            client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport = paramiko.Transport(client_sock)
+            # clients that simply exit would otherwise log a reset each
+            transport.set_log_channel('Benchmarks.sftp_server')
+            transport.add_server_key(self._host_key)
+            transport.set_subsystem_handler('sftp', CountingSftpServer, sftp_interface_class, self.root_path)
+            transport.start_server(server=PasswordServer())
+            self._transports.append(transport)
+
+        return
+
+
+def _get_sftp_interface_class():
+
+    import paramiko
+
+    class _LocalSftpHandle(paramiko.SFTPHandle):
+
+        def stat(self):
+            try:
+                return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+
+        def chattr(self, attr):
+            return paramiko.SFTP_OK
+
+    class _LocalSftpInterface(paramiko.SFTPServerInterface):
+        '''
+        SFTP server interface confined to a local root folder
+        '''
+
+        def __init__(self, server, root_path, *args, **kwargs):
+            super().__init__(server, *args, **kwargs)
+            self.root_path = root_path
+
+        def _local_path(self, path):
+            return os.path.join(self.root_path, self.canonicalize(path).lstrip('/'))
+
+        def canonicalize(self, path):
+            return os.path.normpath('/' + path).replace('//', '/')
+
+        def list_folder(self, path):
+            local_path = self._local_path(path)
+            try:
+                sftp_attrs_list = []
+                for file_name in os.listdir(local_path):
+                    sftp_attrs = paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(local_path, file_name)))
+                    sftp_attrs.filename = file_name
+                    sftp_attrs_list.append(sftp_attrs)
+                return sftp_attrs_list
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+
+        def stat(self, path):
+            try:
+                return paramiko.SFTPAttributes.from_stat(os.stat(self._local_path(path)))
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+
+        def lstat(self, path):
+            try:
+                return paramiko.SFTPAttributes.from_stat(os.lstat(self._local_path(path)))
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+
+        def open(self, path, flags, attr):
+            local_path = self._local_path(path)
+            try:
+                file_desc = os.open(local_path, flags | getattr(os, 'O_BINARY', 0), 0o644)
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+            if flags & os.O_WRONLY:
+                file_mode = 'ab' if flags & os.O_APPEND else 'wb'
+            elif flags & os.O_RDWR:
+                file_mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+            else:
+                file_mode = 'rb'
+            try:
+                local_file = os.fdopen(file_desc, file_mode)
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+            sftp_handle = _LocalSftpHandle(flags)
+            sftp_handle.filename = local_path
+            sftp_handle.readfile = local_file
+            sftp_handle.writefile = local_file
+            return sftp_handle
+
+        def remove(self, path):
+            try:
+                os.remove(self._local_path(path))
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+            return paramiko.SFTP_OK
+
+        def rename(self, oldpath, newpath):
+            try:
+                os.rename(self._local_path(oldpath), self._local_path(newpath))
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+            return paramiko.SFTP_OK
+
+        def mkdir(self, path, attr):
+            try:
+                os.mkdir(self._local_path(path))
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+            return paramiko.SFTP_OK
+
+        def rmdir(self, path):
+            try:
+                os.rmdir(self._local_path(path))
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+            return paramiko.SFTP_OK
+
+    return _LocalSftpInterface
+
+
+class LatencyProxy(object):
+    '''
+    TCP proxy delaying traffic by half the round trip time in each direction,
+    optionally rewriting FTP PASV replies so data connections are delayed too
+    '''
+
+    pasv_pattern = re.compile(rb'^227 .*\((\d+),(\d+),(\d+),(\d+),(\d+),(\d+)\)', re.MULTILINE)
+
+    def __init__(self,
+                 target_host: str,
+                 target_port: int,
+                 rtt_ms: float=0.0,
+                 rewrite_pasv: bool=False,
+                 listen_host: str='127.0.0.1',
+                 single_use: bool=False):
+
+        self.target_host = target_host
+        self.target_port = target_port
+        self.one_way_delay = rtt_ms / 2000.0
+        self.rewrite_pasv = rewrite_pasv
+        self.listen_host = listen_host
+        self.single_use = single_use
+
+        self.port = None
+        self._listen_sock = None
+        self._is_running = False
+
+
+    def start(self):
+
+        self._listen_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listen_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listen_sock.bind((self.listen_host, 0))
+        self._listen_sock.listen(64)
+        self.port = self._listen_sock.getsockname()[1]
+
+        self._is_running = True
+        accept_thread = threading.Thread(target=self._accept_loop, name='LatencyProxy-%d' % self.port)
+        accept_thread.daemon = True
+        accept_thread.start()
+
+        return self.port
+
+
+    def stop(self):
+
+        self._is_running = False
+        if self._listen_sock is not None:
+            try:
+                self._listen_sock.close()
+            except OSError:
+                pass
+            self._listen_sock = None
+
+        return
+
+
+    def _accept_loop(self):
+
+        while self._is_running:
+            try:
+                client_sock, _client_addr = self._listen_sock.accept()
+            except OSError:
+                break
+            try:
+                server_sock = socket.create_connection((self.target_host, self.target_port))
+            except OSError:
+                client_sock.close()
+                continue
+            for sock in (client_sock, server_sock):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._start_pump(client_sock, server_sock, rewrite_pasv=False)
+            self._start_pump(server_sock, client_sock, rewrite_pasv=self.rewrite_pasv)
+            if self.single_use:
+                self.stop()
+
+        return
+
+
+    def _start_pump(self,
+                    source_sock,
+                    target_sock,
+                    rewrite_pasv: bool):
+
+        # a reader stamps each chunk with its due time and a writer releases
+        # it then, so latency is added without throttling the throughput
+        chunk_queue = queue.Queue()
+
+        def read_loop():
+            while True:
+                try:
+                    data_chunk = source_sock.recv(262144)
+                except OSError:
+                    data_chunk = b''
+                if data_chunk and rewrite_pasv:
+                    data_chunk = self._rewrite_pasv_reply(data_chunk)
+                chunk_queue.put((time.time() + self.one_way_delay, data_chunk))
+                if not data_chunk:
+                    break
+
+        def write_loop():
+            while True:
+                due_time, data_chunk = chunk_queue.get()
+                delay = due_time - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                if not data_chunk:
+                    break
+                try:
+                    target_sock.sendall(data_chunk)
+                except OSError:
+                    break
+            for sock in (target_sock, source_sock):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                sock.close()
+
+        for loop_func in (read_loop, write_loop):
+            pump_thread = threading.Thread(target=loop_func)
+            pump_thread.daemon = True
+            pump_thread.start()
+
+        return
+
+
+    def _rewrite_pasv_reply(self,
+                            data_chunk):
+
+        pasv_match = self.pasv_pattern.search(data_chunk)
+        if pasv_match is None:
+            return data_chunk
+
+        numbers = [int(number) for number in pasv_match.groups()]
+        data_proxy = LatencyProxy('.'.join(str(number) for number in numbers[:4]),
+                                  numbers[4] * 256 + numbers[5],
+                                  rtt_ms=self.one_way_delay * 2000.0,
+                                  listen_host=self.listen_host,
+                                  single_use=True)
+        data_port = data_proxy.start()
+
+        host_numbers = self.listen_host.replace('.', ',').encode('ascii')
+        pasv_reply = b'227 Entering Passive Mode (%s,%d,%d).' % (host_numbers, data_port // 256, data_port % 256)
+
+        return data_chunk[:pasv_match.start()] + pasv_reply + data_chunk[pasv_match.end():]
+
+
+class StaticCredentials(object):
+    '''
+    Stands in for the keyring lookup with a fixed password
+    '''
+
+    def __init__(self,
+                 password: str):
+
+        self.password = password
+
+
+    def get_pwd_via_keyring(self, key, login, **kwargs):
+        return self.password, None
+
+
+    def __getattr__(self, attr_name):
+        # everything else, e.g. expand_path and create_path, as usual
+        from FetcherClasses.Classes.UtilityCommons import DynamicUtilities
+        return getattr(DynamicUtilities(), attr_name)
@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+'''
+Cold start cost of the fetcher, measured in fresh interpreters: the import of
+FetcherClasses.FtpOps, then that of each backend as get_connection loads it
+
+    python Benchmarks/ImportTimeBenchmark.py --runs 20
+    python Benchmarks/ImportTimeBenchmark.py --optimize
+    python Benchmarks/ImportTimeBenchmark.py --importtime 15
+
+python -O reads its own .opt-1.pyc files, so compile those first, e.g. with
+python -O -m compileall, or every run pays for compiling the dependencies
+'''
+
+package_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# run in the child, printing one JSON line of phase timings in seconds
+child_source = '''
+import json, sys, time
+sys.path.insert(0, %r)
+start_time = time.perf_counter()
+import FetcherClasses.FtpOps
+imported_time = time.perf_counter()
+from FetcherClasses.FtpOps import FtpScanner
+ftp_scanner = FtpScanner(host_url='127.0.0.1')
+created_time = time.perf_counter()
+backend = %r
+if backend == 'sftp':
+    import pysftp
+elif backend == 'ftp':
+    import ftputil
+elif backend == 'paramiko':
+    import paramiko
+backend_time = time.perf_counter()
+print(json.dumps({'import_fetcher': imported_time - start_time,
+                  'create_scanner': created_time - imported_time,
+                  'import_backend': backend_time - created_time,
+                  'modules_loaded': len(sys.modules)}))
+'''
+
+
+def time_cold_start(backend: str,
+                    runs: int=10,
+                    optimize: bool=False):
+
+    samples = []
+
+    # under -O the ensure_annotations checks, and the ensure import, are skipped
+    interpreter_args = [sys.executable, '-W', 'ignore'] + (['-O'] if optimize else [])
+
+    for _run_nbr in range(runs):
+        start_time = time.perf_counter()
+        child_output = subprocess.run(interpreter_args + ['-c', child_source % (package_path, backend)],
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.DEVNULL,
+                                      check=True).stdout
+        sample = json.loads(child_output.decode('utf-8').strip().splitlines()[-1])
+        sample['process_total'] = time.perf_counter() - start_time
+        samples.append(sample)
+
+    return dict((phase_name, statistics.median(sample[phase_name] for sample in samples))
+                for phase_name in samples[0])
+
+
+def time_bare_interpreter(runs: int=10):
+
+    samples = []
+
+    for _run_nbr in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        samples.append(time.perf_counter() - start_time)
+
+    return statistics.median(samples)
+
+
+def get_import_profile(top_count: int=15):
+    '''
+    Return the top_count (cumulative microseconds, module) of python -X importtime
+    '''
+
+    child_output = subprocess.run([sys.executable, '-W', 'ignore', '-X', 'importtime', '-c',
+                                   'import sys; sys.path.insert(0, %r); import FetcherClasses.FtpOps' % package_path],
+                                  stderr=subprocess.PIPE,
+                                  check=True).stderr
+
+    import_profile = []
+    for line in child_output.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self_us, cumulative_us, module_name = line[len('import time:'):].split('|')
+        import_profile.append((int(cumulative_us), module_name.strip()))
+
+    return sorted(import_profile, reverse=True)[:top_count]
+
+
+if __name__ == '__main__':
+
+    arg_parser = argparse.ArgumentParser(description='FtpFetcher import time benchmark')
+    arg_parser.add_argument('--runs', type=int, default=10, help='fresh interpreters per measurement, the median is reported')
+    arg_parser.add_argument('--importtime', type=int, default=0, metavar='N', help='also list the N slowest imports')
+    arg_parser.add_argument('--optimize', action='store_true', help='run the fetcher under python -O')
+    args = arg_parser.parse_args()
+
+    bare_seconds = time_bare_interpreter(args.runs)
+    print('%-8s %10s %10s %10s %10s %8s' % ('', 'fetcher', 'scanner', 'backend', 'process', 'modules'))
+    print('%-8s %10s %10s %10s %8.1fms %8s' % ('python', '', '', '', bare_seconds * 1000.0, ''))
+    # ftplib comes with the fetcher, so its backend column is empty
+    for backend in ('none', 'ftp', 'ftplib', 'sftp', 'paramiko'):
+        timings = time_cold_start(backend, args.runs, optimize=args.optimize)
+        print('%-8s %8.1fms %8.1fms %8.1fms %8.1fms %8d' % (backend,
+                                                             timings['import_fetcher'] * 1000.0,
+                                                             timings['create_scanner'] * 1000.0,
+                                                             timings['import_backend'] * 1000.0,
+                                                             timings['process_total'] * 1000.0,
+                                                             timings['modules_loaded']))
+
+    if args.importtime > 0:
+        print()
+        for cumulative_us, module_name in get_import_profile(args.importtime):
+            print('%8.1fms  %s' % (cumulative_us / 1000.0, module_name))
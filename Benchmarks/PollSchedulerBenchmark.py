@@ -0,0 +1,137 @@
+'''
+File arrival latency and LIST calls of the fixed scan interval against the
+adaptive PollScheduler, simulated on a virtual clock over folders whose
+uploads come in bursts separated by long quiet spells
+
+    python Benchmarks/PollSchedulerBenchmark.py
+    python Benchmarks/PollSchedulerBenchmark.py --busy 2 --idle 30 --hours 24 --fixed 5,30,60 --max-interval 60
+'''
+
+import argparse
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FetcherClasses.Classes.ScheduleCommons import PollScheduler
+
+
+def generate_arrivals(folder_count: int,
+                      hours: float,
+                      burst_files: int,
+                      burst_seconds: float,
+                      quiet_seconds: float,
+                      seed: int):
+    '''
+    Return per folder the sorted arrival times of its files: bursts of
+    burst_files over burst_seconds, quiet_seconds apart on average
+    '''
+
+    random_gen = random.Random(seed)
+    end_time = hours * 3600.0
+
+    folder_arrivals = []
+    for _folder_nbr in range(folder_count):
+        arrival_times = []
+        burst_time = random_gen.expovariate(1.0 / quiet_seconds)
+        while burst_time < end_time:
+            arrival_times.extend(burst_time + random_gen.uniform(0.0, burst_seconds) for _file_nbr in range(burst_files))
+            burst_time += burst_seconds + random_gen.expovariate(1.0 / quiet_seconds)
+        folder_arrivals.append(sorted(arrival_time for arrival_time in arrival_times if arrival_time < end_time))
+
+    return folder_arrivals
+
+
+def simulate(folder_arrivals: list,
+             hours: float,
+             poll_scheduler=None,
+             fixed_interval_seconds: float=5.0,
+             list_seconds: float=0.2):
+    '''
+    Return (arrival latencies, LIST calls); each poll costs list_seconds of the
+    single polling thread, and picks up every file arrived before it began
+    '''
+
+    end_time = hours * 3600.0
+    next_file_nbrs = [0] * len(folder_arrivals)
+    latencies = []
+    list_calls = 0
+
+    def poll_folder(folder_nbr, now):
+        arrival_times = folder_arrivals[folder_nbr]
+        files_found = 0
+        while next_file_nbrs[folder_nbr] < len(arrival_times) and arrival_times[next_file_nbrs[folder_nbr]] <= now:
+            latencies.append(now - arrival_times[next_file_nbrs[folder_nbr]])
+            next_file_nbrs[folder_nbr] += 1
+            files_found += 1
+        return files_found
+
+    now = 0.0
+    if poll_scheduler is None:
+        # the original loop: every folder in turn, then a fixed sleep
+        while now < end_time:
+            for folder_nbr in range(len(folder_arrivals)):
+                poll_folder(folder_nbr, now)
+                list_calls += 1
+                now += list_seconds
+            now += fixed_interval_seconds
+    else:
+        for folder_nbr in range(len(folder_arrivals)):
+            poll_scheduler.add_folder(folder_nbr, now=now)
+        while now < end_time:
+            for folder_nbr in poll_scheduler.pop_due_folders(now=now):
+                files_found = poll_folder(folder_nbr, now)
+                list_calls += 1
+                now += list_seconds
+                poll_scheduler.record_poll(folder_nbr, files_found, now=now)
+            now += poll_scheduler.get_sleep_seconds(now=now)
+
+    return latencies, list_calls
+
+
+def get_percentile(sorted_values: list,
+                   percentile: float):
+
+    if len(sorted_values) == 0:
+        return 0.0
+
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100.0))]
+
+
+if __name__ == '__main__':
+
+    arg_parser = argparse.ArgumentParser(description='FtpFetcher poll scheduler benchmark')
+    arg_parser.add_argument('--busy', type=int, default=3, help='folders with a burst every few minutes')
+    arg_parser.add_argument('--idle', type=int, default=17, help='folders with a burst every few hours')
+    arg_parser.add_argument('--hours', type=float, default=24.0, help='simulated hours')
+    arg_parser.add_argument('--fixed', default='5,30', help='fixed scan intervals to compare, comma separated')
+    arg_parser.add_argument('--min-interval', type=float, default=1.0)
+    arg_parser.add_argument('--max-interval', type=float, default=30.0)
+    arg_parser.add_argument('--list-seconds', type=float, default=0.2, help='cost of one folder listing')
+    arg_parser.add_argument('--seed', type=int, default=1)
+    args = arg_parser.parse_args()
+
+    folder_arrivals = generate_arrivals(args.busy, args.hours, burst_files=20, burst_seconds=30.0, quiet_seconds=300.0, seed=args.seed) \
+                      + generate_arrivals(args.idle, args.hours, burst_files=5, burst_seconds=10.0, quiet_seconds=4 * 3600.0, seed=args.seed + 1)
+    print('%d folders, %d files over %.0f hours' % (len(folder_arrivals), sum(len(arrival_times) for arrival_times in folder_arrivals), args.hours))
+    print('%-22s %10s %10s %10s %12s' % ('schedule', 'p50', 'p90', 'p99', 'LIST calls'))
+
+    runs = [('fixed %ss' % fixed_seconds, None, float(fixed_seconds)) for fixed_seconds in args.fixed.split(',')]
+    runs.append(('adaptive %g-%gs' % (args.min_interval, args.max_interval),
+                 PollScheduler(min_interval_seconds=args.min_interval, max_interval_seconds=args.max_interval, initial_interval_seconds=5.0),
+                 None))
+
+    for run_name, poll_scheduler, fixed_interval_seconds in runs:
+        latencies, list_calls = simulate(folder_arrivals,
+                                         args.hours,
+                                         poll_scheduler=poll_scheduler,
+                                         fixed_interval_seconds=fixed_interval_seconds,
+                                         list_seconds=args.list_seconds)
+        latencies.sort()
+        print('%-22s %9.1fs %9.1fs %9.1fs %12d' % (run_name,
+                                                 statistics.median(latencies) if latencies else 0.0,
+                                                 get_percentile(latencies, 90),
+                                                 get_percentile(latencies, 99),
+                                                 list_calls))
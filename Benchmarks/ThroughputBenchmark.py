@@ -0,0 +1,286 @@
+'''
+End-to-end FtpScanner throughput against local FTP and SFTP servers,
+reporting files/s, MB/s, server requests per file and peak RSS
+
+Each run scans and downloads one generated tree in a fresh interpreter, so
+that peak RSS belongs to that run alone; the servers stay in this process
+and count every request they serve, which bounds the round trips from above.
+
+    python Benchmarks/ThroughputBenchmark.py
+    python Benchmarks/ThroughputBenchmark.py --backend sftp --workload tiny,wide --scale 0.1 --workers 4
+    python Benchmarks/ThroughputBenchmark.py --backend all --scale 0.1
+'''
+
+import argparse
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Benchmarks.BenchmarkServers import LocalFtpServer
+from Benchmarks.BenchmarkServers import LocalSftpServer
+from Benchmarks.BenchmarkServers import StaticCredentials
+
+username = 'fetch_dlz'
+password = 'fetch_dlz'
+
+workload_names = ['tiny', 'huge', 'deep', 'wide']
+
+# backend -> FtpLibNameEnum member name, the wrapper libraries and their native counterparts
+backend_host_types = {'sftp': 'PYSFTP', 'paramiko': 'PARAMIKO', 'ftp': 'FTPUTIL', 'ftplib': 'FTPLIB'}
+sftp_backends = ('sftp', 'paramiko')
+backend_groups = {'both': ['sftp', 'ftp'], 'native': ['paramiko', 'ftplib'], 'all': ['sftp', 'paramiko', 'ftp', 'ftplib']}
+
+
+def get_workload_files(workload_name: str,
+                       scale: float=1.0):
+    '''
+    Return the [(relative path, size)] of a workload, the same for the same scale
+    '''
+
+    seeded_random = random.Random(workload_name)
+    workload_files = []
+
+    if workload_name == 'tiny':
+        # many small files spread over a handful of folders
+        for file_nbr in range(max(1, int(2000 * scale))):
+            workload_files.append(('tiny/d%02d/f%05d.dat' % (file_nbr % 20, file_nbr), seeded_random.randint(0, 4096)))
+    elif workload_name == 'huge':
+        # a few large files
+        for file_nbr in range(3):
+            workload_files.append(('huge/f%d.dat' % file_nbr, max(1, int(128 * 1048576 * scale))))
+    elif workload_name == 'deep':
+        # one long chain of nested folders
+        folder_path = 'deep'
+        for depth in range(max(1, int(40 * scale))):
+            folder_path += '/l%02d' % depth
+            for file_nbr in range(5):
+                workload_files.append(('%s/f%d.dat' % (folder_path, file_nbr), seeded_random.randint(1024, 65536)))
+    elif workload_name == 'wide':
+        # a single folder holding very many entries
+        for file_nbr in range(max(1, int(5000 * scale))):
+            workload_files.append(('wide/f%05d.dat' % file_nbr, seeded_random.randint(512, 8192)))
+    else:
+        raise ValueError('Unknown workload: "%s"' % workload_name)
+
+    return workload_files
+
+
+def make_workload_tree(root_path: str,
+                       workload_name: str,
+                       scale: float=1.0):
+
+    # a fixed 1 MB pattern keeps the tree reproducible and fast to write
+    data_pattern = random.Random(0).randbytes(1048576)
+    total_bytes = 0
+
+    workload_files = get_workload_files(workload_name, scale)
+    for relative_path, file_size in workload_files:
+        full_name = os.path.join(root_path, relative_path)
+        os.makedirs(os.path.dirname(full_name), exist_ok=True)
+        with open(full_name, 'wb') as data_file:
+            bytes_left = file_size
+            while bytes_left > 0:
+                data_file.write(data_pattern[:min(bytes_left, len(data_pattern))])
+                bytes_left -= min(bytes_left, len(data_pattern))
+        # backdated so the stability and snapshot checks see settled files
+        os.utime(full_name, (time.time() - 3600, time.time() - 3600))
+        total_bytes += file_size
+
+    return len(workload_files), total_bytes
+
+
+def run_scanner(backend: str,
+                server_port: int,
+                known_hosts_file,
+                workload_name: str,
+                output_path: str,
+                worker_count: int):
+    '''
+    Scan and download one workload tree, in the child interpreter
+    '''
+
+    from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+    from FetcherClasses.FtpOps import FtpScanner
+
+    ftp_scanner = FtpScanner(host_url='127.0.0.1',
+                             host_type=FtpLibNameEnum[backend_host_types[backend]],
+                             host_port=server_port,
+                             username=username,
+                             folder_path_prefix='/',
+                             initial_folder_path=workload_name)
+    ftp_scanner.logger.setLevel(logging.WARNING)
+    ftp_scanner.dynamicUtilities = StaticCredentials(password)
+    ftp_scanner.known_hosts_file = known_hosts_file
+    ftp_scanner.download_worker_count = worker_count
+    ftp_scanner.output_path_name = output_path
+
+    start_time = time.time()
+    ftp_conn, err_str = ftp_scanner.get_connection()
+    if err_str is None:
+        err_str = ftp_scanner.get_remote_folders_files(remote_path_name='/' + workload_name,
+                                                       entity_path_name='/' + workload_name,
+                                                       target_path_name=output_path,
+                                                       recursively=True,
+                                                       ftp_conn=ftp_conn,
+                                                       close_connection=False,
+                                                       remove_remote_file_on_download=False)
+        ftp_conn.close()
+    elapsed_seconds = time.time() - start_time
+
+    return {'elapsed_seconds': elapsed_seconds,
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'err_str': err_str}
+
+
+def count_landed_files(output_path: str,
+                       workload_files: list):
+    '''
+    Count the workload's files found in output_path by relative path, with
+    their bytes, and return the paths missing, short or not in the workload
+    '''
+
+    file_sizes = dict(workload_files)
+    files_downloaded = 0
+    bytes_downloaded = 0
+    unexpected_paths = []
+    wrong_size_paths = []
+
+    for dirpath, _dirnames, filenames in os.walk(output_path):
+        for file_name in filenames:
+            full_name = os.path.join(dirpath, file_name)
+            relative_path = os.path.relpath(full_name, output_path).replace(os.sep, '/')
+            if relative_path not in file_sizes:
+                unexpected_paths.append(relative_path)
+                continue
+            file_size = os.path.getsize(full_name)
+            if file_size != file_sizes.pop(relative_path):
+                wrong_size_paths.append(relative_path)
+                continue
+            files_downloaded += 1
+            bytes_downloaded += file_size
+
+    return files_downloaded, bytes_downloaded, sorted(file_sizes), sorted(wrong_size_paths), sorted(unexpected_paths)
+
+
+def run_benchmark(backends: list,
+                  workloads: list,
+                  scale: float=1.0,
+                  worker_count: int=1):
+
+    results = []
+
+    root_path = tempfile.mkdtemp(prefix='bench_remote_')
+    output_path = tempfile.mkdtemp(prefix='bench_local_')
+    # the child's log files land here, apart from the download
+    work_path = tempfile.mkdtemp(prefix='bench_work_')
+
+    expected_counts = {}
+    for workload_name in workloads:
+        expected_counts[workload_name] = make_workload_tree(root_path, workload_name, scale)
+
+    try:
+        for backend in backends:
+            if backend in sftp_backends:
+                server = LocalSftpServer(root_path, username=username, password=password)
+            else:
+                server = LocalFtpServer(root_path, username=username, password=password)
+            server_port = server.start()
+
+            try:
+                for workload_name in workloads:
+                    shutil.rmtree(output_path, ignore_errors=True)
+                    os.makedirs(output_path)
+
+                    command_count = server.command_count
+                    child_args = [sys.executable, os.path.abspath(__file__),
+                                  '--run-one', backend, workload_name,
+                                  '--port', str(server_port),
+                                  '--known-hosts', str(server.known_hosts_file if backend in sftp_backends else ''),
+                                  '--output-path', output_path,
+                                  '--workers', str(worker_count)]
+                    child_output = subprocess.run(child_args, stdout=subprocess.PIPE, cwd=work_path, check=True).stdout
+                    result = json.loads(child_output.decode('utf-8').strip().splitlines()[-1])
+
+                    (result['files_downloaded'],
+                     result['bytes_downloaded'],
+                     missing_paths,
+                     wrong_size_paths,
+                     unexpected_paths) = count_landed_files(output_path, get_workload_files(workload_name, scale))
+                    result.update({'files_missing': len(missing_paths),
+                                   'files_wrong_size': len(wrong_size_paths),
+                                   'files_unexpected': len(unexpected_paths)})
+
+                    files_expected, bytes_expected = expected_counts[workload_name]
+                    elapsed_seconds = max(result['elapsed_seconds'], 1e-6)
+                    result.update({'backend': backend,
+                                   'workload': workload_name,
+                                   'files_expected': files_expected,
+                                   'bytes_expected': bytes_expected,
+                                   'files_per_second': result['files_downloaded'] / elapsed_seconds,
+                                   'mb_per_second': result['bytes_downloaded'] / 1048576.0 / elapsed_seconds,
+                                   'requests_per_file': (server.command_count - command_count) / max(1, files_expected)})
+                    results.append(result)
+
+                    print('%-8s %-5s %6d/%-6d files %9.2f files/s %8.2f MB/s %6.1f req/file %8.1f MB peak RSS%s'
+                          % (backend, workload_name,
+                             result['files_downloaded'], files_expected,
+                             result['files_per_second'], result['mb_per_second'],
+                             result['requests_per_file'], result['peak_rss_kb'] / 1024.0,
+                             '  ERROR: %s' % result['err_str'] if result['err_str'] else ''))
+                    for mismatch_label, mismatch_paths in (('missing', missing_paths),
+                                                           ('wrong size', wrong_size_paths),
+                                                           ('not in workload', unexpected_paths)):
+                        if mismatch_paths:
+                            print('%-8s %-5s   MISMATCH: %d file(s) %s, e.g. %s'
+                                  % (backend, workload_name, len(mismatch_paths), mismatch_label,
+                                     ', '.join(mismatch_paths[:3])))
+                    sys.stdout.flush()
+            finally:
+                server.stop()
+    finally:
+        shutil.rmtree(root_path, ignore_errors=True)
+        shutil.rmtree(output_path, ignore_errors=True)
+        shutil.rmtree(work_path, ignore_errors=True)
+
+    return results
+
+
+if __name__ == '__main__':
+
+    arg_parser = argparse.ArgumentParser(description='FtpFetcher throughput benchmark')
+    arg_parser.add_argument('--backend', choices=list(backend_host_types) + list(backend_groups), default='both')
+    arg_parser.add_argument('--workload', default=','.join(workload_names), help='comma separated: %s' % ', '.join(workload_names))
+    arg_parser.add_argument('--scale', type=float, default=1.0, help='multiplies file counts, depths and sizes')
+    arg_parser.add_argument('--workers', type=int, default=1, help='download_worker_count of the scanner')
+    arg_parser.add_argument('--json-file', default=None, help='also write the results here as JSON')
+    arg_parser.add_argument('--run-one', nargs=2, metavar=('BACKEND', 'WORKLOAD'), help=argparse.SUPPRESS)
+    arg_parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    arg_parser.add_argument('--known-hosts', default='', help=argparse.SUPPRESS)
+    arg_parser.add_argument('--output-path', help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.run_one is not None:
+        result = run_scanner(args.run_one[0],
+                             args.port,
+                             args.known_hosts or None,
+                             args.run_one[1],
+                             args.output_path,
+                             args.workers)
+        print(json.dumps(result))
+    else:
+        results = run_benchmark(backend_groups.get(args.backend, [args.backend]),
+                                args.workload.split(','),
+                                scale=args.scale,
+                                worker_count=args.workers)
+        if args.json_file is not None:
+            with open(args.json_file, 'w') as json_file:
+                json.dump(results, json_file, indent=2)
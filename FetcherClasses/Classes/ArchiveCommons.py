@@ -0,0 +1,570 @@
+import logging
+import os
+import queue
+import shutil
+import tarfile
+import threading
+import time
+import zipfile
+
+from FetcherClasses.Classes.EnumCommons import ArchiveTypeEnums, FileStatusEnum
+
+
+# file name endings of tar archives, bare or compressed, which can be read as a stream
+tar_name_suffixes = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tbz', '.tar.xz', '.txz')
+
+# leading bytes of the compressions tarfile reads, gzip, bzip2 and xz
+compressed_magics = (b'\x1f\x8b', b'BZh', b'\xfd7zXZ\x00')
+
+zip_magics = (b'PK\x03\x04', b'PK\x05\x06')
+zip7_magic = b'7z\xbc\xaf\x27\x1c'
+
+
+def get_archive_type(file_name: str,
+                     head_bytes=None):
+    '''
+    Tell the archive type of a file from its first 512 bytes, read from
+    file_name unless given, and its name; UNKNOWN for anything else
+    '''
+
+    if head_bytes is None:
+        with open(file_name, 'rb') as archive_file:
+            head_bytes = archive_file.read(512)
+
+    lower_name = file_name.lower()
+
+    if head_bytes.startswith(zip_magics):
+        return ArchiveTypeEnums.ZIPX if lower_name.endswith('.zipx') else ArchiveTypeEnums.ZIP
+    if head_bytes.startswith(zip7_magic):
+        return ArchiveTypeEnums.ZIP7
+    if head_bytes[257:262] == b'ustar':
+        return ArchiveTypeEnums.TAR
+    # a lone .gz is a compressed file, not an archive
+    if head_bytes.startswith(compressed_magics) and lower_name.endswith(tar_name_suffixes):
+        return ArchiveTypeEnums.TAR
+
+    return ArchiveTypeEnums.UNKNOWN
+
+
+def get_extract_path_name(archive_full_name: str):
+    '''
+    The folder an archive extracts into: beside it, named after it in full
+    plus .d, since the name less its suffix may be a mirrored remote folder
+    or file that an extraction must not replace
+    '''
+
+    return archive_full_name + '.d'
+
+
+class ExtractionJob(object):
+    '''
+    A single landed archive to extract, and the outcome of extracting it
+    '''
+
+    def __init__(self,
+                 archive_full_name: str,
+                 archive_type: int,
+                 extract_path_name: str,
+                 entity_path=None):
+
+        self.archive_full_name = archive_full_name
+        self.archive_type = archive_type
+        self.extract_path_name = extract_path_name
+        self.entity_path = entity_path
+
+        self.file_status = FileStatusEnum.FS_GOOD_STATUS
+        self.err_str = None
+        self.member_count = 0
+        self.bytes_extracted = 0
+        self.is_streamed = False
+        self.worker_name = None
+        self.elapsed_seconds = 0.0
+        self.is_done = False
+
+
+class BlockPipe(object):
+    '''
+    File-like reader over data blocks handed in by another thread,
+    holding at most max_blocks of them before the writer waits
+    '''
+
+    def __init__(self,
+                 max_blocks: int=64):
+
+        self._block_queue = queue.Queue(max_blocks)
+        self._data_block = b''
+        self._data_offset = 0
+        self.is_eof = False
+
+
+    def put_block(self,
+                  data_block,
+                  timeout=None):
+
+        self._block_queue.put(data_block, timeout=timeout)
+
+        return
+
+
+    def read(self,
+             size: int=-1):
+
+        if self._data_offset >= len(self._data_block):
+            if self.is_eof:
+                return b''
+            data_block = self._block_queue.get()
+            if data_block is None:
+                self.is_eof = True
+                return b''
+            self._data_block = data_block
+            self._data_offset = 0
+
+        if size is None or size < 0:
+            size = len(self._data_block) - self._data_offset
+        data_block = self._data_block[self._data_offset:self._data_offset + size]
+        self._data_offset += len(data_block)
+
+        return data_block
+
+
+    def drain(self):
+
+        while self.read(1048576):
+            pass
+
+        return
+
+
+class StreamingExtraction(object):
+    '''
+    A tar archive extracted from its blocks as they are downloaded,
+    which saves reading the landed file back; the download feeds it
+    blocks, then finishes it once the file has landed, or aborts it
+    '''
+
+    # seconds a block waits for room before the extraction is given up on
+    put_timeout_seconds = 60.0
+
+    def __init__(self,
+                 archive_extractor,
+                 extraction_job):
+
+        self.archive_extractor = archive_extractor
+        self.extraction_job = extraction_job
+        self.extraction_job.is_streamed = True
+
+        self._block_pipe = BlockPipe()
+        self._start_time = time.time()
+        self._is_stopped = False
+        self._stream_err = None
+        self._thread = threading.Thread(target=self._extract_loop,
+                                        name='ArchiveStream-%s' % os.path.basename(extraction_job.archive_full_name))
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def add_data_block(self,
+                       data_block):
+
+        if self._is_stopped or self.extraction_job.err_str is not None:
+            return
+
+        try:
+            self._block_pipe.put_block(data_block, timeout=self.put_timeout_seconds)
+        except queue.Full:
+            # the extraction has stalled, so let the download run on without it
+            self.extraction_job.file_status = FileStatusEnum.FS_BAD_STATUS
+            self.extraction_job.err_str = 'Archive stream extraction stalled: "%s"' % self.extraction_job.archive_full_name
+            self._is_stopped = True
+
+        return
+
+
+    def finish(self,
+               is_landed: bool=True):
+        '''
+        End the stream, keeping what was extracted only if the download landed
+        '''
+
+        if not self._is_stopped:
+            self._is_stopped = True
+            try:
+                self._block_pipe.put_block(None, timeout=self.put_timeout_seconds)
+            except queue.Full:
+                pass
+        self._thread.join(self.put_timeout_seconds)
+
+        extraction_job = self.extraction_job
+        work_path_name = self.archive_extractor.get_work_path_name(extraction_job)
+        self.archive_extractor.release_slot()
+
+        # a failed download is fetched again, and extracted along with it then
+        if not is_landed:
+            shutil.rmtree(work_path_name, ignore_errors=True)
+            return extraction_job
+
+        # hard links to earlier members need the archive seekable, as the landed file is
+        if isinstance(self._stream_err, tarfile.StreamError):
+            shutil.rmtree(work_path_name, ignore_errors=True)
+            self.archive_extractor.submit_archive(extraction_job.archive_full_name, entity_path=extraction_job.entity_path)
+            return extraction_job
+
+        if extraction_job.err_str is None and self._thread.is_alive():
+            extraction_job.file_status = FileStatusEnum.FS_BAD_STATUS
+            extraction_job.err_str = 'Archive stream extraction did not finish: "%s"' % extraction_job.archive_full_name
+        if extraction_job.err_str is None:
+            try:
+                self.archive_extractor.publish_extraction(extraction_job)
+            except Exception as err:
+                extraction_job.file_status = self.archive_extractor.get_file_status(err)
+                extraction_job.err_str = str(err)
+        if extraction_job.err_str is not None:
+            shutil.rmtree(work_path_name, ignore_errors=True)
+
+        extraction_job.worker_name = self._thread.name
+        extraction_job.elapsed_seconds = time.time() - self._start_time
+        self.archive_extractor.report_job(extraction_job, is_new_job=True)
+
+        return extraction_job
+
+
+    def _extract_loop(self):
+
+        try:
+            self.archive_extractor.extract_tar(self._block_pipe, self.extraction_job)
+        except Exception as err:
+            self._stream_err = err
+            if self.extraction_job.file_status == FileStatusEnum.FS_GOOD_STATUS:
+                self.extraction_job.file_status = self.archive_extractor.get_file_status(err)
+            self.extraction_job.err_str = str(err)
+        finally:
+            # tar ends ahead of its padding, and the download must never wait on a reader that left
+            try:
+                self._block_pipe.drain()
+            except Exception:
+                pass
+
+        return
+
+
+class ArchiveExtractor(object):
+    '''
+    Worker pool that extracts landed archives alongside the downloads; at most
+    worker_count archives are extracted at once, streamed ones included
+    '''
+
+    worker_count = 2
+
+    # a folder already extracted from an earlier copy of the archive is replaced,
+    # otherwise the extraction fails with FS_FILE_EXISTS_ERR, as it always does
+    # where a file stands in the folder's place
+    overwrite_existing = True
+    # archives are kept beside what they extracted into unless this is set
+    remove_archive_on_extract = False
+    # tar archives are extracted from the download stream where they can be
+    stream_tar_archives = True
+    # an archive that would extract more than this many bytes fails (None = no limit)
+    max_extracted_bytes = None
+
+    # the folder is built under this suffix and renamed once complete
+    work_path_suffix = '.extracting'
+
+    logger = logging
+
+    def __init__(self,
+                 worker_count: int=2,
+                 on_job_done=None,
+                 logger=None):
+
+        self.worker_count = max(1, worker_count)
+        self.on_job_done = on_job_done
+
+        if logger is not None:
+            self.logger = logger
+
+        self._job_queue = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        # one slot per extraction under way, queued or streamed
+        self._slots = threading.BoundedSemaphore(self.worker_count)
+
+        self.jobs_submitted = 0
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+
+
+    def start(self):
+
+        for worker_nbr in range(self.worker_count):
+            worker = threading.Thread(target=self._worker_loop,
+                                      name='ArchiveWorker-%d' % (worker_nbr + 1))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+        self.logger.info('Archive workers STARTED: %d', self.worker_count)
+
+        return
+
+
+    def submit_archive(self,
+                       archive_full_name: str,
+                       entity_path=None):
+        '''
+        Queue a landed file for extraction if it is an archive, returning its ArchiveTypeEnums
+        '''
+
+        archive_type = get_archive_type(archive_full_name)
+        if archive_type == ArchiveTypeEnums.UNKNOWN:
+            return archive_type
+
+        with self._lock:
+            self.jobs_submitted += 1
+        self._job_queue.put(ExtractionJob(archive_full_name,
+                                          archive_type,
+                                          get_extract_path_name(archive_full_name),
+                                          entity_path=entity_path))
+
+        return archive_type
+
+
+    def open_stream(self,
+                    archive_full_name: str,
+                    entity_path=None):
+        '''
+        Return a StreamingExtraction for a tar archive about to be downloaded
+        whole, or None when it cannot be streamed or no worker slot is free
+        '''
+
+        if not self.stream_tar_archives or not archive_full_name.lower().endswith(tar_name_suffixes):
+            return None
+
+        # a download never waits for a slot, it leaves the archive to the workers instead
+        if not self._slots.acquire(blocking=False):
+            return None
+
+        return StreamingExtraction(self,
+                                   ExtractionJob(archive_full_name,
+                                                 ArchiveTypeEnums.TAR,
+                                                 get_extract_path_name(archive_full_name),
+                                                 entity_path=entity_path))
+
+
+    def release_slot(self):
+
+        self._slots.release()
+
+        return
+
+
+    def join(self):
+
+        # one stop sentinel per worker, queued behind all submitted jobs
+        for _worker in self._workers:
+            self._job_queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+        self.logger.info('Archive workers STOPPED, jobs completed: %d of %d, failed: %d',
+                         self.jobs_completed, self.jobs_submitted, self.jobs_failed)
+
+        return self.jobs_completed, self.jobs_failed
+
+
+    def get_work_path_name(self,
+                           extraction_job):
+
+        return extraction_job.extract_path_name + self.work_path_suffix
+
+
+    def get_file_status(self,
+                        err):
+
+        if isinstance(err, (tarfile.TarError, zipfile.BadZipFile, NotImplementedError, EOFError)):
+            return FileStatusEnum.FS_ARCHIVE_INVALID_ERR
+        if isinstance(err, FileExistsError):
+            return FileStatusEnum.FS_FILE_EXISTS_ERR
+
+        return FileStatusEnum.FS_BAD_STATUS
+
+
+    def extract_archive(self,
+                        extraction_job):
+
+        work_path_name = self.get_work_path_name(extraction_job)
+
+        try:
+            shutil.rmtree(work_path_name, ignore_errors=True)
+            if extraction_job.archive_type == ArchiveTypeEnums.TAR:
+                with open(extraction_job.archive_full_name, 'rb') as archive_file:
+                    self.extract_tar(archive_file, extraction_job, tar_mode='r:*')
+            elif extraction_job.archive_type in (ArchiveTypeEnums.ZIP, ArchiveTypeEnums.ZIPX):
+                self.extract_zip(extraction_job)
+            elif extraction_job.archive_type == ArchiveTypeEnums.ZIP7:
+                self.extract_zip7(extraction_job)
+            else:
+                raise NotImplementedError('Unsupported archive type %s' % ArchiveTypeEnums(extraction_job.archive_type).name)
+            self.publish_extraction(extraction_job)
+        except Exception as err:
+            if extraction_job.file_status == FileStatusEnum.FS_GOOD_STATUS:
+                extraction_job.file_status = self.get_file_status(err)
+            extraction_job.err_str = str(err)
+            shutil.rmtree(work_path_name, ignore_errors=True)
+
+        return extraction_job.file_status, extraction_job.err_str
+
+
+    def extract_tar(self,
+                    archive_file,
+                    extraction_job,
+                    tar_mode: str='r|*'):
+        '''
+        Extract a tar archive, compressed or not; the default mode
+        reads archive_file front to back only, as a stream
+        '''
+
+        work_path_name = self.get_work_path_name(extraction_job)
+        os.makedirs(work_path_name, exist_ok=True)
+
+        with tarfile.open(fileobj=archive_file, mode=tar_mode) as tar_file:
+            for tar_member in tar_file:
+                self._count_member(extraction_job, tar_member.size if tar_member.isfile() else 0)
+                # the data filter refuses absolute paths, links out of the
+                # folder and device files, and drops setuid bits; folders
+                # keep default attributes, which may not yet be writable
+                tar_file.extract(tar_member, work_path_name, set_attrs=not tar_member.isdir(), filter='data')
+
+        return
+
+
+    def extract_zip(self,
+                    extraction_job):
+
+        work_path_name = self.get_work_path_name(extraction_job)
+        os.makedirs(work_path_name, exist_ok=True)
+
+        with zipfile.ZipFile(extraction_job.archive_full_name) as zip_file:
+            for zip_member in zip_file.infolist():
+                self._count_member(extraction_job, zip_member.file_size)
+                # ZipFile.extract strips drive letters, leading slashes and ".." parts
+                zip_file.extract(zip_member, work_path_name)
+
+        return
+
+
+    def extract_zip7(self,
+                     extraction_job):
+
+        # only deployments fetching 7-Zip archives need it installed
+        import py7zr
+
+        work_path_name = self.get_work_path_name(extraction_job)
+        os.makedirs(work_path_name, exist_ok=True)
+
+        with py7zr.SevenZipFile(extraction_job.archive_full_name, mode='r') as zip7_file:
+            for zip7_member in zip7_file.list():
+                self._count_member(extraction_job, zip7_member.uncompressed or 0)
+            zip7_file.extractall(path=work_path_name)
+
+        return
+
+
+    def publish_extraction(self,
+                           extraction_job):
+        '''
+        Move a complete extraction under its final name, and drop the archive if so configured
+        '''
+
+        work_path_name = self.get_work_path_name(extraction_job)
+        extract_path_name = extraction_job.extract_path_name
+
+        if os.path.lexists(extract_path_name):
+            # only a folder is replaced, never a landed file or a link out of the output tree
+            is_folder = os.path.isdir(extract_path_name) and not os.path.islink(extract_path_name)
+            if not self.overwrite_existing or not is_folder:
+                shutil.rmtree(work_path_name, ignore_errors=True)
+                raise FileExistsError('Archive extraction target exists: "%s"' % extract_path_name)
+            shutil.rmtree(extract_path_name)
+        os.replace(work_path_name, extract_path_name)
+
+        if self.remove_archive_on_extract:
+            os.remove(extraction_job.archive_full_name)
+
+        return
+
+
+    def report_job(self,
+                   extraction_job,
+                   is_new_job: bool=False):
+
+        with self._lock:
+            # streamed extractions only count once their download has landed
+            if is_new_job:
+                self.jobs_submitted += 1
+            self.jobs_completed += 1
+            if extraction_job.err_str is not None:
+                self.jobs_failed += 1
+
+        extraction_job.is_done = True
+
+        if extraction_job.err_str is None:
+            self.logger.info('Archive extraction SUCCESS [%s] %.3fs, %d members, %d bytes: "%s"',
+                             extraction_job.worker_name,
+                             extraction_job.elapsed_seconds,
+                             extraction_job.member_count,
+                             extraction_job.bytes_extracted,
+                             extraction_job.archive_full_name)
+        else:
+            self.logger.error('Archive extraction FAILURE [%s] %s: "%s"',
+                              extraction_job.worker_name,
+                              FileStatusEnum(extraction_job.file_status).name,
+                              extraction_job.archive_full_name)
+            self.logger.error(extraction_job.err_str)
+
+        if self.on_job_done is not None:
+            try:
+                self.on_job_done(extraction_job)
+            except Exception as err:
+                self.logger.error(err)
+
+        return
+
+
+    def _count_member(self,
+                      extraction_job,
+                      member_size: int):
+
+        extraction_job.member_count += 1
+        extraction_job.bytes_extracted += member_size
+        if self.max_extracted_bytes is not None and extraction_job.bytes_extracted > self.max_extracted_bytes:
+            extraction_job.file_status = FileStatusEnum.FS_ARCHIVE_INVALID_ERR
+            raise IOError('Archive extracts to more than %d bytes: "%s"' % (self.max_extracted_bytes,
+                                                                           extraction_job.archive_full_name))
+
+        return
+
+
+    def _worker_loop(self):
+
+        worker_name = threading.current_thread().name
+
+        while True:
+            extraction_job = self._job_queue.get()
+            if extraction_job is None:
+                break
+
+            start_time = time.time()
+            with self._slots:
+                self.logger.debug('Archive extraction ATTEMPT [%s] %s: "%s"',
+                                  worker_name,
+                                  ArchiveTypeEnums(extraction_job.archive_type).name,
+                                  extraction_job.archive_full_name)
+                self.extract_archive(extraction_job)
+
+            extraction_job.worker_name = worker_name
+            extraction_job.elapsed_seconds = time.time() - start_time
+
+            self.report_job(extraction_job)
+
+        return
@@ -0,0 +1,278 @@
+import ftplib
+import logging
+import socket
+import threading
+import time
+
+
+class ConnectionPool(object):
+    '''
+    Pool of open FTP/SFTP connections keyed by (host, port, user, backend)
+    '''
+
+    # idle connections older than this are closed
+    max_idle_seconds = 300
+    # maximum number of idle connections kept per key
+    max_pooled_per_key = 4
+    # connections idle longer than this are health-checked before reuse
+    check_idle_seconds = 2
+
+    logger = logging
+
+    def __init__(self,
+                 max_idle_seconds: int=300,
+                 max_pooled_per_key: int=4,
+                 check_idle_seconds: int=2,
+                 logger=None):
+
+        self.max_idle_seconds = max_idle_seconds
+        self.max_pooled_per_key = max_pooled_per_key
+        self.check_idle_seconds = check_idle_seconds
+
+        if logger is not None:
+            self.logger = logger
+
+        # pool_key -> list of (ftp_conn, last_used_time), most recent last
+        self._idle_conns = {}
+        self._lock = threading.Lock()
+
+        self.connects_total = 0
+        self.reuses_total = 0
+        self.evictions_total = 0
+
+
+    @staticmethod
+    def get_pool_key(host_url, host_port, username, host_type):
+        return (host_url, int(host_port), username, int(host_type))
+
+
+    def acquire_connection(self,
+                           pool_key,
+                           connect_func,
+                           logger=None):
+
+        ftp_conn = None
+        err_str = None
+
+        if logger is None:
+            logger = self.logger
+
+        while ftp_conn is None:
+            with self._lock:
+                idle_conns = self._idle_conns.get(pool_key)
+                if not idle_conns:
+                    break
+                ftp_conn, last_used = idle_conns.pop()
+
+            idle_seconds = time.time() - last_used
+            if idle_seconds > self.max_idle_seconds:
+                self.close_connection(pool_key, ftp_conn, logger=logger)
+                ftp_conn = None
+            elif idle_seconds > self.check_idle_seconds \
+            and not self.check_connection(pool_key, ftp_conn, logger=logger):
+                self.close_connection(pool_key, ftp_conn, logger=logger)
+                ftp_conn = None
+
+        if ftp_conn is not None:
+            self.reuses_total += 1
+            logger.debug('Pooled connection REUSED: %s@%s:%d', pool_key[2], pool_key[0], pool_key[1])
+        else:
+            ftp_conn, err_str = connect_func()
+            if ftp_conn is not None and err_str is None:
+                self.connects_total += 1
+
+        return ftp_conn, err_str
+
+
+    def release_connection(self,
+                           pool_key,
+                           ftp_conn,
+                           discard: bool=False,
+                           logger=None):
+
+        if ftp_conn is None:
+            return
+
+        if logger is None:
+            logger = self.logger
+
+        if not discard:
+            with self._lock:
+                idle_conns = self._idle_conns.setdefault(pool_key, [])
+                if any(conn is ftp_conn for conn, _last_used in idle_conns):
+                    return
+                if len(idle_conns) < self.max_pooled_per_key:
+                    idle_conns.append((ftp_conn, time.time()))
+                    return
+
+        self.close_connection(pool_key, ftp_conn, logger=logger)
+
+        return
+
+
+    def check_connection(self,
+                         pool_key,
+                         ftp_conn,
+                         logger=None):
+
+        is_healthy = False
+
+        if logger is None:
+            logger = self.logger
+
+        try:
+            # one round trip, whatever the backend
+            ftp_conn.keep_alive()
+            is_healthy = True
+        except Exception as err:
+            logger.warning('Pooled connection health check FAILURE: %s@%s:%d', pool_key[2], pool_key[0], pool_key[1])
+            logger.warning(str(err))
+
+        return is_healthy
+
+
+    def close_connection(self,
+                         pool_key,
+                         ftp_conn,
+                         logger=None):
+
+        if logger is None:
+            logger = self.logger
+
+        try:
+            logger.info('Closing FTP connection: %s@%s:%d', pool_key[2], pool_key[0], pool_key[1])
+            ftp_conn.close_session()
+            logger.info('Closed FTP connection: %s@%s:%d', pool_key[2], pool_key[0], pool_key[1])
+        except Exception as err:
+            logger.info(err)
+
+        return
+
+
+    def evict_idle_connections(self,
+                               logger=None):
+
+        evicted_conns = []
+
+        if logger is None:
+            logger = self.logger
+
+        now = time.time()
+        with self._lock:
+            for pool_key, idle_conns in self._idle_conns.items():
+                keep_conns = []
+                for ftp_conn, last_used in idle_conns:
+                    if now - last_used > self.max_idle_seconds:
+                        evicted_conns.append((pool_key, ftp_conn))
+                    else:
+                        keep_conns.append((ftp_conn, last_used))
+                idle_conns[:] = keep_conns
+
+        for pool_key, ftp_conn in evicted_conns:
+            self.close_connection(pool_key, ftp_conn, logger=logger)
+        self.evictions_total += len(evicted_conns)
+
+        return len(evicted_conns)
+
+
+    def close_all_connections(self,
+                              logger=None):
+
+        with self._lock:
+            all_conns = [(pool_key, ftp_conn)
+                         for pool_key, idle_conns in self._idle_conns.items()
+                         for ftp_conn, _last_used in idle_conns]
+            self._idle_conns = {}
+
+        for pool_key, ftp_conn in all_conns:
+            self.close_connection(pool_key, ftp_conn, logger=logger)
+
+        return
+
+
+class TunedFtpSession(ftplib.FTP):
+    '''
+    ftplib session whose passive data connections get a sized receive buffer
+    '''
+
+    # SO_RCVBUF for data connections, None leaves the OS default
+    socket_buffer_size = None
+
+    def __init__(self,
+                 host: str,
+                 user: str,
+                 passwd: str,
+                 port: int=21,
+                 socket_buffer_size=None,
+                 timeout=None):
+
+        if timeout is not None:
+            super().__init__(timeout=timeout)
+        else:
+            super().__init__()
+
+        self.socket_buffer_size = socket_buffer_size
+
+        self.connect(host, port)
+        self.login(user, passwd)
+
+
+    @classmethod
+    def get_session_factory(cls,
+                            port: int=21,
+                            socket_buffer_size=None,
+                            timeout=None):
+        '''
+        Return a callable(host, user, passwd) of the kind FTPUTIL expects
+        '''
+
+        return lambda host, user, passwd: cls(host,
+                                              user,
+                                              passwd,
+                                              port=port,
+                                              socket_buffer_size=socket_buffer_size,
+                                              timeout=timeout)
+
+
+    def ntransfercmd(self, cmd, rest=None):
+
+        if not self.passiveserver or not self.socket_buffer_size:
+            return super().ntransfercmd(cmd, rest)
+
+        # as ftplib's passive branch, except that the buffer is sized before
+        # connecting so that the TCP window scale is negotiated to suit it
+        if self.af == socket.AF_INET:
+            untrusted_host, port = ftplib.parse227(self.sendcmd('PASV'))
+            if self.trust_server_pasv_ipv4_address:
+                host = untrusted_host
+            else:
+                host = self.sock.getpeername()[0]
+        else:
+            host, port = ftplib.parse229(self.sendcmd('EPSV'), self.sock.getpeername())
+
+        conn = socket.socket(self.af, socket.SOCK_STREAM)
+        try:
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.socket_buffer_size)
+            if self.timeout is not None and self.timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                conn.settimeout(self.timeout)
+            if self.source_address is not None:
+                conn.bind(self.source_address)
+            conn.connect((host, port))
+            if rest is not None:
+                self.sendcmd('REST %s' % rest)
+            resp = self.sendcmd(cmd)
+            # some servers apparently send a 200 reply to
+            # a LIST or STOR command, before the 150 reply
+            if resp[0] == '2':
+                resp = self.getresp()
+            if resp[0] != '1':
+                raise ftplib.error_reply(resp)
+        except:
+            conn.close()
+            raise
+
+        size = None
+        if resp[:3] == '150':
+            size = ftplib.parse150(resp)
+
+        return conn, size
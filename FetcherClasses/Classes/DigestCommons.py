@@ -0,0 +1,139 @@
+import hashlib
+import re
+
+
+# xxhash digests come from the optional xxhash package, all others from hashlib
+xxhash_algorithms = ('xxh32', 'xxh64', 'xxh3_64', 'xxh3_128', 'xxh128')
+
+# "<hex>  <name>", "<hex> *<name>" or a bare "<hex>", as md5sum and sha256sum
+# write them, or "<ALG> (<name>) = <hex>" as the BSD tools do
+sidecar_line_pattern = re.compile(r'^\s*(?:[\w\-]+\s*\((?P<bsd_name>.*)\)\s*=\s*(?P<bsd_hex>[0-9a-fA-F]+)'
+                                  r'|(?P<hex>[0-9a-fA-F]+)(?:\s+\*?(?P<name>.*))?)\s*$')
+
+
+def get_hasher(algorithm_name: str):
+
+    algorithm_name = algorithm_name.lower().replace('-', '')
+
+    if algorithm_name in xxhash_algorithms:
+        # only deployments hashing with xxhash need it installed
+        import xxhash
+        return getattr(xxhash, algorithm_name)()
+
+    return hashlib.new(algorithm_name)
+
+
+def parse_sidecar(sidecar_text: str,
+                  file_name: str):
+    '''
+    Return the hex digest a checksum file lists for file_name, or
+    for its only entry, in lower case; None if it lists neither
+    '''
+
+    hex_digests = []
+
+    for sidecar_line in sidecar_text.splitlines():
+        line_match = sidecar_line_pattern.match(sidecar_line)
+        if line_match is None:
+            continue
+        listed_name = line_match.group('bsd_name') if line_match.group('bsd_hex') else line_match.group('name')
+        hex_digest = (line_match.group('bsd_hex') or line_match.group('hex')).lower()
+        if listed_name is not None and listed_name.strip().split('/')[-1] == file_name:
+            return hex_digest
+        hex_digests.append(hex_digest)
+
+    return hex_digests[0] if len(hex_digests) == 1 else None
+
+
+class StreamDigester(object):
+    '''
+    Digests of a file computed from its blocks as they stream past,
+    so that checking a download costs no second read of it
+    '''
+
+    def __init__(self,
+                 algorithm_names):
+
+        # algorithm name -> hasher, in the order first asked for
+        self.hashers = {}
+        for algorithm_name in algorithm_names:
+            algorithm_name = algorithm_name.lower().replace('-', '')
+            if algorithm_name not in self.hashers:
+                self.hashers[algorithm_name] = get_hasher(algorithm_name)
+
+        # algorithm name -> hex digest the remote side vouches for
+        self.expected_digests = {}
+        # where each expected digest came from, e.g. the sidecar's name
+        self.expected_sources = {}
+        # the checksum file as read, for landing beside the download
+        self.sidecar_content = None
+
+
+    def expect_digest(self,
+                      algorithm_name: str,
+                      hex_digest: str,
+                      source: str):
+
+        algorithm_name = algorithm_name.lower().replace('-', '')
+        if algorithm_name not in self.hashers:
+            self.hashers[algorithm_name] = get_hasher(algorithm_name)
+
+        self.expected_digests[algorithm_name] = hex_digest.lower()
+        self.expected_sources[algorithm_name] = source
+
+        return
+
+
+    def add_data_block(self,
+                       data_block):
+
+        for hasher in self.hashers.values():
+            hasher.update(data_block)
+
+        return
+
+
+    def add_file(self,
+                 file_name: str,
+                 byte_count: int,
+                 block_size: int=1048576):
+        '''
+        Feed the first byte_count bytes of a local file, e.g. a part file being resumed
+        '''
+
+        with open(file_name, 'rb') as local_file:
+            bytes_left = byte_count
+            while bytes_left > 0:
+                data_block = local_file.read(min(block_size, bytes_left))
+                if not data_block:
+                    break
+                self.add_data_block(data_block)
+                bytes_left -= len(data_block)
+
+        return
+
+
+    def get_hexdigests(self):
+
+        return dict((algorithm_name, hasher.hexdigest()) for algorithm_name, hasher in self.hashers.items())
+
+
+    def is_verifiable(self):
+
+        return len(self.expected_digests) > 0
+
+
+    def verify(self):
+        '''
+        Return None when every expected digest matches, otherwise the error string
+        '''
+
+        for algorithm_name, expected_digest in self.expected_digests.items():
+            actual_digest = self.hashers[algorithm_name].hexdigest()
+            if actual_digest != expected_digest:
+                return '%s digest mismatch against %s: expected %s, got %s' % (algorithm_name,
+                                                                               self.expected_sources[algorithm_name],
+                                                                               expected_digest,
+                                                                               actual_digest)
+
+        return None
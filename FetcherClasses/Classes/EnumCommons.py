@@ -5,7 +5,6 @@ Created on Nov 3, 2015
 """
 
 from enum import IntEnum, unique
-from h5py.h5g import UNKNOWN
 
 
 @unique
@@ -33,6 +32,19 @@ class ConfigOptionTypeEnum(IntEnum):
     INT = 3
 
 
+@unique
+class FetchStateEnum(IntEnum):
+    """
+    Fetch Journal State Enumerations, in the order a file passes through them
+    """
+
+    DISCOVERED = 0,             # listed and queued for download
+    DOWNLOADING = 1,            # transfer under way into the part file
+    LANDED = 2,                 # complete and renamed to its final name
+    VERIFIED = 3,               # local copy checked against the remote file
+    REMOTE_REMOVED = 4          # remote file removed after download
+
+
 @unique
 class FileStatusEnum(IntEnum):
     """
@@ -75,6 +87,17 @@ class FtpLibNameEnum(IntEnum):
     PYSFTP = 3
 
 
+@unique
+class LogOverflowPolicyEnum(IntEnum):
+    """
+    Log Queue Overflow Policy Enumerations
+    """
+
+    DROP = 0,                   # drop any record that does not fit
+    BLOCK = 1,                  # wait for room, slowing the logging thread
+    DROP_BELOW_WARNING = 2      # drop DEBUG/INFO, wait for room for the rest
+
+
 @unique
 class MsgqLibNameEnum(IntEnum):
     """
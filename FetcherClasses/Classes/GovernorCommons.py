@@ -0,0 +1,231 @@
+import logging
+import threading
+import time
+
+
+class TokenBucket(object):
+    '''
+    Byte rate limiter which lets each caller reserve its bytes in turn and
+    sleep out the deficit, so that transfers reading a block at a time
+    are served round-robin, each getting an even share of the rate
+    '''
+
+    def __init__(self,
+                 bytes_per_second: float,
+                 burst_seconds: float=1.0):
+
+        self.bytes_per_second = float(bytes_per_second)
+        # a transfer that has been idle may run ahead by this many bytes
+        self.burst_bytes = self.bytes_per_second * burst_seconds
+
+        self._tokens = self.burst_bytes
+        self._last_time = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def reserve(self,
+                byte_count: int):
+        '''
+        Take byte_count bytes from the bucket, returning the seconds to wait before using them
+        '''
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst_bytes, self._tokens + (now - self._last_time) * self.bytes_per_second)
+            self._last_time = now
+            # the bucket may go into debt, which later callers queue behind
+            self._tokens -= byte_count
+            if self._tokens >= 0:
+                return 0.0
+
+            return -self._tokens / self.bytes_per_second
+
+
+class TransferGovernor(object):
+    '''
+    Bandwidth and concurrent session limits, per host and across all hosts,
+    shared by every scanner and download worker of the process
+    '''
+
+    # seconds a new connection waits for a session slot before giving up
+    session_wait_seconds = 300.0
+
+    # bytes are reserved in slices of this size, so that transfers reading
+    # in larger blocks get no larger a share than those reading in smaller
+    reserve_slice_bytes = 16384
+
+    logger = logging
+
+    def __init__(self,
+                 max_bytes_per_second=None,
+                 max_sessions=None,
+                 burst_seconds: float=1.0,
+                 session_wait_seconds: float=300.0,
+                 logger=None):
+
+        self.burst_seconds = burst_seconds
+        self.session_wait_seconds = session_wait_seconds
+
+        if logger is not None:
+            self.logger = logger
+
+        self._global_bucket = TokenBucket(max_bytes_per_second, burst_seconds) if max_bytes_per_second else None
+        self._max_sessions = max_sessions
+
+        # host_url -> TokenBucket, and host_url -> session limit
+        self._host_buckets = {}
+        self._host_max_sessions = {}
+
+        # open sessions, and threads waiting for one, per host_url
+        self._session_counts = {}
+        self._session_waiters = {}
+        self._total_sessions = 0
+        self._session_condition = threading.Condition()
+
+        self.throttled_seconds = 0.0
+
+
+    def set_host_limits(self,
+                        host_url: str,
+                        max_bytes_per_second=None,
+                        max_sessions=None):
+
+        if max_bytes_per_second:
+            self._host_buckets[host_url] = TokenBucket(max_bytes_per_second, self.burst_seconds)
+        else:
+            self._host_buckets.pop(host_url, None)
+
+        with self._session_condition:
+            if max_sessions is not None:
+                self._host_max_sessions[host_url] = max_sessions
+            else:
+                self._host_max_sessions.pop(host_url, None)
+            self._session_condition.notify_all()
+
+        return
+
+
+    def get_session_limit(self,
+                          host_url: str):
+        '''
+        Return the sessions host_url may have open at once, None for no limit
+        '''
+
+        session_limits = [session_limit for session_limit in (self._max_sessions, self._host_max_sessions.get(host_url))
+                          if session_limit is not None]
+
+        return min(session_limits) if len(session_limits) > 0 else None
+
+
+    def throttle(self,
+                 host_url: str,
+                 byte_count: int):
+        '''
+        Account for byte_count bytes read from host_url, sleeping as long as
+        the tightest of its limits requires; returns the seconds slept
+        '''
+
+        slept_seconds = 0.0
+
+        host_bucket = self._host_buckets.get(host_url)
+        if host_bucket is None and self._global_bucket is None:
+            return slept_seconds
+
+        while byte_count > 0:
+            slice_bytes = min(byte_count, self.reserve_slice_bytes)
+            byte_count -= slice_bytes
+
+            wait_seconds = 0.0
+            if host_bucket is not None:
+                wait_seconds = host_bucket.reserve(slice_bytes)
+            if self._global_bucket is not None:
+                wait_seconds = max(wait_seconds, self._global_bucket.reserve(slice_bytes))
+
+            if wait_seconds > 0:
+                time.sleep(wait_seconds)
+                slept_seconds += wait_seconds
+
+        self.throttled_seconds += slept_seconds
+
+        return slept_seconds
+
+
+    def acquire_session(self,
+                        host_url: str,
+                        timeout=None):
+        '''
+        Claim a session slot for a new connection to host_url, waiting up to
+        timeout seconds (session_wait_seconds if None); False if none came free
+        '''
+
+        if timeout is None:
+            timeout = self.session_wait_seconds
+
+        deadline_time = time.monotonic() + timeout
+
+        with self._session_condition:
+            self._session_waiters[host_url] = self._session_waiters.get(host_url, 0) + 1
+            try:
+                while not self._has_free_session(host_url):
+                    time_left = deadline_time - time.monotonic()
+                    if time_left <= 0:
+                        self.logger.warning('Session slot wait TIMEOUT after %.0fs: %s, %d open',
+                                            timeout, host_url, self._session_counts.get(host_url, 0))
+                        return False
+                    self._session_condition.wait(time_left)
+                self._session_counts[host_url] = self._session_counts.get(host_url, 0) + 1
+                self._total_sessions += 1
+            finally:
+                self._session_waiters[host_url] -= 1
+
+        return True
+
+
+    def release_session(self,
+                        host_url: str):
+
+        with self._session_condition:
+            if self._session_counts.get(host_url, 0) > 0:
+                self._session_counts[host_url] -= 1
+                self._total_sessions -= 1
+            self._session_condition.notify_all()
+
+        return
+
+
+    def has_session_waiters(self,
+                            host_url: str):
+        '''
+        True when a connection is waiting for a session that host_url's open
+        ones block, in which case an idle one is better closed than pooled
+        '''
+
+        with self._session_condition:
+            if self._session_waiters.get(host_url, 0) > 0:
+                return True
+            # under the global limit, waiters for any host are held up by this one
+            return self._max_sessions is not None \
+                   and self._total_sessions >= self._max_sessions \
+                   and any(waiter_count > 0 for waiter_count in self._session_waiters.values())
+
+
+    def get_session_count(self,
+                          host_url=None):
+
+        with self._session_condition:
+            if host_url is None:
+                return self._total_sessions
+            return self._session_counts.get(host_url, 0)
+
+
+    def _has_free_session(self,
+                          host_url: str):
+
+        if self._max_sessions is not None and self._total_sessions >= self._max_sessions:
+            return False
+
+        host_max_sessions = self._host_max_sessions.get(host_url)
+        if host_max_sessions is not None and self._session_counts.get(host_url, 0) >= host_max_sessions:
+            return False
+
+        return True
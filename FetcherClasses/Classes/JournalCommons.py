@@ -0,0 +1,252 @@
+import logging
+import sqlite3
+import threading
+import time
+
+from FetcherClasses.Classes.EnumCommons import FetchStateEnum, RdbmsTypeEnum
+
+
+class FetchJournal(object):
+    '''
+    Durable record of where each remote file stands between discovery and
+    removal, so that a restart picks up the work rather than repeating it
+    '''
+
+    journal_file_name = None
+
+    # only SQLITE is implemented
+    rdbms_type = RdbmsTypeEnum.SQLITE
+
+    # state changes are committed once this many are pending,
+    # or once the oldest pending change is this many seconds old
+    commit_batch_size = 100
+    commit_interval_seconds = 1.0
+
+    logger = logging
+
+    def __init__(self,
+                 journal_file_name: str='ftpfetcher_journal.db',
+                 commit_batch_size: int=100,
+                 commit_interval_seconds: float=1.0,
+                 logger=None):
+
+        self.journal_file_name = journal_file_name
+        self.commit_batch_size = max(1, commit_batch_size)
+        self.commit_interval_seconds = commit_interval_seconds
+
+        if logger is not None:
+            self.logger = logger
+
+        self._db_conn = None
+        self._lock = threading.Lock()
+        self._pending_count = 0
+        self._first_pending_time = None
+
+        self.entries_skipped = 0
+
+
+    def open_journal(self,
+                     logger=None):
+
+        err_str = None
+
+        if logger is None:
+            logger = self.logger
+
+        if self.rdbms_type != RdbmsTypeEnum.SQLITE:
+            err_str = 'Unsupported journal database: %s' % RdbmsTypeEnum(self.rdbms_type).name
+            logger.error(err_str)
+            return err_str
+
+        try:
+            logger.info('Journal open ATTEMPT: "%s"', self.journal_file_name)
+            # shared by the download workers, which take turns under _lock
+            db_conn = sqlite3.connect(self.journal_file_name, check_same_thread=False)
+            # WAL makes a commit one sequential append, and FULL fsyncs
+            # that append, so that a commit made before a remote file is
+            # removed survives a power loss and not just a process crash
+            db_conn.execute('PRAGMA journal_mode=WAL')
+            db_conn.execute('PRAGMA synchronous=FULL')
+            db_conn.execute('CREATE TABLE IF NOT EXISTS fetch_journal ('
+                            'host TEXT NOT NULL, '
+                            'entity_path TEXT NOT NULL, '
+                            'state INTEGER NOT NULL, '
+                            'size INTEGER, '
+                            'mtime REAL, '
+                            'target_full_name TEXT, '
+                            'updated_time REAL NOT NULL, '
+                            'PRIMARY KEY (host, entity_path))')
+            db_conn.execute('CREATE INDEX IF NOT EXISTS fetch_journal_state ON fetch_journal (state)')
+            db_conn.commit()
+            state_counts = dict(db_conn.execute('SELECT state, COUNT(*) FROM fetch_journal GROUP BY state').fetchall())
+            with self._lock:
+                self._db_conn = db_conn
+            logger.info('Journal open SUCCESS: "%s", %s',
+                        self.journal_file_name,
+                        ', '.join('%s: %d' % (fetch_state.name.lower(), state_counts.get(int(fetch_state), 0))
+                                  for fetch_state in FetchStateEnum))
+            if state_counts.get(int(FetchStateEnum.DOWNLOADING), 0) > 0:
+                logger.info('Journal shows %d downloads interrupted, their part files will be resumed',
+                            state_counts[int(FetchStateEnum.DOWNLOADING)])
+        except Exception as err:
+            err_str = str(err)
+            logger.error('Journal open FAILURE: "%s"', self.journal_file_name)
+            logger.error(err_str)
+
+        return err_str
+
+
+    def record_state(self,
+                     host: str,
+                     entity_path: str,
+                     fetch_state: int,
+                     size=None,
+                     mtime=None,
+                     target_full_name=None):
+        '''
+        Move a file to fetch_state, keeping the attributes
+        already recorded for it wherever these are None;
+        a landed file listed again unchanged stays landed
+        '''
+
+        now = time.time()
+
+        with self._lock:
+            if self._db_conn is None:
+                return
+            self._db_conn.execute('INSERT INTO fetch_journal '
+                                  '(host, entity_path, state, size, mtime, target_full_name, updated_time) '
+                                  'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                                  'ON CONFLICT (host, entity_path) DO UPDATE SET '
+                                  'state = excluded.state, '
+                                  'size = COALESCE(excluded.size, size), '
+                                  'mtime = COALESCE(excluded.mtime, mtime), '
+                                  'target_full_name = COALESCE(excluded.target_full_name, target_full_name), '
+                                  'updated_time = excluded.updated_time '
+                                  # listing a landed file again, unchanged, is no new discovery
+                                  'WHERE NOT (excluded.state = ? AND fetch_journal.state IN (?, ?) '
+                                  'AND fetch_journal.size IS excluded.size AND fetch_journal.mtime IS excluded.mtime)',
+                                  (host, entity_path, int(fetch_state), size, mtime, target_full_name, now,
+                                   int(FetchStateEnum.DISCOVERED), int(FetchStateEnum.LANDED), int(FetchStateEnum.VERIFIED)))
+            self._pending_count += 1
+            if self._first_pending_time is None:
+                self._first_pending_time = now
+            if self._pending_count >= self.commit_batch_size \
+            or now - self._first_pending_time >= self.commit_interval_seconds:
+                self._commit()
+
+        return
+
+
+    def get_entry(self,
+                  host: str,
+                  entity_path: str):
+        '''
+        Return (state, size, mtime, target_full_name), or None if never recorded
+        '''
+
+        with self._lock:
+            if self._db_conn is None:
+                return None
+            return self._db_conn.execute('SELECT state, size, mtime, target_full_name FROM fetch_journal '
+                                         'WHERE host = ? AND entity_path = ?',
+                                         (host, entity_path)).fetchone()
+
+
+    def get_landed_state(self,
+                         host: str,
+                         remote_entry):
+        '''
+        Return the state of a remote file already landed locally in this
+        same version, i.e. with the same size and mtime, otherwise None
+        '''
+
+        journal_entry = self.get_entry(host, remote_entry.entity_path)
+
+        if journal_entry is None \
+        or journal_entry[0] not in (FetchStateEnum.LANDED, FetchStateEnum.VERIFIED) \
+        or journal_entry[1] != remote_entry.size \
+        or journal_entry[2] != remote_entry.mtime:
+            return None
+
+        self.entries_skipped += 1
+
+        return FetchStateEnum(journal_entry[0])
+
+
+    def get_entries(self,
+                    fetch_state: int,
+                    host=None):
+        '''
+        Return the [(host, entity_path, size, mtime, target_full_name)] in fetch_state
+        '''
+
+        with self._lock:
+            if self._db_conn is None:
+                return []
+            if host is None:
+                return self._db_conn.execute('SELECT host, entity_path, size, mtime, target_full_name FROM fetch_journal '
+                                             'WHERE state = ?', (int(fetch_state),)).fetchall()
+            return self._db_conn.execute('SELECT host, entity_path, size, mtime, target_full_name FROM fetch_journal '
+                                         'WHERE state = ? AND host = ?', (int(fetch_state), host)).fetchall()
+
+
+    def prune_entries(self,
+                      max_age_seconds: float,
+                      fetch_state: int=FetchStateEnum.REMOTE_REMOVED):
+        '''
+        Forget files that have sat in fetch_state for longer than max_age_seconds
+        '''
+
+        with self._lock:
+            if self._db_conn is None:
+                return 0
+            pruned_count = self._db_conn.execute('DELETE FROM fetch_journal WHERE state = ? AND updated_time < ?',
+                                                 (int(fetch_state), time.time() - max_age_seconds)).rowcount
+            self._pending_count += 1
+            self._commit()
+
+        return pruned_count
+
+
+    def _commit(self):
+
+        if self._pending_count > 0:
+            self._db_conn.commit()
+            self._pending_count = 0
+            self._first_pending_time = None
+
+        return
+
+
+    def commit_journal(self,
+                       logger=None):
+
+        err_str = None
+
+        if logger is None:
+            logger = self.logger
+
+        try:
+            with self._lock:
+                if self._db_conn is not None:
+                    self._commit()
+        except Exception as err:
+            err_str = str(err)
+            logger.error('Journal commit FAILURE: "%s"', self.journal_file_name)
+            logger.error(err_str)
+
+        return err_str
+
+
+    def close_journal(self,
+                      logger=None):
+
+        err_str = self.commit_journal(logger=logger)
+
+        with self._lock:
+            if self._db_conn is not None:
+                self._db_conn.close()
+                self._db_conn = None
+
+        return err_str
@@ -0,0 +1,328 @@
+import fnmatch
+import logging
+import posixpath
+import re
+import stat
+import threading
+import time
+
+
+class RemoteEntry(object):
+    '''
+    A remote folder entry together with the attributes its listing reported
+    '''
+
+    def __init__(self,
+                 entity_name: str,
+                 entity_path: str,
+                 size=None,
+                 mtime=None,
+                 is_dir: bool=False,
+                 is_file: bool=False,
+                 is_link: bool=False):
+
+        self.entity_name = entity_name
+        self.entity_path = entity_path
+        self.size = size
+        self.mtime = mtime
+        self.is_dir = is_dir
+        self.is_file = is_file
+        self.is_link = is_link
+        # name of the checksum file listed beside this one, if any
+        self.sidecar_name = None
+        # name of the marker file which completes this one, if any
+        self.marker_name = None
+
+
+    @classmethod
+    def from_stat(cls,
+                  entity_name: str,
+                  folder_path: str,
+                  stat_result):
+        '''
+        Build an entry from anything carrying st_mode, st_size and st_mtime,
+        e.g. a paramiko SFTPAttributes or an FTPUTIL StatResult
+        '''
+
+        st_mode = stat_result.st_mode or 0
+
+        if folder_path is not None and folder_path != '':
+            entity_path = posixpath.join(folder_path, entity_name)
+        else:
+            entity_path = entity_name
+
+        return cls(entity_name,
+                   entity_path,
+                   size=stat_result.st_size,
+                   mtime=stat_result.st_mtime,
+                   is_dir=stat.S_ISDIR(st_mode),
+                   is_file=stat.S_ISREG(st_mode),
+                   is_link=stat.S_ISLNK(st_mode))
+
+
+class EntryFilter(object):
+    '''
+    Include/exclude rules for file names and prune rules for folders, compiled
+    once and judged from the listing alone, so what they skip costs nothing more;
+    a rule is an fnmatch glob, matched against the entry name, or against the
+    entry path if it contains a "/", or a compiled regex, searched in the path
+    '''
+
+    def __init__(self,
+                 include_patterns=(),
+                 exclude_patterns=(),
+                 prune_patterns=()):
+        '''
+
+        :param include_patterns: files must match one of these, if any are given
+        :param exclude_patterns: files matching any of these are skipped
+        :param prune_patterns: folders matching any of these are not descended into
+        '''
+
+        self._include_rules = self.compile_rules(include_patterns)
+        self._exclude_rules = self.compile_rules(exclude_patterns)
+        self._prune_rules = self.compile_rules(prune_patterns)
+
+
+    @staticmethod
+    def compile_rules(patterns):
+        '''
+        Return (name regex, path regex, path regexes), the globs
+        combined into one regex each, or None when there are no rules
+        '''
+
+        name_globs = []
+        path_globs = []
+        path_regexes = []
+        for pattern in patterns:
+            if isinstance(pattern, re.Pattern):
+                path_regexes.append(pattern)
+            elif '/' in pattern:
+                path_globs.append(fnmatch.translate(pattern))
+            else:
+                name_globs.append(fnmatch.translate(pattern))
+
+        if len(name_globs) + len(path_globs) + len(path_regexes) == 0:
+            return None
+
+        return (re.compile('|'.join(name_globs)) if len(name_globs) > 0 else None,
+                re.compile('|'.join(path_globs)) if len(path_globs) > 0 else None,
+                path_regexes)
+
+
+    @staticmethod
+    def matches_rules(compiled_rules,
+                      entity_name: str,
+                      entity_path: str):
+
+        name_regex, path_regex, path_regexes = compiled_rules
+
+        if name_regex is not None and name_regex.match(entity_name):
+            return True
+
+        if path_regex is not None and path_regex.match(entity_path):
+            return True
+
+        return any(regex.search(entity_path) for regex in path_regexes)
+
+
+    def is_file_included(self,
+                         entity_name: str,
+                         entity_path: str):
+
+        if self._include_rules is not None \
+        and not self.matches_rules(self._include_rules, entity_name, entity_path):
+            return False
+
+        if self._exclude_rules is not None \
+        and self.matches_rules(self._exclude_rules, entity_name, entity_path):
+            return False
+
+        return True
+
+
+    def is_folder_pruned(self,
+                         entity_name: str,
+                         entity_path: str):
+
+        return self._prune_rules is not None \
+               and self.matches_rules(self._prune_rules, entity_name, entity_path)
+
+
+class FileStabilityPolicy(object):
+    '''
+    Judges from listings alone whether an upstream writer has finished a remote file
+    '''
+
+    # consecutive listings that must report the same size and mtime, 1 disables
+    stable_listing_count = 2
+    # minimum age of the remote mtime, 0 disables
+    min_age_seconds = 0
+    # when set, a file is only complete once "<file name><marker_suffix>" is listed beside it
+    marker_suffix = None
+    # observations of files not listed for this long are dropped
+    max_unseen_seconds = 3600
+
+    logger = logging
+
+    def __init__(self,
+                 stable_listing_count: int=2,
+                 min_age_seconds: int=0,
+                 marker_suffix: str=None,
+                 max_unseen_seconds: int=3600,
+                 logger=None):
+
+        self.stable_listing_count = max(1, stable_listing_count)
+        self.min_age_seconds = min_age_seconds
+        self.marker_suffix = marker_suffix
+        self.max_unseen_seconds = max_unseen_seconds
+
+        if logger is not None:
+            self.logger = logger
+
+        # entity_path -> [size, mtime, consecutive sightings, last seen]
+        self._observations = {}
+        self._lock = threading.Lock()
+
+
+    def is_marker_file(self,
+                       entity_name: str):
+
+        return self.marker_suffix is not None and entity_name.endswith(self.marker_suffix)
+
+
+    def is_file_stable(self,
+                       remote_entry,
+                       sibling_names=None):
+        '''
+        Return (is_stable, reason), reason naming the first unmet condition
+        '''
+
+        now = time.time()
+
+        with self._lock:
+            observation = self._observations.get(remote_entry.entity_path)
+            if observation is not None \
+            and observation[0] == remote_entry.size \
+            and observation[1] == remote_entry.mtime:
+                observation[2] += 1
+                observation[3] = now
+            else:
+                observation = [remote_entry.size, remote_entry.mtime, 1, now]
+                self._observations[remote_entry.entity_path] = observation
+            times_seen = observation[2]
+
+        # a marker goes along with the file it completes, never on its own,
+        # lest the file be left without one should its own download fail
+        if self.is_marker_file(remote_entry.entity_name):
+            return False, 'marker file'
+
+        if self.marker_suffix is not None \
+        and (sibling_names is None or remote_entry.entity_name + self.marker_suffix not in sibling_names):
+            return False, 'marker not yet present'
+
+        if self.min_age_seconds > 0 \
+        and (remote_entry.mtime is None or now - remote_entry.mtime < self.min_age_seconds):
+            return False, 'younger than %d seconds' % self.min_age_seconds
+
+        if times_seen < self.stable_listing_count:
+            return False, 'size/mtime seen unchanged %d of %d times' % (times_seen, self.stable_listing_count)
+
+        return True, None
+
+
+    def forget_file(self,
+                    entity_path: str):
+
+        with self._lock:
+            self._observations.pop(entity_path, None)
+
+        return
+
+
+    def prune_observations(self):
+
+        oldest_seen = time.time() - self.max_unseen_seconds
+
+        with self._lock:
+            for entity_path in [entity_path for entity_path, observation in self._observations.items()
+                                if observation[3] < oldest_seen]:
+                del self._observations[entity_path]
+
+        return
+
+
+class RemoteTreeWalker(object):
+    '''
+    Single-pass, optionally depth-bounded walk of a remote folder tree
+    '''
+
+    # None walks the whole tree, 0 lists only the top folder
+    max_depth = None
+
+    logger = logging
+
+    def __init__(self,
+                 list_folder_func,
+                 max_depth=None,
+                 prune_folder_func=None,
+                 logger=None):
+        '''
+
+        :param list_folder_func: callable(folder_path, folder_entry) returning (dir_entries, file_entries, err_str),
+                                 folder_entry being the folder's own RemoteEntry, or None for the top folder
+        :param max_depth: deepest folder level to descend to, None for unbounded
+        :param prune_folder_func: callable(folder_path, depth) returning True to skip that subtree
+        :param logger:
+        '''
+
+        self.list_folder_func = list_folder_func
+        self.max_depth = max_depth
+        self.prune_folder_func = prune_folder_func
+
+        if logger is not None:
+            self.logger = logger
+
+        self.folders_visited = 0
+        self.folders_pruned = 0
+        self.files_visited = 0
+        self.list_calls = 0
+
+
+    def walk(self,
+             top_path: str):
+        '''
+        Yield (dirpath, dir_entries, file_entries) top-down, listing each folder
+        exactly once; dir_entries may be edited in place to prune the walk
+        '''
+
+        pending_folders = [(top_path, 0, None)]
+
+        while pending_folders:
+            folder_path, depth, folder_entry = pending_folders.pop()
+
+            self.list_calls += 1
+            dir_entries, file_entries, err_str = self.list_folder_func(folder_path, folder_entry)
+            if err_str is not None:
+                self.logger.error('Remote folder listing FAILURE: "%s"', folder_path)
+                self.logger.error(err_str)
+                continue
+
+            self.folders_visited += 1
+            self.files_visited += len(file_entries)
+
+            yield folder_path, dir_entries, file_entries
+
+            if self.max_depth is not None and depth >= self.max_depth:
+                continue
+
+            # push in reverse so that sub-folders are visited in listing order
+            for dir_entry in reversed(dir_entries):
+                sub_folder_path = dir_entry.entity_path
+                if self.prune_folder_func is not None \
+                and self.prune_folder_func(sub_folder_path, depth + 1):
+                    self.folders_pruned += 1
+                    continue
+                pending_folders.append((sub_folder_path, depth + 1, dir_entry))
+
+        return
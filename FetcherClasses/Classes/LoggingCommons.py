@@ -1,7 +1,15 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+import threading
+import time
 
-from ensure import ensure_annotations
+from FetcherClasses.Classes.EnumCommons import LogOverflowPolicyEnum
+from FetcherClasses.Classes.UtilityCommons import ensure_annotations
 
 
 class LoggingUtilities:
@@ -23,6 +31,12 @@ class LoggingUtilities:
 
     log_file_mode = 'a'
 
+    # in async mode records are handed to a background listener through
+    # a bounded queue, and the overflow policy decides what a full queue does
+    async_mode = False
+    async_queue_size = 10000
+    async_overflow_policy = LogOverflowPolicyEnum.DROP_BELOW_WARNING
+
     new_line = '\n'
 
     @ensure_annotations
@@ -35,7 +49,10 @@ class LoggingUtilities:
                    dft_date_format: str=None,
                    all_log_file_name: str=None,
                    err_log_file_name: str=None,
-                   log_file_mode: str=None):
+                   log_file_mode: str=None,
+                   async_mode=None,
+                   async_queue_size=None,
+                   async_overflow_policy=None):
 
         err_str = None
         logger = None
@@ -53,6 +70,12 @@ class LoggingUtilities:
             dft_date_format = dft_date_format
         if log_file_mode is None:
             log_file_mode = log_file_mode
+        if async_mode is None:
+            async_mode = self.async_mode
+        if async_queue_size is None:
+            async_queue_size = self.async_queue_size
+        if async_overflow_policy is None:
+            async_overflow_policy = self.async_overflow_policy
 
         # set the default logger's values
         logging.basicConfig(level=max_stdout_level,
@@ -62,6 +85,8 @@ class LoggingUtilities:
         try:
             # instantiate the logger object
             logger = logging.getLogger(log_name)
+            # stop the listener of an earlier async setup, which flushes it
+            stop_async_logging(logger)
             # remove log handlers
             logger.handlers = []
         except Exception as err:
@@ -132,6 +157,11 @@ class LoggingUtilities:
                 logging.error('Error instantiating "err" log handler for logger named: %s', log_name)
                 logging.error(err_str)
 
+        if err_str is None and async_mode:
+            err_str = self.attach_queue_handler(logger,
+                                                async_queue_size=async_queue_size,
+                                                async_overflow_policy=async_overflow_policy)
+
         # set the nominal log level
         try:
             logger.setLevel(min_stdout_level)
@@ -143,6 +173,274 @@ class LoggingUtilities:
         return logger, allLoggerFH, errLoggerFH, err_str
 
 
+    def attach_queue_handler(self,
+                             logger,
+                             async_queue_size=None,
+                             async_overflow_policy=None):
+
+        err_str = None
+
+        if async_queue_size is None:
+            async_queue_size = self.async_queue_size
+        if async_overflow_policy is None:
+            async_overflow_policy = self.async_overflow_policy
+
+        try:
+            # the logger's handlers now run on the listener's thread, and
+            # the logging thread only pays for putting records on a queue
+            log_queue = queue.Queue(maxsize=async_queue_size)
+            queueListener = DrainingQueueListener(log_queue, *logger.handlers, respect_handler_level=True)
+            logQueue = BoundedQueueHandler(log_queue, overflow_policy=async_overflow_policy)
+            logQueue.listener = queueListener
+            logger.handlers = [logQueue]
+            queueListener.start()
+        except Exception as err:
+            err_str = str(err)
+            logging.error('Error instantiating async queue handler for logger named: %s', logger.name)
+            logging.error(err_str)
+
+        return err_str
+
+
+    def get_event_logger(self,
+                         event_log_file_name: str=None,
+                         log_name: str='ftpfetcher.events',
+                         success_sample_rate: float=1.0,
+                         max_success_events_per_second=None,
+                         async_mode=None):
+        '''
+        Return a FileEventLogger writing bare JSON lines to event_log_file_name, or to stdout
+        '''
+
+        err_str = None
+        event_logger = None
+
+        if async_mode is None:
+            async_mode = self.async_mode
+
+        try:
+            logger = logging.getLogger(log_name)
+            stop_async_logging(logger)
+            logger.handlers = []
+            # the events are the record, so no prefix and no copy via the root logger
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            if event_log_file_name is not None:
+                eventHandler = logging.FileHandler(event_log_file_name)
+            else:
+                eventHandler = logging.StreamHandler(sys.stdout)
+            eventHandler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(eventHandler)
+            if async_mode:
+                err_str = self.attach_queue_handler(logger)
+            event_logger = FileEventLogger(logger,
+                                           success_sample_rate=success_sample_rate,
+                                           max_success_events_per_second=max_success_events_per_second)
+        except Exception as err:
+            err_str = str(err)
+            logging.error('Error instantiating event logger named: %s', log_name)
+            logging.error(err_str)
+
+        return event_logger, err_str
+
+
+def stop_async_logging(logger=None):
+    '''
+    Stop the background listeners of a logger, or of every logger,
+    once they have written out all the records already queued
+
+    :param logger:
+    '''
+    if logger is not None:
+        loggers = [logger]
+    else:
+        loggers = [logging.getLogger()] + [named_logger for named_logger in logging.Logger.manager.loggerDict.values()
+                                           if isinstance(named_logger, logging.Logger)]
+    for logger in loggers:
+        for handler in logger.handlers:
+            if isinstance(handler, BoundedQueueHandler) and handler.listener is not None:
+                handler.listener.stop()
+                handler.listener = None
+
+
+atexit.register(stop_async_logging)
+
+
+# ==============================
+# implement structured per-file
+# event logging as JSON lines
+# ==============================
+class FileEventLogger:
+    '''
+    One JSON line per file lifecycle event; successes may be sampled
+    and rate limited, failures are always written
+    '''
+
+    # fraction of non-failure events written, 1.0 writes all
+    success_sample_rate = 1.0
+    # non-failure events written per second at most, None for no limit
+    max_success_events_per_second = None
+
+    def __init__(self, logger, success_sample_rate=1.0, max_success_events_per_second=None):
+        '''
+
+        :param logger:
+        :param success_sample_rate:
+        :param max_success_events_per_second:
+        '''
+        self.logger = logger
+        self.success_sample_rate = success_sample_rate
+        self.max_success_events_per_second = max_success_events_per_second
+
+        self.events_written = 0
+        self.events_suppressed = 0
+
+        self._lock = threading.Lock()
+        self._tokens = float(max_success_events_per_second or 0)
+        self._tokens_time = time.time()
+
+    def log_event(self, event, host, path, err_str=None, outcome=None, **fields):
+        '''
+
+        :param event: lifecycle step, e.g. "download" or "defer"
+        :param host:
+        :param path: remote path of the file
+        :param err_str: set for failures, which bypass sampling and rate limits
+        :param outcome: defaults to "failure" with err_str, else "success"
+        :param fields: further values, e.g. bytes and duration
+        '''
+        if err_str is not None:
+            outcome = 'failure'
+        elif outcome is None:
+            outcome = 'success'
+
+        if outcome != 'failure' and not self._admit_success():
+            return False
+
+        event_record = {'ts': round(time.time(), 3),
+                        'event': event,
+                        'outcome': outcome,
+                        'host': host,
+                        'path': path}
+        event_record.update(fields)
+        if err_str is not None:
+            event_record['error'] = err_str
+        elif self.success_sample_rate < 1.0:
+            # lets downstream counts be scaled back up
+            event_record['sample_rate'] = self.success_sample_rate
+
+        event_line = json.dumps(event_record, separators=(',', ':'), default=str)
+        if outcome == 'failure':
+            self.logger.error(event_line)
+        else:
+            self.logger.info(event_line)
+        self.events_written += 1
+
+        return True
+
+    def _admit_success(self):
+        '''
+        '''
+        if self.success_sample_rate < 1.0 and random.random() >= self.success_sample_rate:
+            self.events_suppressed += 1
+            return False
+
+        if self.max_success_events_per_second is not None:
+            with self._lock:
+                # token bucket holding at most one second's worth of events
+                now = time.time()
+                self._tokens = min(float(self.max_success_events_per_second),
+                                   self._tokens + (now - self._tokens_time) * self.max_success_events_per_second)
+                self._tokens_time = now
+                if self._tokens < 1.0:
+                    self.events_suppressed += 1
+                    return False
+                self._tokens -= 1.0
+
+        return True
+
+
+# ==============================
+# implement draining queue listener
+# that stops even on a full queue
+# ==============================
+class DrainingQueueListener(logging.handlers.QueueListener):
+    '''
+    Queue listener whose stop waits for room rather than failing on a full queue
+    '''
+    def enqueue_sentinel(self):
+        '''
+        '''
+        self.queue.put(self._sentinel)
+
+
+# ==============================
+# implement bounded queue handler
+# for non-blocking logging output
+# ==============================
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    '''
+    Queue handler that applies an overflow policy when its bounded queue is full
+    '''
+
+    # seconds to wait for room in the queue before dropping anyway
+    block_timeout_seconds = 5.0
+    # dropped records are owned up to at most this often
+    drop_report_seconds = 10.0
+
+    def __init__(self, log_queue, overflow_policy=LogOverflowPolicyEnum.DROP_BELOW_WARNING):
+        '''
+
+        :param log_queue:
+        :param overflow_policy:
+        '''
+        super().__init__(log_queue)
+        self.overflow_policy = overflow_policy
+        self.listener = None
+        self.dropped_count = 0
+        self._dropped_unreported = 0
+        self._last_drop_report = 0.0
+
+    def enqueue(self, record):
+        '''
+
+        :param record:
+        '''
+        if self.overflow_policy == LogOverflowPolicyEnum.BLOCK \
+        or (self.overflow_policy == LogOverflowPolicyEnum.DROP_BELOW_WARNING and record.levelno >= logging.WARNING):
+            try:
+                self.queue.put(record, timeout=self.block_timeout_seconds)
+            except queue.Full:
+                self._drop_record()
+                return
+        else:
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self._drop_record()
+                return
+
+        # once there is room again, say how much was lost
+        if self._dropped_unreported > 0 and record.created - self._last_drop_report >= self.drop_report_seconds:
+            dropped_unreported, self._dropped_unreported = self._dropped_unreported, 0
+            try:
+                self.queue.put_nowait(logging.makeLogRecord({'name': record.name,
+                                                             'levelno': logging.WARNING,
+                                                             'levelname': logging.getLevelName(logging.WARNING),
+                                                             'module': 'LoggingCommons',
+                                                             'funcName': 'enqueue',
+                                                             'msg': 'Log queue full, %d records dropped' % dropped_unreported}))
+                self._last_drop_report = record.created
+            except queue.Full:
+                self._dropped_unreported += dropped_unreported
+
+    def _drop_record(self):
+        '''
+        '''
+        self.dropped_count += 1
+        self._dropped_unreported += 1
+
+
 # ==============================
 # implement minimum log filter
 # for restraining logging output
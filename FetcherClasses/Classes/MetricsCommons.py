@@ -0,0 +1,280 @@
+import bisect
+import logging
+import os
+import threading
+
+
+class MetricsRegistry(object):
+    '''
+    In-process counters, gauges and latency histograms, exported in Prometheus text format
+    '''
+
+    metric_prefix = 'ftpfetcher_'
+
+    # upper bounds, in seconds, of the latency histogram buckets
+    latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+    metric_help = {'phase_seconds': 'Latency of remote operations by phase',
+                   'errors_total': 'Failed remote operations by phase and error type',
+                   'bytes_downloaded_total': 'Bytes downloaded from remote hosts',
+                   'files_downloaded_total': 'Files downloaded from remote hosts',
+                   'files_removed_total': 'Remote files removed after download',
+                   'archives_extracted_total': 'Downloaded archives extracted, by file status',
+                   'cycle_seconds': 'Duration of the last scan of a remote folder tree',
+                   'cycle_files_per_second': 'Files downloaded per second over the last scan',
+                   'cycle_bytes_per_second': 'Bytes downloaded per second over the last scan'}
+
+    logger = logging
+
+    def __init__(self,
+                 latency_buckets=None,
+                 logger=None):
+
+        if latency_buckets is not None:
+            self.latency_buckets = tuple(sorted(latency_buckets))
+
+        if logger is not None:
+            self.logger = logger
+
+        # (metric name, sorted label items) -> value
+        self._counters = {}
+        self._gauges = {}
+        # (metric name, sorted label items) -> [bucket counts..., sum, count]
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+        self._http_server = None
+
+
+    @staticmethod
+    def _get_metric_key(metric_name, labels):
+        return metric_name, tuple(sorted(labels.items())) if labels else ()
+
+
+    def inc_counter(self,
+                    metric_name: str,
+                    amount=1,
+                    labels=None):
+
+        metric_key = self._get_metric_key(metric_name, labels)
+        with self._lock:
+            self._counters[metric_key] = self._counters.get(metric_key, 0) + amount
+
+        return
+
+
+    def set_gauge(self,
+                  metric_name: str,
+                  value,
+                  labels=None):
+
+        metric_key = self._get_metric_key(metric_name, labels)
+        with self._lock:
+            self._gauges[metric_key] = value
+
+        return
+
+
+    def observe_latency(self,
+                        metric_name: str,
+                        seconds: float,
+                        labels=None):
+
+        metric_key = self._get_metric_key(metric_name, labels)
+        bucket_index = bisect.bisect_left(self.latency_buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(metric_key)
+            if histogram is None:
+                histogram = [0] * (len(self.latency_buckets) + 2)
+                self._histograms[metric_key] = histogram
+            if bucket_index < len(self.latency_buckets):
+                histogram[bucket_index] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+        return
+
+
+    def record_phase(self,
+                     phase: str,
+                     seconds: float,
+                     err=None):
+        '''
+        Observe one connect, list, stat, transfer or delete; err, an exception
+        or an error string, also counts it as failed under its error type
+        '''
+
+        self.observe_latency('phase_seconds', seconds, labels={'phase': phase})
+
+        if err is not None:
+            error_type = type(err).__name__ if isinstance(err, BaseException) else 'Error'
+            self.inc_counter('errors_total', labels={'phase': phase, 'error_type': error_type})
+
+        return
+
+
+    def get_value(self,
+                  metric_name: str,
+                  labels=None):
+
+        metric_key = self._get_metric_key(metric_name, labels)
+        with self._lock:
+            if metric_key in self._counters:
+                return self._counters[metric_key]
+            if metric_key in self._gauges:
+                return self._gauges[metric_key]
+            histogram = self._histograms.get(metric_key)
+            return histogram[-1] if histogram is not None else None
+
+
+    def get_prometheus_text(self):
+
+        text_lines = []
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted((metric_key, list(histogram)) for metric_key, histogram in self._histograms.items())
+
+        for metric_type, metric_items in (('counter', counters), ('gauge', gauges)):
+            last_metric_name = None
+            for (metric_name, label_items), value in metric_items:
+                if metric_name != last_metric_name:
+                    self._add_metric_header(text_lines, metric_name, metric_type)
+                    last_metric_name = metric_name
+                text_lines.append('%s%s%s %s' % (self.metric_prefix, metric_name, self._format_labels(label_items), self._format_value(value)))
+
+        last_metric_name = None
+        for (metric_name, label_items), histogram in histograms:
+            if metric_name != last_metric_name:
+                self._add_metric_header(text_lines, metric_name, 'histogram')
+                last_metric_name = metric_name
+            full_name = self.metric_prefix + metric_name
+            cumulative_count = 0
+            for bucket_bound, bucket_count in zip(self.latency_buckets, histogram):
+                cumulative_count += bucket_count
+                bucket_labels = label_items + (('le', self._format_value(bucket_bound)),)
+                text_lines.append('%s_bucket%s %d' % (full_name, self._format_labels(bucket_labels), cumulative_count))
+            text_lines.append('%s_bucket%s %d' % (full_name, self._format_labels(label_items + (('le', '+Inf'),)), histogram[-1]))
+            text_lines.append('%s_sum%s %s' % (full_name, self._format_labels(label_items), self._format_value(histogram[-2])))
+            text_lines.append('%s_count%s %d' % (full_name, self._format_labels(label_items), histogram[-1]))
+
+        return '\n'.join(text_lines) + '\n'
+
+
+    def _add_metric_header(self,
+                           text_lines,
+                           metric_name,
+                           metric_type):
+
+        full_name = self.metric_prefix + metric_name
+        help_text = self.metric_help.get(metric_name)
+        if help_text is not None:
+            text_lines.append('# HELP %s %s' % (full_name, help_text))
+        text_lines.append('# TYPE %s %s' % (full_name, metric_type))
+
+        return
+
+
+    @staticmethod
+    def _format_labels(label_items):
+
+        if not label_items:
+            return ''
+
+        return '{%s}' % ','.join('%s="%s"' % (label_name, str(label_value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                                 for label_name, label_value in label_items)
+
+
+    @staticmethod
+    def _format_value(value):
+
+        if isinstance(value, float):
+            return repr(value)
+
+        return str(value)
+
+
+    def write_prometheus_file(self,
+                              file_name: str,
+                              logger=None):
+        '''
+        Write the metrics for a node_exporter textfile collector, atomically
+        '''
+
+        err_str = None
+
+        if logger is None:
+            logger = self.logger
+
+        temp_file_name = file_name + '.tmp'
+        try:
+            with open(temp_file_name, 'w') as metrics_file:
+                metrics_file.write(self.get_prometheus_text())
+            os.replace(temp_file_name, file_name)
+        except Exception as err:
+            err_str = str(err)
+            logger.error('Metrics file write FAILURE: "%s"', file_name)
+            logger.error(err_str)
+
+        return err_str
+
+
+    def start_http_server(self,
+                          port: int,
+                          host: str='127.0.0.1',
+                          logger=None):
+        '''
+        Serve the metrics at http://host:port/metrics from a daemon thread
+        '''
+
+        err_str = None
+
+        if logger is None:
+            logger = self.logger
+
+        # only processes that serve the metrics pay for importing http.server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics_registry = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                response_body = metrics_registry.get_prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(response_body)))
+                self.end_headers()
+                self.wfile.write(response_body)
+
+            def log_message(self, format, *args):
+                return
+
+        try:
+            logger.info('Metrics HTTP server start ATTEMPT: %s:%d', host, port)
+            self._http_server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+            server_thread = threading.Thread(target=self._http_server.serve_forever, name='MetricsHttpServer')
+            server_thread.daemon = True
+            server_thread.start()
+            logger.info('Metrics HTTP server start SUCCESS: %s:%d', host, self._http_server.server_address[1])
+        except Exception as err:
+            err_str = str(err)
+            self._http_server = None
+            logger.error('Metrics HTTP server start FAILURE: %s:%d', host, port)
+            logger.error(err_str)
+
+        return err_str
+
+
+    def stop_http_server(self):
+
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+
+        return
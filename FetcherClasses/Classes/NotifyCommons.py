@@ -0,0 +1,507 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from FetcherClasses.Classes.EnumCommons import MsgqLibNameEnum
+
+
+class NotifySink(object):
+    '''
+    Where landed-file notices are delivered; publish_batch returns None
+    once the whole batch is safely accepted, otherwise the error string
+    '''
+
+    logger = logging
+
+    def publish_batch(self,
+                      notices: list):
+        raise NotImplementedError
+
+
+    def close(self):
+
+        return
+
+
+class MemoryNotifySink(NotifySink):
+    '''
+    In-process sink keeping every notice published, for tests and embedding;
+    set fail_with to an error string to play a broker that is down
+    '''
+
+    def __init__(self):
+
+        self.notices = []
+        self.batch_count = 0
+        self.fail_with = None
+        self._lock = threading.Lock()
+
+
+    def publish_batch(self,
+                      notices: list):
+
+        if self.fail_with is not None:
+            return self.fail_with
+
+        with self._lock:
+            self.notices.extend(notices)
+            self.batch_count += 1
+
+        return None
+
+
+class FileNotifySink(NotifySink):
+    '''
+    Appends notices as JSON lines to a file, which local consumers can tail
+    '''
+
+    def __init__(self,
+                 notify_file_name: str,
+                 fsync_batches: bool=True):
+
+        self.notify_file_name = notify_file_name
+        self.fsync_batches = fsync_batches
+
+
+    def publish_batch(self,
+                      notices: list):
+
+        err_str = None
+
+        try:
+            with open(self.notify_file_name, 'a', encoding='utf-8') as notify_file:
+                notify_file.write(''.join(json.dumps(notice, separators=(',', ':'), default=str) + '\n'
+                                          for notice in notices))
+                notify_file.flush()
+                if self.fsync_batches:
+                    os.fsync(notify_file.fileno())
+        except Exception as err:
+            err_str = str(err)
+
+        return err_str
+
+
+class PikaNotifySink(NotifySink):
+    '''
+    Publishes each notice as a persistent JSON message to an AMQP exchange,
+    which must already exist, a whole batch then awaiting publisher confirms
+    '''
+
+    msgq_lib_name = MsgqLibNameEnum.PIKA
+
+    # seconds to wait for the broker to confirm a batch before it counts as failed
+    confirm_timeout_seconds = 30.0
+
+    def __init__(self,
+                 host_url: str='localhost',
+                 host_port: int=5672,
+                 virtual_host: str='/',
+                 username: str='guest',
+                 password: str='guest',
+                 exchange_name: str='ftpfetcher',
+                 routing_key: str='landed',
+                 heartbeat_seconds: int=60,
+                 logger=None):
+
+        self.host_url = host_url
+        self.host_port = host_port
+        self.virtual_host = virtual_host
+        self.username = username
+        self.password = password
+        self.exchange_name = exchange_name
+        self.routing_key = routing_key
+        self.heartbeat_seconds = heartbeat_seconds
+
+        if logger is not None:
+            self.logger = logger
+
+        self._connection = None
+        self._channel = None
+        self._channel_impl = None
+        self._next_delivery_tag = 1
+        self._unconfirmed_tags = set()
+        self._nacked_count = 0
+
+
+    def open_channel(self):
+
+        # only deployments that notify over AMQP need pika installed
+        import pika
+
+        self.close()
+
+        self.logger.info('AMQP connect ATTEMPT: %s:%d%s', self.host_url, self.host_port, self.virtual_host)
+        connection_parameters = pika.ConnectionParameters(host=self.host_url,
+                                                          port=self.host_port,
+                                                          virtual_host=self.virtual_host,
+                                                          credentials=pika.PlainCredentials(self.username, self.password),
+                                                          heartbeat=self.heartbeat_seconds,
+                                                          connection_attempts=1,
+                                                          blocked_connection_timeout=self.confirm_timeout_seconds)
+        self._connection = pika.BlockingConnection(connection_parameters)
+        # the blocking channel waits out each confirm in turn, so confirms
+        # are taken on its underlying channel, a batch's worth at a time
+        self._channel = self._connection.channel()
+        self._channel_impl = self._channel._impl
+        self._channel_impl.confirm_delivery(self._on_delivery_confirmation)
+        self._next_delivery_tag = 1
+        self._unconfirmed_tags = set()
+        self.logger.info('AMQP connect SUCCESS: %s:%d%s', self.host_url, self.host_port, self.virtual_host)
+
+        return
+
+
+    def publish_batch(self,
+                      notices: list):
+
+        err_str = None
+
+        try:
+            import pika
+
+            if self._connection is None or not self._connection.is_open or not self._channel_impl.is_open:
+                self.open_channel()
+
+            self._nacked_count = 0
+            for notice in notices:
+                self._channel_impl.basic_publish(self.exchange_name,
+                                                 self.routing_key,
+                                                 json.dumps(notice, separators=(',', ':'), default=str).encode('utf-8'),
+                                                 properties=pika.BasicProperties(content_type='application/json',
+                                                                                 delivery_mode=2,
+                                                                                 timestamp=int(time.time())))
+                self._unconfirmed_tags.add(self._next_delivery_tag)
+                self._next_delivery_tag += 1
+
+            # one wait for the whole batch, the broker acking many tags at once
+            deadline_time = time.monotonic() + self.confirm_timeout_seconds
+            while len(self._unconfirmed_tags) > 0 and self._channel_impl.is_open:
+                time_left = deadline_time - time.monotonic()
+                if time_left <= 0:
+                    break
+                self._connection.process_data_events(time_limit=min(time_left, 1.0))
+
+            if not self._channel_impl.is_open:
+                err_str = 'AMQP channel closed, exchange "%s" may not exist' % self.exchange_name
+            elif len(self._unconfirmed_tags) > 0:
+                err_str = 'AMQP broker confirmed %d of %d notices in time' % (len(notices) - len(self._unconfirmed_tags), len(notices))
+            elif self._nacked_count > 0:
+                err_str = 'AMQP broker rejected %d of %d notices' % (self._nacked_count, len(notices))
+        except Exception as err:
+            err_str = str(err) or type(err).__name__
+
+        if err_str is not None:
+            # a fresh channel, and a fresh count of delivery tags, for the retry
+            self.close()
+
+        return err_str
+
+
+    def close(self):
+
+        if self._connection is not None:
+            try:
+                if self._connection.is_open:
+                    self._connection.close()
+            except Exception:
+                pass
+        self._connection = None
+        self._channel = None
+        self._channel_impl = None
+
+        return
+
+
+    def _on_delivery_confirmation(self,
+                                  method_frame):
+
+        confirm_method = method_frame.method
+        if confirm_method.multiple:
+            confirmed_tags = set(delivery_tag for delivery_tag in self._unconfirmed_tags
+                                 if delivery_tag <= confirm_method.delivery_tag)
+        else:
+            confirmed_tags = set([confirm_method.delivery_tag]) & self._unconfirmed_tags
+        self._unconfirmed_tags -= confirmed_tags
+        if confirm_method.NAME == 'Basic.Nack':
+            self._nacked_count += len(confirmed_tags)
+
+        return
+
+
+class LandedFileNotifier(object):
+    '''
+    Publishes one notice per landed file from a background thread, in batches;
+    while the sink is failing, notices are kept in order in a local buffer
+    file, replayed ahead of new ones once it recovers, so delivery is at
+    least once and a notice may on rare occasions arrive twice
+    '''
+
+    # a batch goes out once this many notices are waiting,
+    # or once the oldest has waited this many seconds
+    batch_size = 100
+    batch_interval_seconds = 1.0
+
+    # seconds between attempts to reach a failing sink
+    retry_seconds = 5.0
+
+    # notices spill here while the sink is down, and survive restarts
+    buffer_file_name = None
+
+    logger = logging
+
+    def __init__(self,
+                 notify_sink,
+                 buffer_file_name: str='ftpfetcher_notify_buffer.jsonl',
+                 batch_size: int=100,
+                 batch_interval_seconds: float=1.0,
+                 retry_seconds: float=5.0,
+                 logger=None):
+
+        self.notify_sink = notify_sink
+        self.buffer_file_name = buffer_file_name
+        self.batch_size = max(1, batch_size)
+        self.batch_interval_seconds = batch_interval_seconds
+        self.retry_seconds = retry_seconds
+
+        if logger is not None:
+            self.logger = logger
+
+        self._notice_queue = queue.Queue()
+        self._thread = None
+        self._last_failure_time = None
+        self._buffered_count = None
+
+        self.notices_published = 0
+        self.notices_buffered = 0
+        self.batches_failed = 0
+
+
+    def start(self):
+
+        # a backlog left by an earlier run goes out first
+        self._buffered_count = self.get_buffered_count()
+        if self._buffered_count > 0:
+            self.logger.info('Landed file notice buffer holds %d notices: "%s"', self._buffered_count, self.buffer_file_name)
+
+        self._thread = threading.Thread(target=self._publish_loop, name='LandedNotifier')
+        self._thread.daemon = True
+        self._thread.start()
+
+        return
+
+
+    def notify_landed(self,
+                      host_url: str,
+                      folder_path: str,
+                      entity_path: str,
+                      target_full_name: str,
+                      size=None,
+                      mtime=None,
+                      digests=None):
+
+        self._notice_queue.put({'event': 'landed',
+                                'ts': round(time.time(), 3),
+                                'host': host_url,
+                                'folder': folder_path,
+                                'path': entity_path,
+                                'target': target_full_name,
+                                'size': size,
+                                'mtime': mtime,
+                                'digests': digests})
+
+        return
+
+
+    def stop(self):
+        '''
+        Publish whatever is queued, leaving in the buffer file what cannot be
+        '''
+
+        if self._thread is not None:
+            self._notice_queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self.notify_sink.close()
+
+        self.logger.info('Landed file notifier STOPPED, notices published: %d, buffered: %d',
+                         self.notices_published, self.notices_buffered)
+
+        return
+
+
+    def get_buffered_count(self):
+
+        if self.buffer_file_name is None or not os.path.exists(self.buffer_file_name):
+            return 0
+
+        with open(self.buffer_file_name, 'rb') as buffer_file:
+            return sum(1 for buffered_line in buffer_file if buffered_line.strip() != b'')
+
+
+    def _publish_loop(self):
+
+        is_stopping = False
+
+        while not is_stopping:
+            notices = []
+            deadline_time = None
+            while len(notices) < self.batch_size:
+                if deadline_time is None:
+                    # an idle wake-up retries a buffered backlog
+                    timeout = self.retry_seconds
+                else:
+                    timeout = max(0.0, deadline_time - time.monotonic())
+                try:
+                    notice = self._notice_queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if notice is None:
+                    is_stopping = True
+                    break
+                notices.append(notice)
+                if deadline_time is None:
+                    deadline_time = time.monotonic() + self.batch_interval_seconds
+
+            try:
+                self._publish_notices(notices, is_stopping=is_stopping)
+            except Exception as err:
+                self.logger.error('Landed file notice FAILURE')
+                self.logger.error(err)
+
+        return
+
+
+    def _publish_notices(self,
+                         notices: list,
+                         is_stopping: bool=False):
+
+        is_retry_due = self._last_failure_time is None \
+                       or is_stopping \
+                       or time.monotonic() - self._last_failure_time >= self.retry_seconds
+
+        # buffered notices go first, so that the order they landed in is kept
+        if self._buffered_count > 0:
+            if len(notices) > 0:
+                self._buffer_notices(notices)
+            if is_retry_due:
+                self._replay_buffer()
+            return
+
+        if len(notices) == 0:
+            return
+
+        if not is_retry_due:
+            self._buffer_notices(notices)
+            return
+
+        err_str = self.notify_sink.publish_batch(notices)
+        if err_str is None:
+            self.notices_published += len(notices)
+            self._last_failure_time = None
+        else:
+            self._on_publish_failure(err_str, len(notices))
+            self._buffer_notices(notices)
+
+        return
+
+
+    def _on_publish_failure(self,
+                            err_str: str,
+                            notice_count: int):
+
+        self.batches_failed += 1
+        if self._last_failure_time is None:
+            self.logger.error('Landed file notice publish FAILURE, buffering to "%s"', self.buffer_file_name)
+            self.logger.error(err_str)
+        else:
+            self.logger.debug('Landed file notice publish retry FAILURE, %d notices: %s', notice_count, err_str)
+        self._last_failure_time = time.monotonic()
+
+        return
+
+
+    def _buffer_notices(self,
+                        notices: list):
+
+        if self.buffer_file_name is None:
+            self.logger.error('Landed file notices LOST, no buffer file: %d', len(notices))
+            return
+
+        with open(self.buffer_file_name, 'a', encoding='utf-8') as buffer_file:
+            buffer_file.write(''.join(json.dumps(notice, separators=(',', ':'), default=str) + '\n'
+                                      for notice in notices))
+            buffer_file.flush()
+            os.fsync(buffer_file.fileno())
+        self._buffered_count += len(notices)
+        self.notices_buffered += len(notices)
+
+        return
+
+
+    def _replay_buffer(self):
+
+        with open(self.buffer_file_name, 'r', encoding='utf-8') as buffer_file:
+            buffered_lines = [buffered_line for buffered_line in buffer_file if buffered_line.strip() != '']
+
+        # a line torn by a crash mid-write can never be sent, so it is set
+        # aside rather than left to fail every replay and hold back the rest
+        buffered_notices = []
+        notice_lines = []
+        bad_lines = []
+        for buffered_line in buffered_lines:
+            buffered_line = buffered_line.rstrip('\n') + '\n'
+            try:
+                buffered_notices.append(json.loads(buffered_line))
+            except ValueError:
+                bad_lines.append(buffered_line)
+                continue
+            notice_lines.append(buffered_line)
+        if len(bad_lines) > 0:
+            self._set_aside_lines(bad_lines)
+
+        line_nbr = 0
+        while line_nbr < len(buffered_notices):
+            notices = buffered_notices[line_nbr:line_nbr + self.batch_size]
+            err_str = self.notify_sink.publish_batch(notices)
+            if err_str is not None:
+                self._on_publish_failure(err_str, len(notices))
+                break
+            line_nbr += len(notices)
+            self.notices_published += len(notices)
+
+        if line_nbr == 0 and len(bad_lines) == 0:
+            return
+
+        self._buffered_count = len(notice_lines) - line_nbr
+
+        # what was published leaves the buffer, the rest is kept for the next retry
+        if line_nbr >= len(notice_lines):
+            os.remove(self.buffer_file_name)
+            self._last_failure_time = None
+            self.logger.info('Landed file notice buffer REPLAYED: %d notices', line_nbr)
+        else:
+            work_file_name = self.buffer_file_name + '.tmp'
+            with open(work_file_name, 'w', encoding='utf-8') as work_file:
+                work_file.writelines(notice_lines[line_nbr:])
+                work_file.flush()
+                os.fsync(work_file.fileno())
+            os.replace(work_file_name, self.buffer_file_name)
+
+        return
+
+
+    def _set_aside_lines(self,
+                         bad_lines: list):
+
+        bad_file_name = self.buffer_file_name + '.bad'
+
+        with open(bad_file_name, 'a', encoding='utf-8') as bad_file:
+            bad_file.writelines(bad_lines)
+            bad_file.flush()
+            os.fsync(bad_file.fileno())
+        self.logger.error('Landed file notice buffer lines UNREADABLE, set aside to "%s": %d', bad_file_name, len(bad_lines))
+
+        return
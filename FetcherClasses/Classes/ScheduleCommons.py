@@ -0,0 +1,130 @@
+import heapq
+import logging
+import time
+
+
+class PollScheduler(object):
+    '''
+    Per-folder poll timetable: a folder that yielded files is polled again
+    soon, one that stays idle ever less often, each within the bounds
+    '''
+
+    # the interval never goes below or above these
+    min_interval_seconds = 1.0
+    max_interval_seconds = 300.0
+
+    # interval of a folder not yet polled
+    initial_interval_seconds = 60.0
+
+    # an idle poll multiplies the interval by backoff_factor,
+    # a fruitful one by tighten_factor
+    backoff_factor = 2.0
+    tighten_factor = 0.25
+
+    logger = logging
+
+    def __init__(self,
+                 min_interval_seconds: float=1.0,
+                 max_interval_seconds: float=300.0,
+                 initial_interval_seconds: float=60.0,
+                 backoff_factor: float=2.0,
+                 tighten_factor: float=0.25,
+                 logger=None):
+
+        self.min_interval_seconds = min_interval_seconds
+        self.max_interval_seconds = max(min_interval_seconds, max_interval_seconds)
+        self.initial_interval_seconds = min(max(initial_interval_seconds, self.min_interval_seconds),
+                                            self.max_interval_seconds)
+        self.backoff_factor = backoff_factor
+        self.tighten_factor = tighten_factor
+
+        if logger is not None:
+            self.logger = logger
+
+        # folder_key -> current interval, and a heap of (due_time, folder_key)
+        self._intervals = {}
+        self._due_heap = []
+
+        self.polls_total = 0
+        self.fruitful_polls_total = 0
+
+
+    def add_folder(self,
+                   folder_key: str,
+                   now=None):
+        '''
+        Schedule a folder, due at once
+        '''
+
+        if now is None:
+            now = time.monotonic()
+
+        if folder_key not in self._intervals:
+            self._intervals[folder_key] = self.initial_interval_seconds
+            heapq.heappush(self._due_heap, (now, folder_key))
+
+        return
+
+
+    def pop_due_folders(self,
+                        now=None):
+        '''
+        Return the folders due by now, most overdue first; each is off the
+        timetable until record_poll puts it back with its next due time
+        '''
+
+        if now is None:
+            now = time.monotonic()
+
+        due_folders = []
+        while len(self._due_heap) > 0 and self._due_heap[0][0] <= now:
+            due_folders.append(heapq.heappop(self._due_heap)[1])
+
+        return due_folders
+
+
+    def record_poll(self,
+                    folder_key: str,
+                    files_found: int,
+                    now=None):
+        '''
+        Set a folder's next due time from what its poll found, and return its new interval
+        '''
+
+        if now is None:
+            now = time.monotonic()
+
+        interval_seconds = self._intervals.get(folder_key, self.initial_interval_seconds)
+        if files_found > 0:
+            interval_seconds *= self.tighten_factor
+            self.fruitful_polls_total += 1
+        else:
+            interval_seconds *= self.backoff_factor
+        interval_seconds = min(max(interval_seconds, self.min_interval_seconds), self.max_interval_seconds)
+
+        self._intervals[folder_key] = interval_seconds
+        heapq.heappush(self._due_heap, (now + interval_seconds, folder_key))
+        self.polls_total += 1
+
+        return interval_seconds
+
+
+    def get_interval_seconds(self,
+                             folder_key: str):
+
+        return self._intervals.get(folder_key)
+
+
+    def get_sleep_seconds(self,
+                          now=None):
+        '''
+        Seconds until the next folder falls due, 0 if one already has
+        '''
+
+        if now is None:
+            now = time.monotonic()
+
+        if len(self._due_heap) == 0:
+            return self.max_interval_seconds
+
+        return max(0.0, self._due_heap[0][0] - now)
@@ -0,0 +1,258 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class ShardAssignment(object):
+    '''
+    This fetcher instance's share of a host's folders or files, worked out
+    alike by every instance given the same shard count
+    '''
+
+    def __init__(self,
+                 shard_index: int,
+                 shard_count: int):
+
+        if shard_count < 1 or not 0 <= shard_index < shard_count:
+            raise ValueError('Invalid shard %d of %d' % (shard_index, shard_count))
+
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+
+
+    @staticmethod
+    def get_shard(key: str,
+                  shard_count: int):
+
+        # crc32 rather than hash(), which differs from one process to the next
+        return zlib.crc32(key.encode('utf-8')) % shard_count
+
+
+    def is_owned(self,
+                 key: str):
+
+        return self.get_shard(key, self.shard_count) == self.shard_index
+
+
+    def get_owned_keys(self,
+                       keys):
+        '''
+        Deal a list every instance is configured with round-robin, in sorted
+        order, which spreads a few folders more evenly than hashing them
+        '''
+
+        return [key for key_nbr, key in enumerate(sorted(keys))
+                if key_nbr % self.shard_count == self.shard_index]
+
+
+class LeaseStore(object):
+    '''
+    Per-file leases shared by fetcher instances through an SQLite database,
+    so that only one of them downloads and removes any given file; the
+    database must live where every instance can lock it, and their clocks
+    must agree to well within lease_seconds
+    '''
+
+    lease_file_name = None
+
+    # a lease not renewed for this long is free for another instance to take
+    lease_seconds = 300.0
+
+    # seconds to wait on another instance's write before giving up
+    busy_timeout_seconds = 30.0
+
+    logger = logging
+
+    def __init__(self,
+                 lease_file_name: str='ftpfetcher_leases.db',
+                 owner_name=None,
+                 lease_seconds: float=300.0,
+                 busy_timeout_seconds: float=30.0,
+                 logger=None):
+
+        self.lease_file_name = lease_file_name
+        self.owner_name = owner_name if owner_name is not None else '%s:%d' % (socket.gethostname(), os.getpid())
+        self.lease_seconds = lease_seconds
+        self.busy_timeout_seconds = busy_timeout_seconds
+
+        if logger is not None:
+            self.logger = logger
+
+        self._db_conn = None
+        self._lock = threading.Lock()
+
+        self.leases_claimed = 0
+        self.leases_refused = 0
+
+
+    def open_store(self,
+                   logger=None):
+
+        err_str = None
+
+        if logger is None:
+            logger = self.logger
+
+        try:
+            logger.info('Lease store open ATTEMPT: "%s"', self.lease_file_name)
+            # autocommit, so that each claim is visible to the other instances at once
+            db_conn = sqlite3.connect(self.lease_file_name,
+                                      timeout=self.busy_timeout_seconds,
+                                      isolation_level=None,
+                                      check_same_thread=False)
+            db_conn.execute('CREATE TABLE IF NOT EXISTS file_lease ('
+                            'host TEXT NOT NULL, '
+                            'entity_path TEXT NOT NULL, '
+                            'owner TEXT NOT NULL, '
+                            'expires_time REAL, '
+                            'size INTEGER, '
+                            'mtime REAL, '
+                            'is_done INTEGER NOT NULL, '
+                            'updated_time REAL NOT NULL, '
+                            'PRIMARY KEY (host, entity_path))')
+            with self._lock:
+                self._db_conn = db_conn
+            logger.info('Lease store open SUCCESS: "%s", owner %s', self.lease_file_name, self.owner_name)
+        except Exception as err:
+            err_str = str(err)
+            logger.error('Lease store open FAILURE: "%s"', self.lease_file_name)
+            logger.error(err_str)
+
+        return err_str
+
+
+    def claim_lease(self,
+                    host: str,
+                    entity_path: str,
+                    remote_entry=None):
+        '''
+        Take the lease on a remote file, True if this instance now holds it;
+        refused while another instance's lease runs, or once the file has
+        been fetched in this same version, i.e. with the same size and mtime
+        '''
+
+        now = time.time()
+        size = remote_entry.size if remote_entry is not None else None
+        mtime = remote_entry.mtime if remote_entry is not None else None
+
+        with self._lock:
+            if self._db_conn is None:
+                return True
+            is_claimed = self._db_conn.execute('INSERT INTO file_lease '
+                                               '(host, entity_path, owner, expires_time, size, mtime, is_done, updated_time) '
+                                               'VALUES (?, ?, ?, ?, ?, ?, 0, ?) '
+                                               'ON CONFLICT (host, entity_path) DO UPDATE SET '
+                                               'owner = excluded.owner, '
+                                               'expires_time = excluded.expires_time, '
+                                               'size = excluded.size, '
+                                               'mtime = excluded.mtime, '
+                                               'is_done = 0, '
+                                               'updated_time = excluded.updated_time '
+                                               'WHERE (file_lease.is_done = 0 '
+                                               'AND (file_lease.owner = excluded.owner OR file_lease.expires_time < ?)) '
+                                               'OR (file_lease.is_done = 1 '
+                                               'AND NOT (file_lease.size IS excluded.size AND file_lease.mtime IS excluded.mtime))',
+                                               (host, entity_path, self.owner_name, now + self.lease_seconds, size, mtime, now,
+                                                now)).rowcount == 1
+
+        if is_claimed:
+            self.leases_claimed += 1
+        else:
+            self.leases_refused += 1
+
+        return is_claimed
+
+
+    def renew_lease(self,
+                    host: str,
+                    entity_path: str):
+        '''
+        Push a held lease's expiry out, False if it has been lost meanwhile
+        '''
+
+        now = time.time()
+
+        with self._lock:
+            if self._db_conn is None:
+                return True
+            return self._db_conn.execute('UPDATE file_lease SET expires_time = ?, updated_time = ? '
+                                         'WHERE host = ? AND entity_path = ? AND owner = ? AND is_done = 0',
+                                         (now + self.lease_seconds, now, host, entity_path, self.owner_name)).rowcount == 1
+
+
+    def get_renewer(self,
+                    host: str,
+                    entity_path: str):
+        '''
+        Return a transfer block callback renewing the lease on entity_path
+        every third of lease_seconds, which fails the transfer if it is lost
+        '''
+
+        renew_seconds = self.lease_seconds / 3.0
+        renewed_times = [time.monotonic()]
+
+        def renew_on_block(_data_block):
+            now = time.monotonic()
+            if now - renewed_times[0] < renew_seconds:
+                return
+            renewed_times[0] = now
+            if not self.renew_lease(host, entity_path):
+                raise IOError('Lease lost to another fetcher: "%s"' % entity_path)
+
+        return renew_on_block
+
+
+    def release_lease(self,
+                      host: str,
+                      entity_path: str,
+                      is_done: bool=False):
+        '''
+        Give up a held lease; one released as done keeps the file's size
+        and mtime, so no instance fetches that version of it again, even
+        from a listing taken before it was removed
+        '''
+
+        now = time.time()
+
+        with self._lock:
+            if self._db_conn is None:
+                return
+            if is_done:
+                self._db_conn.execute('UPDATE file_lease SET is_done = 1, expires_time = NULL, updated_time = ? '
+                                      'WHERE host = ? AND entity_path = ? AND owner = ?',
+                                      (now, host, entity_path, self.owner_name))
+            else:
+                self._db_conn.execute('DELETE FROM file_lease WHERE host = ? AND entity_path = ? AND owner = ?',
+                                      (host, entity_path, self.owner_name))
+
+        return
+
+
+    def prune_leases(self,
+                     max_age_seconds: float):
+        '''
+        Forget done files and lapsed leases not touched for max_age_seconds
+        '''
+
+        oldest_time = time.time() - max_age_seconds
+
+        with self._lock:
+            if self._db_conn is None:
+                return 0
+            return self._db_conn.execute('DELETE FROM file_lease WHERE updated_time < ? '
+                                         'AND (is_done = 1 OR expires_time < ?)',
+                                         (oldest_time, time.time())).rowcount
+
+
+    def close_store(self):
+
+        with self._lock:
+            if self._db_conn is not None:
+                self._db_conn.close()
+                self._db_conn = None
+
+        return
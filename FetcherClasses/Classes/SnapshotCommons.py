@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+class RemoteSnapshotStore(object):
+    '''
+    Persisted (size, mtime) view of remote folders, used to
+    process only new or changed entries on each scan cycle
+    '''
+
+    snapshot_file_name = None
+
+    # folders whose mtime is this recent are never treated as settled,
+    # since FTP LIST reports modification times to the minute at best
+    min_settled_age_seconds = 120
+
+    logger = logging
+
+    def __init__(self,
+                 snapshot_file_name: str=None,
+                 min_settled_age_seconds: int=120,
+                 logger=None):
+
+        self.snapshot_file_name = snapshot_file_name
+        self.min_settled_age_seconds = min_settled_age_seconds
+
+        if logger is not None:
+            self.logger = logger
+
+        # folder_path -> {'mtime': float or None,
+        #                 'settled': bool,
+        #                 'dirs': [sub-folder names],
+        #                 'files': {file name: [size, mtime]}}
+        self._folders = {}
+        self._lock = threading.Lock()
+        self._is_dirty = False
+
+        self.folders_skipped = 0
+        self.entries_unchanged = 0
+
+
+    def load_snapshot(self,
+                      logger=None):
+
+        err_str = None
+
+        if logger is None:
+            logger = self.logger
+
+        if self.snapshot_file_name is not None and os.path.exists(self.snapshot_file_name):
+            try:
+                logger.info('Snapshot load ATTEMPT: "%s"', self.snapshot_file_name)
+                with open(self.snapshot_file_name, 'r') as snapshot_file:
+                    folders = json.load(snapshot_file)
+                with self._lock:
+                    self._folders = folders
+                    self._is_dirty = False
+                logger.info('Snapshot load SUCCESS: "%s", folders: %d', self.snapshot_file_name, len(folders))
+            except Exception as err:
+                err_str = str(err)
+                logger.error('Snapshot load FAILURE: "%s"', self.snapshot_file_name)
+                logger.error(err_str)
+
+        return err_str
+
+
+    def save_snapshot(self,
+                      logger=None):
+
+        err_str = None
+
+        if logger is None:
+            logger = self.logger
+
+        if self.snapshot_file_name is None or not self._is_dirty:
+            return err_str
+
+        with self._lock:
+            snapshot_text = json.dumps(self._folders, separators=(',', ':'))
+            self._is_dirty = False
+
+        # write aside then rename so that a crash
+        # never leaves a truncated snapshot behind
+        temp_file_name = self.snapshot_file_name + '.tmp'
+        try:
+            with open(temp_file_name, 'w') as snapshot_file:
+                snapshot_file.write(snapshot_text)
+            os.replace(temp_file_name, self.snapshot_file_name)
+        except Exception as err:
+            err_str = str(err)
+            self._is_dirty = True
+            logger.error('Snapshot save FAILURE: "%s"', self.snapshot_file_name)
+            logger.error(err_str)
+
+        return err_str
+
+
+    def is_folder_unchanged(self,
+                            folder_path: str,
+                            folder_mtime):
+        '''
+        True when the folder settled with this same mtime, meaning
+        its own entries cannot have been added, removed or renamed
+        '''
+
+        if folder_mtime is None:
+            return False
+
+        with self._lock:
+            folder_record = self._folders.get(folder_path)
+            is_unchanged = folder_record is not None \
+                and folder_record['settled'] \
+                and folder_record['mtime'] == folder_mtime
+
+        if is_unchanged:
+            self.folders_skipped += 1
+
+        return is_unchanged
+
+
+    def get_sub_folder_names(self,
+                             folder_path: str):
+
+        with self._lock:
+            folder_record = self._folders.get(folder_path)
+            return list(folder_record['dirs']) if folder_record is not None else []
+
+
+    def is_entry_changed(self,
+                         folder_path: str,
+                         remote_entry):
+
+        with self._lock:
+            folder_record = self._folders.get(folder_path)
+            file_record = folder_record['files'].get(remote_entry.entity_name) if folder_record is not None else None
+
+        is_changed = file_record is None \
+            or file_record[0] != remote_entry.size \
+            or file_record[1] != remote_entry.mtime
+
+        if not is_changed:
+            self.entries_unchanged += 1
+
+        return is_changed
+
+
+    def record_folder(self,
+                      folder_path: str,
+                      folder_mtime,
+                      dir_entries,
+                      file_entries,
+                      has_pending_entries: bool):
+
+        listed_dir_names = [dir_entry.entity_name for dir_entry in dir_entries]
+        listed_file_names = set(file_entry.entity_name for file_entry in file_entries)
+
+        is_settled = folder_mtime is not None \
+            and not has_pending_entries \
+            and time.time() - folder_mtime >= self.min_settled_age_seconds
+
+        with self._lock:
+            folder_record = self._folders.get(folder_path)
+            if folder_record is None:
+                file_records = {}
+            else:
+                # forget files that are no longer listed
+                file_records = dict((file_name, file_record)
+                                    for file_name, file_record in folder_record['files'].items()
+                                    if file_name in listed_file_names)
+                # and sub-folders that have gone away, with all beneath them
+                for dir_name in set(folder_record['dirs']) - set(listed_dir_names):
+                    self._forget_folder(folder_path.rstrip('/') + '/' + dir_name)
+
+            self._folders[folder_path] = {'mtime': folder_mtime,
+                                          'settled': is_settled,
+                                          'dirs': listed_dir_names,
+                                          'files': file_records}
+            self._is_dirty = True
+
+        return is_settled
+
+
+    def record_entry(self,
+                     folder_path: str,
+                     remote_entry):
+
+        with self._lock:
+            folder_record = self._folders.setdefault(folder_path, {'mtime': None,
+                                                                   'settled': False,
+                                                                   'dirs': [],
+                                                                   'files': {}})
+            folder_record['files'][remote_entry.entity_name] = [remote_entry.size, remote_entry.mtime]
+            self._is_dirty = True
+
+        return
+
+
+    def forget_entry(self,
+                     folder_path: str,
+                     entity_name: str):
+
+        with self._lock:
+            folder_record = self._folders.get(folder_path)
+            if folder_record is not None and folder_record['files'].pop(entity_name, None) is not None:
+                self._is_dirty = True
+
+        return
+
+
+    def _forget_folder(self,
+                       folder_path: str):
+
+        folder_prefix = folder_path + '/'
+        for stale_path in [path for path in self._folders
+                           if path == folder_path or path.startswith(folder_prefix)]:
+            del self._folders[stale_path]
+
+        return
@@ -0,0 +1,458 @@
+import fnmatch
+import itertools
+import logging
+import queue
+import threading
+import time
+
+
+def copy_stream(source_file,
+                target_file,
+                block_size: int=65536,
+                block_callback=None):
+    '''
+    Copy source_file to target_file block by block, handing each block
+    to block_callback as it lands; returns the number of bytes copied
+    '''
+
+    bytes_copied = 0
+
+    while True:
+        data_block = source_file.read(block_size)
+        if not data_block:
+            break
+        target_file.write(data_block)
+        bytes_copied += len(data_block)
+        if block_callback is not None:
+            block_callback(data_block)
+
+    return bytes_copied
+
+
+class TransferJob(object):
+    '''
+    A single remote-to-local file download request and its outcome
+    '''
+
+    def __init__(self,
+                 remote_path_name: str,
+                 remote_file_name: str,
+                 target_path_name: str,
+                 target_file_name: str,
+                 remote_entry=None):
+
+        self.remote_path_name = remote_path_name
+        self.remote_file_name = remote_file_name
+        self.target_path_name = target_path_name
+        self.target_file_name = target_file_name
+        self.remote_entry = remote_entry
+
+        self.target_full_name = None
+        self.err_str = None
+        self.worker_name = None
+        self.elapsed_seconds = 0.0
+        self.is_done = False
+
+
+class DownloadOrderPolicy(object):
+    '''
+    Orders waiting TransferJobs, the lowest score downloading first;
+    a job is scored once, when queued, and equal scores keep queue order
+    '''
+
+    def get_score(self,
+                  transfer_job):
+        return 0
+
+
+class OldestFirstPolicy(DownloadOrderPolicy):
+    '''
+    Files that have waited longest on the remote host go first
+    '''
+
+    def get_score(self,
+                  transfer_job):
+
+        remote_entry = transfer_job.remote_entry
+        if remote_entry is None or remote_entry.mtime is None:
+            return float('inf')
+
+        return remote_entry.mtime
+
+
+class SmallestFirstPolicy(DownloadOrderPolicy):
+    '''
+    Small files go first, so one huge file holds up none of them
+    '''
+
+    def get_score(self,
+                  transfer_job):
+
+        remote_entry = transfer_job.remote_entry
+        if remote_entry is None or remote_entry.size is None:
+            return float('inf')
+
+        return remote_entry.size
+
+
+class WeightedPolicy(DownloadOrderPolicy):
+    '''
+    Files whose remote path matches a heavier (fnmatch pattern, weight) go
+    first, e.g. ('/feeds/sla/*', 10); the first matching pattern counts,
+    and base_policy orders files of equal weight
+    '''
+
+    def __init__(self,
+                 pattern_weights,
+                 base_policy=None,
+                 default_weight: float=0):
+
+        self.pattern_weights = list(pattern_weights)
+        self.base_policy = base_policy if base_policy is not None else DownloadOrderPolicy()
+        self.default_weight = default_weight
+
+
+    def get_weight(self,
+                   entity_path: str):
+
+        for pattern, weight in self.pattern_weights:
+            if fnmatch.fnmatchcase(entity_path, pattern):
+                return weight
+
+        return self.default_weight
+
+
+    def get_score(self,
+                  transfer_job):
+
+        entity_path = transfer_job.remote_path_name + '/' + transfer_job.remote_file_name
+
+        return (-self.get_weight(entity_path), self.base_policy.get_score(transfer_job))
+
+
+class ScoreFuncPolicy(DownloadOrderPolicy):
+    '''
+    Custom ordering: score_func(transfer_job) returns the job's score
+    '''
+
+    def __init__(self,
+                 score_func):
+
+        self.score_func = score_func
+
+
+    def get_score(self,
+                  transfer_job):
+
+        return self.score_func(transfer_job)
+
+
+order_policy_classes = {'fifo': DownloadOrderPolicy,
+                        'oldest': OldestFirstPolicy,
+                        'smallest': SmallestFirstPolicy}
+
+
+def get_order_policy(policy_name: str,
+                     pattern_weights=None):
+    '''
+    Return the named policy, weighted by pattern_weights if any are given
+    '''
+
+    order_policy_class = order_policy_classes.get(policy_name)
+    if order_policy_class is None:
+        raise ValueError('Unsupported download order: %s' % policy_name)
+
+    order_policy = order_policy_class()
+    if pattern_weights:
+        order_policy = WeightedPolicy(pattern_weights, base_policy=order_policy)
+
+    return order_policy
+
+
+class TransferProgress(object):
+    '''
+    Progress of a single transfer, reported by sampling rather than on every block
+    '''
+
+    # report each time this many more percent of the file has landed
+    report_prcnt_amount = 5
+    # and at least this often on transfers too slow to move that far
+    report_interval_seconds = 10.0
+    # the clock is only read once this many bytes have landed since the last look
+    check_interval_bytes = 1048576
+    report_log_level = logging.INFO
+
+    logger = logging
+
+    def __init__(self,
+                 entity_path: str,
+                 bytes_total: int,
+                 bytes_start: int=0,
+                 report_prcnt_amount: int=5,
+                 report_interval_seconds: float=10.0,
+                 report_log_level: int=logging.INFO,
+                 logger=None):
+
+        self.entity_path = entity_path
+        self.bytes_total = bytes_total
+        self.bytes_start = bytes_start
+        self.bytes_sofar = bytes_start
+        self.report_prcnt_amount = report_prcnt_amount
+        self.report_interval_seconds = report_interval_seconds
+        self.report_log_level = report_log_level
+
+        if logger is not None:
+            self.logger = logger
+
+        self.start_time = time.time()
+        self._last_report_time = self.start_time
+        # a transfer of unknown size is reported by the clock alone
+        if bytes_total is not None:
+            self._end_bytes = bytes_total
+        else:
+            self._end_bytes = float('inf')
+        if report_prcnt_amount > 0 and bytes_total is not None:
+            self._prcnt_step_bytes = max(1, bytes_total * report_prcnt_amount // 100)
+        else:
+            self._prcnt_step_bytes = None
+        self._next_prcnt_bytes = bytes_start if bytes_total is not None else self._end_bytes
+        self._next_check_bytes = bytes_start
+
+
+    def add_data_block(self,
+                       data_block):
+        '''
+        Per-block hook for copy_stream, kept to an add and a compare
+        '''
+
+        self.bytes_sofar += len(data_block)
+        if self.bytes_sofar >= self._next_check_bytes:
+            self._check_report()
+
+        return
+
+
+    def _check_report(self):
+
+        now = time.time()
+
+        if self.bytes_sofar >= self._next_prcnt_bytes \
+        or self.bytes_sofar >= self._end_bytes \
+        or now - self._last_report_time >= self.report_interval_seconds:
+            self.report(now)
+            # the last block always reports, wherever the steps fall
+            if self._prcnt_step_bytes is not None:
+                self._next_prcnt_bytes = min(self.bytes_sofar + self._prcnt_step_bytes, self._end_bytes)
+            else:
+                self._next_prcnt_bytes = self._end_bytes
+
+        self._next_check_bytes = min(self._next_prcnt_bytes, self.bytes_sofar + self.check_interval_bytes)
+
+        return
+
+
+    def get_bytes_per_second(self,
+                             now=None):
+
+        elapsed_seconds = (now if now is not None else time.time()) - self.start_time
+        if elapsed_seconds <= 0:
+            return 0.0
+
+        return (self.bytes_sofar - self.bytes_start) / elapsed_seconds
+
+
+    def report(self,
+               now=None):
+
+        if now is None:
+            now = time.time()
+        self._last_report_time = now
+
+        if self.bytes_total is None:
+            self.logger.log(self.report_log_level,
+                            'Bytes xfered: %d of total bytes: unknown, %.2f MB/s: "%s"',
+                            self.bytes_sofar,
+                            self.get_bytes_per_second(now) / 1048576.0,
+                            self.entity_path)
+            return
+
+        if self.bytes_total > 0:
+            bytes_xfered_prcnt = int(self.bytes_sofar * 100.0 / self.bytes_total)
+        else:
+            bytes_xfered_prcnt = 100
+
+        self.logger.log(self.report_log_level,
+                        'Bytes xfered: %d of total bytes: %d, pct transferred: %d, %.2f MB/s: "%s"',
+                        self.bytes_sofar,
+                        self.bytes_total,
+                        bytes_xfered_prcnt,
+                        self.get_bytes_per_second(now) / 1048576.0,
+                        self.entity_path)
+
+        return
+
+
+class ParallelDownloader(object):
+    '''
+    Worker pool that downloads queued TransferJobs, one connection per worker
+    '''
+
+    worker_count = 4
+
+    logger = logging
+
+    def __init__(self,
+                 ftp_scanner,
+                 worker_count: int=4,
+                 remove_remote_file_on_download: bool=False,
+                 on_job_done=None,
+                 order_policy=None,
+                 logger=None,
+                 is_test_mode: bool=False):
+
+        self.ftp_scanner = ftp_scanner
+        self.worker_count = max(1, worker_count)
+        self.remove_remote_file_on_download = remove_remote_file_on_download
+        self.on_job_done = on_job_done
+        self.order_policy = order_policy if order_policy is not None else DownloadOrderPolicy()
+        self.is_test_mode = is_test_mode
+
+        if logger is not None:
+            self.logger = logger
+        else:
+            self.logger = ftp_scanner.logger
+
+        # entries are (is_stop, score, sequence, transfer_job), the sequence
+        # keeping submission order among equal scores, and the stop
+        # sentinels sorting after every job
+        self._job_queue = queue.PriorityQueue()
+        self._job_sequence = itertools.count()
+        self._workers = []
+        self._lock = threading.Lock()
+
+        self.jobs_submitted = 0
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.jobs_done = []
+
+
+    def start(self):
+
+        for worker_nbr in range(self.worker_count):
+            worker = threading.Thread(target=self._worker_loop,
+                                      name='FtpWorker-%d' % (worker_nbr + 1))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+        self.logger.info('Download workers STARTED: %d', self.worker_count)
+
+        return
+
+
+    def submit_job(self,
+                   transfer_job):
+
+        with self._lock:
+            self.jobs_submitted += 1
+        self._job_queue.put((0, self.order_policy.get_score(transfer_job), next(self._job_sequence), transfer_job))
+
+        return
+
+
+    def join(self):
+
+        # one stop sentinel per worker, queued behind all submitted jobs
+        for _worker in self._workers:
+            self._job_queue.put((1, 0, next(self._job_sequence), None))
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+        self.logger.info('Download workers STOPPED, jobs completed: %d of %d, failed: %d',
+                         self.jobs_completed, self.jobs_submitted, self.jobs_failed)
+
+        return self.jobs_done, self.jobs_failed
+
+
+    def _worker_loop(self):
+
+        worker_name = threading.current_thread().name
+        ftp_conn = None
+
+        while True:
+            _is_stop, _score, _sequence, transfer_job = self._job_queue.get()
+            if transfer_job is None:
+                break
+
+            err_str = None
+            start_time = time.time()
+
+            if ftp_conn is None:
+                ftp_conn, err_str = self.ftp_scanner.borrow_connection(logger=self.logger,
+                                                                       is_test_mode=self.is_test_mode)
+
+            if err_str is None:
+                try:
+                    transfer_job.target_full_name, err_str = self.ftp_scanner.get_remote_file(transfer_job.remote_path_name,
+                                                                                              transfer_job.remote_file_name,
+                                                                                              transfer_job.target_path_name,
+                                                                                              transfer_job.target_file_name,
+                                                                                              ftp_conn,
+                                                                                              False,
+                                                                                              self.remove_remote_file_on_download,
+                                                                                              logger=self.logger,
+                                                                                              is_test_mode=self.is_test_mode,
+                                                                                              remote_entry=transfer_job.remote_entry)
+                except Exception as err:
+                    err_str = str(err)
+
+            if err_str is not None and ftp_conn is not None \
+            and not self.ftp_scanner.check_connection(ftp_conn, logger=self.logger):
+                # drop a broken connection and borrow
+                # a fresh one for the next job
+                self.ftp_scanner.return_connection(ftp_conn, discard=True, logger=self.logger)
+                ftp_conn = None
+
+            transfer_job.err_str = err_str
+            transfer_job.worker_name = worker_name
+            transfer_job.elapsed_seconds = time.time() - start_time
+            transfer_job.is_done = True
+
+            self._report_job(transfer_job)
+
+        if ftp_conn is not None:
+            self.ftp_scanner.return_connection(ftp_conn, logger=self.logger)
+
+        return
+
+
+    def _report_job(self,
+                    transfer_job):
+
+        with self._lock:
+            self.jobs_completed += 1
+            if transfer_job.err_str is not None:
+                self.jobs_failed += 1
+            self.jobs_done.append(transfer_job)
+            jobs_completed = self.jobs_completed
+            jobs_submitted = self.jobs_submitted
+
+        remote_entity_name = transfer_job.remote_path_name + '/' + transfer_job.remote_file_name
+        if transfer_job.err_str is None:
+            self.logger.log(self.ftp_scanner.file_log_level,
+                            'Download job SUCCESS [%s] %.3fs: "%s"',
+                            transfer_job.worker_name, transfer_job.elapsed_seconds, remote_entity_name)
+        else:
+            self.logger.error('Download job FAILURE [%s] %.3fs: "%s"',
+                              transfer_job.worker_name, transfer_job.elapsed_seconds, remote_entity_name)
+            self.logger.error(transfer_job.err_str)
+        self.logger.log(self.ftp_scanner.file_log_level, 'Download jobs completed: %d of %d', jobs_completed, jobs_submitted)
+
+        if self.on_job_done is not None:
+            try:
+                self.on_job_done(transfer_job)
+            except Exception as err:
+                self.logger.error(err)
+
+        return
@@ -0,0 +1,836 @@
+import calendar
+import ftplib
+import logging
+import posixpath
+import re
+import socket
+import time
+
+from FetcherClasses.Classes.ConnectionCommons import TunedFtpSession
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.ListingCommons import RemoteEntry
+
+
+class RemoteTransport(object):
+    '''
+    One open connection to a remote host, offering just the operations the scanner needs
+    '''
+
+    # SFTP transports take the sftp_* scanner settings, FTP ones the ftp_* settings
+    is_sftp = False
+
+    # read size used when copying a remote file
+    block_size = 65536
+
+    # whether stat_entry reports a folder's mtime in a round trip of its
+    # own, rather than by listing the folder's parent or not at all
+    has_folder_stat = False
+
+    # called once the connection is closed, e.g. to hand back a session slot
+    on_session_closed = None
+
+    @classmethod
+    def connect(cls,
+                host_url: str,
+                host_port: int,
+                username: str,
+                password: str,
+                **transport_options):
+        raise NotImplementedError
+
+
+    @classmethod
+    def is_auth_error(cls,
+                      err):
+        '''
+        Whether a connect failure was the server rejecting the credentials
+        '''
+        return False
+
+
+    def list_folder(self,
+                    folder_path: str):
+        '''
+        Return a RemoteEntry for every entry in folder_path, from a single listing
+        '''
+        raise NotImplementedError
+
+
+    def stat_entry(self,
+                   entity_path: str):
+        '''
+        Return the RemoteEntry of entity_path, following links
+        '''
+        raise NotImplementedError
+
+
+    def open_read(self,
+                  entity_path: str,
+                  offset: int=0,
+                  file_size=None):
+        '''
+        Return a file-like object reading entity_path from byte offset onward
+        '''
+        raise NotImplementedError
+
+
+    def get_remote_digest(self,
+                          entity_path: str,
+                          algorithm_names=()):
+        '''
+        Return (algorithm name, hex digest) of entity_path as hashed by
+        the server, preferring algorithm_names, or None if it cannot
+        '''
+        return None
+
+
+    def remove(self,
+               entity_path: str):
+        raise NotImplementedError
+
+
+    def keep_alive(self):
+        '''
+        One round trip to the server, which raises if the connection is broken
+        '''
+        raise NotImplementedError
+
+
+    def exists(self,
+               entity_path: str):
+
+        try:
+            self.stat_entry(entity_path)
+        except (IOError, ftplib.error_perm):
+            return False
+
+        return True
+
+
+    def clear_cache(self):
+        return
+
+
+    def close(self):
+        raise NotImplementedError
+
+
+    def close_session(self):
+        '''
+        Close the connection, then tell whoever is counting open sessions
+        '''
+
+        try:
+            self.close()
+        finally:
+            on_session_closed, self.on_session_closed = self.on_session_closed, None
+            if on_session_closed is not None:
+                on_session_closed()
+
+        return
+
+
+    @staticmethod
+    def get_entry(entity_path: str,
+                  stat_result):
+
+        return RemoteEntry.from_stat(posixpath.basename(entity_path) or entity_path,
+                                     posixpath.dirname(entity_path),
+                                     stat_result)
+
+
+class FtpDataStream(object):
+    '''
+    File-like reader over an ftplib data connection, completing the transfer on close
+    '''
+
+    def __init__(self,
+                 ftp_session,
+                 data_conn):
+
+        self.ftp_session = ftp_session
+        self.data_conn = data_conn
+        self.is_eof = False
+
+
+    def read(self,
+             size: int=65536):
+
+        data_block = self.data_conn.recv(size)
+        if not data_block:
+            self.is_eof = True
+
+        return data_block
+
+
+    def close(self):
+
+        if self.data_conn is None:
+            return
+
+        self.data_conn.close()
+        self.data_conn = None
+
+        if self.is_eof:
+            self.ftp_session.voidresp()
+        else:
+            # abandoned part way, so the reply is most likely a 426
+            try:
+                self.ftp_session.voidresp()
+            except ftplib.Error:
+                pass
+
+        return
+
+
+class FtplibTransport(RemoteTransport):
+    '''
+    FTP directly over ftplib: MLSD listings, MLST stats and REST resumes,
+    with the session held in binary mode throughout
+    '''
+
+    # LIST output of Unix-style servers, for those without MLSD: the mode
+    # may end in an ACL, SELinux or xattr flag, the group may be missing,
+    # and device files show "major, minor" where the size would be
+    list_line_pattern = re.compile(r'^([\-dlbcps])\S{9}[+.@]?\s+\d+\s+\S+(?:\s+\S+)?\s+(\d+|\d+,\s*\d+)\s+'
+                                   r'(\w{3}\s+\d{1,2}\s+(?:\d{1,2}:\d{2}|\d{4}))\s+(.+)$')
+    # LIST output of DOS-style servers such as IIS, e.g.
+    # "01-15-21  03:45PM       <DIR>          reports"
+    dos_list_line_pattern = re.compile(r'^(\d{2}-\d{2}-(?:\d{4}|\d{2}))\s+(\d{1,2}:\d{2}(?:[AaPp][Mm])?)\s+(<DIR>|\d+)\s+(.+)$')
+
+    logger = logging
+
+    def __init__(self,
+                 ftp_session,
+                 block_size: int=65536):
+
+        self.ftp_session = ftp_session
+        self.block_size = block_size
+
+        self.features = self._get_features()
+        self.has_mlst = 'MLST' in self.features
+        # without MLST a folder is only found by CWD, which reports no mtime
+        self.has_folder_stat = self.has_mlst
+
+        # binary from the start, which listings read as well, so
+        # neither a download nor a listing spends a round trip on TYPE
+        self.ftp_session.voidcmd('TYPE I')
+        if self.has_mlst:
+            try:
+                self.ftp_session.sendcmd('OPTS MLST type;size;modify;')
+            except ftplib.Error:
+                pass
+
+
+    @classmethod
+    def connect(cls,
+                host_url: str,
+                host_port: int,
+                username: str,
+                password: str,
+                socket_buffer_size=None,
+                block_size: int=65536,
+                timeout=None):
+
+        ftp_session = TunedFtpSession(host_url,
+                                      username,
+                                      password,
+                                      port=host_port,
+                                      socket_buffer_size=socket_buffer_size,
+                                      timeout=timeout)
+        try:
+            return cls(ftp_session, block_size=block_size)
+        except:
+            ftp_session.close()
+            raise
+
+
+    @classmethod
+    def is_auth_error(cls,
+                      err):
+
+        # 530 Not logged in
+        return isinstance(err, ftplib.error_perm) and str(err).startswith('530')
+
+
+    def _get_features(self):
+
+        try:
+            feat_resp = self.ftp_session.sendcmd('FEAT')
+        except ftplib.Error:
+            return set()
+
+        # feature lines are the indented ones between the 211 lines
+        return set(line.strip().split(' ')[0].upper()
+                   for line in feat_resp.splitlines()
+                   if line.startswith(' '))
+
+
+    def _retrieve_lines(self,
+                        cmd: str):
+
+        data_conn, _size = self.ftp_session.ntransfercmd(cmd)
+        with data_conn, data_conn.makefile('rb') as data_file:
+            data_bytes = data_file.read()
+        self.ftp_session.voidresp()
+
+        return data_bytes.decode(self.ftp_session.encoding).splitlines()
+
+
+    @staticmethod
+    def _parse_facts(facts_str: str):
+
+        facts = {}
+        for fact in facts_str.split(';'):
+            fact_name, _sep, fact_value = fact.partition('=')
+            if fact_name:
+                facts[fact_name.lower()] = fact_value
+
+        return facts
+
+
+    @staticmethod
+    def _parse_timeval(timeval: str):
+
+        # YYYYMMDDHHMMSS[.sss], always UTC
+        mtime = calendar.timegm(time.strptime(timeval[:14], '%Y%m%d%H%M%S'))
+        if len(timeval) > 15 and timeval[14] == '.':
+            mtime += float('0' + timeval[14:])
+
+        return mtime
+
+
+    def _get_entry_from_facts(self,
+                              entity_name: str,
+                              folder_path: str,
+                              facts: dict):
+
+        entry_type = facts.get('type', '').lower()
+        size = facts.get('size')
+        modify = facts.get('modify')
+
+        if folder_path is not None and folder_path != '':
+            entity_path = posixpath.join(folder_path, entity_name)
+        else:
+            entity_path = entity_name
+
+        return RemoteEntry(entity_name,
+                           entity_path,
+                           size=int(size) if size else None,
+                           mtime=self._parse_timeval(modify) if modify else None,
+                           is_dir=entry_type == 'dir',
+                           is_file=entry_type == 'file',
+                           is_link=entry_type.startswith('os.unix=slink') or entry_type == 'os.unix=symlink')
+
+
+    def _get_entry_from_list_line(self,
+                                  list_line: str,
+                                  folder_path: str):
+
+        line_match = self.list_line_pattern.match(list_line)
+        if line_match is None:
+            return self._get_entry_from_dos_line(list_line, folder_path)
+
+        entry_type, size, date_str, entity_name = line_match.groups()
+        if entry_type == 'l':
+            entity_name = entity_name.split(' -> ')[0]
+
+        # recent entries show a time instead of a year, and
+        # belong to the latest year that keeps them in the past
+        date_fields = date_str.split()
+        if ':' in date_fields[2]:
+            now = time.gmtime()
+            mtime = calendar.timegm(time.strptime('%s %s %d %s' % (date_fields[0], date_fields[1], now.tm_year, date_fields[2]), '%b %d %Y %H:%M'))
+            if mtime > calendar.timegm(now) + 86400:
+                mtime = calendar.timegm(time.strptime('%s %s %d %s' % (date_fields[0], date_fields[1], now.tm_year - 1, date_fields[2]), '%b %d %Y %H:%M'))
+        else:
+            mtime = calendar.timegm(time.strptime(date_str, '%b %d %Y'))
+
+        return RemoteEntry(entity_name,
+                           posixpath.join(folder_path, entity_name) if folder_path else entity_name,
+                           size=int(size) if ',' not in size else None,
+                           mtime=mtime,
+                           is_dir=entry_type == 'd',
+                           is_file=entry_type == '-',
+                           is_link=entry_type == 'l')
+
+
+    def _get_entry_from_dos_line(self,
+                                 list_line: str,
+                                 folder_path: str):
+
+        line_match = self.dos_list_line_pattern.match(list_line)
+        if line_match is None:
+            return None
+
+        date_str, time_str, size, entity_name = line_match.groups()
+
+        date_format = '%m-%d-%Y' if len(date_str) == 10 else '%m-%d-%y'
+        if time_str[-1:] in 'Mm':
+            mtime = calendar.timegm(time.strptime('%s %s' % (date_str, time_str.upper()), date_format + ' %I:%M%p'))
+        else:
+            mtime = calendar.timegm(time.strptime('%s %s' % (date_str, time_str), date_format + ' %H:%M'))
+
+        return RemoteEntry(entity_name,
+                           posixpath.join(folder_path, entity_name) if folder_path else entity_name,
+                           size=int(size) if size != '<DIR>' else None,
+                           mtime=mtime,
+                           is_dir=size == '<DIR>',
+                           is_file=size != '<DIR>')
+
+
+    def list_folder(self,
+                    folder_path: str):
+
+        remote_entries = []
+
+        if self.has_mlst:
+            for list_line in self._retrieve_lines('MLSD ' + folder_path):
+                facts_str, _sep, entity_name = list_line.partition(' ')
+                if not entity_name or entity_name in ('.', '..'):
+                    continue
+                facts = self._parse_facts(facts_str)
+                if facts.get('type', '').lower() in ('cdir', 'pdir'):
+                    continue
+                remote_entries.append(self._get_entry_from_facts(entity_name, folder_path, facts))
+        else:
+            for list_line in self._retrieve_lines('LIST ' + folder_path):
+                remote_entry = self._get_entry_from_list_line(list_line, folder_path)
+                if remote_entry is None:
+                    # Unix listings open with a block count
+                    if list_line.strip() and not list_line.startswith('total '):
+                        self.logger.warning('Remote listing line NOT understood, entry skipped: "%s"', list_line)
+                    continue
+                if remote_entry.entity_name not in ('.', '..'):
+                    remote_entries.append(remote_entry)
+
+        return remote_entries
+
+
+    def stat_entry(self,
+                   entity_path: str):
+
+        entity_name = posixpath.basename(entity_path) or entity_path
+        folder_path = posixpath.dirname(entity_path)
+
+        if self.has_mlst:
+            for resp_line in self.ftp_session.sendcmd('MLST ' + entity_path).splitlines():
+                if resp_line.startswith(' '):
+                    facts_str, _sep, _path = resp_line[1:].partition(' ')
+                    return self._get_entry_from_facts(entity_name, folder_path, self._parse_facts(facts_str))
+            raise ftplib.error_reply('No facts in MLST reply: "%s"' % entity_path)
+
+        # without MLST a file answers SIZE and MDTM, and a folder only CWD
+        try:
+            size = self.ftp_session.size(entity_path)
+        except ftplib.error_perm:
+            current_path = self.ftp_session.pwd()
+            self.ftp_session.cwd(entity_path)
+            self.ftp_session.cwd(current_path)
+            return RemoteEntry(entity_name, entity_path, is_dir=True)
+
+        mdtm_resp = self.ftp_session.sendcmd('MDTM ' + entity_path)
+
+        return RemoteEntry(entity_name,
+                           entity_path,
+                           size=size,
+                           mtime=self._parse_timeval(mdtm_resp[4:].strip()),
+                           is_file=True)
+
+
+    def open_read(self,
+                  entity_path: str,
+                  offset: int=0,
+                  file_size=None):
+
+        # REST tells the server where to restart the transfer
+        data_conn, _size = self.ftp_session.ntransfercmd('RETR ' + entity_path, rest=offset if offset > 0 else None)
+
+        return FtpDataStream(self.ftp_session, data_conn)
+
+
+    def remove(self,
+               entity_path: str):
+
+        self.ftp_session.delete(entity_path)
+
+        return
+
+
+    def keep_alive(self):
+
+        self.ftp_session.voidcmd('NOOP')
+
+        return
+
+
+    def close(self):
+
+        try:
+            self.ftp_session.quit()
+        except Exception:
+            self.ftp_session.close()
+
+        return
+
+
+class ParamikoTransport(RemoteTransport):
+    '''
+    SFTP directly over paramiko.SFTPClient, with pipelined reads
+    '''
+
+    is_sftp = True
+
+    block_size = 32768
+
+    has_folder_stat = True
+
+    # hash names of the check-file extension, most preferred first
+    check_file_algorithms = ('sha256', 'sha512', 'sha384', 'sha224', 'sha1', 'md5')
+
+    def __init__(self,
+                 sftp_client,
+                 ssh_client=None,
+                 block_size: int=32768,
+                 prefetch: bool=True):
+
+        self.sftp_client = sftp_client
+        self.ssh_client = ssh_client
+        self.block_size = block_size
+        self.prefetch = prefetch
+
+        # None until the server has been asked for a check-file hash
+        self.has_check_file = None
+
+
+    @classmethod
+    def connect(cls,
+                host_url: str,
+                host_port: int,
+                username: str,
+                password: str,
+                known_hosts_file=None,
+                tcp_nodelay: bool=True,
+                block_size: int=32768,
+                prefetch: bool=True,
+                timeout=None):
+
+        import paramiko
+
+        ssh_client = paramiko.SSHClient()
+        try:
+            # unknown host keys are refused, as pysftp does
+            if known_hosts_file is not None:
+                ssh_client.get_host_keys().load(known_hosts_file)
+            else:
+                ssh_client.load_system_host_keys()
+            ssh_client.set_missing_host_key_policy(paramiko.RejectPolicy())
+            ssh_client.connect(host_url,
+                               port=host_port,
+                               username=username,
+                               password=password,
+                               timeout=timeout,
+                               allow_agent=False,
+                               look_for_keys=False)
+            if tcp_nodelay:
+                ssh_client.get_transport().sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sftp_client = ssh_client.open_sftp()
+        except:
+            ssh_client.close()
+            raise
+
+        return cls(sftp_client,
+                   ssh_client=ssh_client,
+                   block_size=block_size,
+                   prefetch=prefetch)
+
+
+    @classmethod
+    def is_auth_error(cls,
+                      err):
+
+        import paramiko
+
+        return isinstance(err, paramiko.AuthenticationException)
+
+
+    def list_folder(self,
+                    folder_path: str):
+
+        # a single READDIR exchange carries every entry's attributes
+        return [RemoteEntry.from_stat(sftp_attrs.filename, folder_path, sftp_attrs)
+                for sftp_attrs in self.sftp_client.listdir_attr(folder_path)]
+
+
+    def stat_entry(self,
+                   entity_path: str):
+
+        return self.get_entry(entity_path, self.sftp_client.stat(entity_path))
+
+
+    def open_read(self,
+                  entity_path: str,
+                  offset: int=0,
+                  file_size=None):
+
+        remote_file = self.sftp_client.open(entity_path, mode='rb')
+        try:
+            remote_file.seek(offset)
+            if self.prefetch:
+                # pipeline the reads rather than one round trip per block; the
+                # whole file is requested up front, paramiko's cap on requests
+                # in flight being a sleep loop which the reader outruns
+                remote_file.prefetch(file_size)
+        except:
+            remote_file.close()
+            raise
+
+        return remote_file
+
+
+    def get_remote_digest(self,
+                          entity_path: str,
+                          algorithm_names=()):
+
+        if self.has_check_file is False:
+            return None
+
+        from paramiko.sftp import CMD_EXTENDED
+        from paramiko.sftp_file import int64
+
+        algorithm_list = [algorithm_name for algorithm_name in algorithm_names
+                          if algorithm_name in self.check_file_algorithms]
+        algorithm_list += [algorithm_name for algorithm_name in self.check_file_algorithms
+                           if algorithm_name not in algorithm_list]
+
+        remote_file = self.sftp_client.open(entity_path, mode='rb')
+        try:
+            # as SFTPFile.check, which hides the algorithm the server chose
+            _resp_type, resp_msg = self.sftp_client._request(CMD_EXTENDED,
+                                                             'check-file',
+                                                             remote_file.handle,
+                                                             ','.join(algorithm_list),
+                                                             int64(0),
+                                                             int64(0),
+                                                             0)
+        except IOError as err:
+            # a server without the extension is not asked again, while any
+            # other failure, e.g. a file it may not read, is this file's alone
+            if self.is_unsupported_error(err):
+                self.has_check_file = False
+                return None
+            raise
+        finally:
+            remote_file.close()
+        self.has_check_file = True
+
+        resp_msg.get_text()
+        algorithm_name = resp_msg.get_text()
+
+        return algorithm_name, resp_msg.get_remainder().hex()
+
+
+    @staticmethod
+    def is_unsupported_error(err):
+        '''
+        Whether an SFTP request failed with SFTP_OP_UNSUPPORTED, which paramiko
+        raises, as any status but no-such-file and permission-denied, as an
+        IOError of the status text alone; OpenSSH and paramiko servers both
+        send "Operation unsupported"
+        '''
+        return err.errno is None and 'unsupported' in str(err).lower()
+
+
+    def remove(self,
+               entity_path: str):
+
+        self.sftp_client.remove(entity_path)
+
+        return
+
+
+    def keep_alive(self):
+
+        self.sftp_client.stat('.')
+
+        return
+
+
+    def close(self):
+
+        self.sftp_client.close()
+        if self.ssh_client is not None:
+            self.ssh_client.close()
+
+        return
+
+
+class PysftpTransport(ParamikoTransport):
+    '''
+    SFTP through a pysftp.Connection, whose paramiko client does the work
+    '''
+
+    def __init__(self,
+                 connection,
+                 block_size: int=32768,
+                 prefetch: bool=True):
+
+        super().__init__(connection.sftp_client,
+                         block_size=block_size,
+                         prefetch=prefetch)
+
+        self.connection = connection
+
+
+    @classmethod
+    def connect(cls,
+                host_url: str,
+                host_port: int,
+                username: str,
+                password: str,
+                known_hosts_file=None,
+                tcp_nodelay: bool=True,
+                block_size: int=32768,
+                prefetch: bool=True,
+                timeout=None):
+
+        import pysftp
+
+        cnopts = pysftp.CnOpts(knownhosts=known_hosts_file)
+        connection = pysftp.Connection(host=host_url, port=host_port, username=username, password=password, cnopts=cnopts)
+        if tcp_nodelay:
+            connection.sftp_client.get_channel().get_transport().sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if timeout is not None:
+            connection.timeout = timeout
+
+        return cls(connection,
+                   block_size=block_size,
+                   prefetch=prefetch)
+
+
+    def close(self):
+
+        self.connection.close()
+
+        return
+
+
+class FtputilTransport(RemoteTransport):
+    '''
+    FTP through an ftputil.FTPHost
+    '''
+
+    def __init__(self,
+                 ftp_host,
+                 block_size: int=65536):
+
+        self.ftp_host = ftp_host
+        self.block_size = block_size
+
+
+    @classmethod
+    def connect(cls,
+                host_url: str,
+                host_port: int,
+                username: str,
+                password: str,
+                socket_buffer_size=None,
+                block_size: int=65536,
+                timeout=None):
+
+        import ftputil
+
+        session_factory = TunedFtpSession.get_session_factory(port=host_port,
+                                                              socket_buffer_size=socket_buffer_size,
+                                                              timeout=timeout)
+        ftp_host = ftputil.FTPHost(host=host_url, user=username, passwd=password, session_factory=session_factory)
+
+        return cls(ftp_host, block_size=block_size)
+
+
+    @classmethod
+    def is_auth_error(cls,
+                      err):
+
+        import ftputil.error
+
+        # FTPUTIL wraps the ftplib error, keeping its reply text
+        return isinstance(err, ftputil.error.PermanentError) and str(err).startswith('530')
+
+
+    def list_folder(self,
+                    folder_path: str):
+
+        # a single LIST, whose parsed lines FTPUTIL
+        # caches and then serves the lstat calls from
+        return [RemoteEntry.from_stat(entity_name,
+                                      folder_path,
+                                      self.ftp_host.lstat(self.ftp_host.path.join(folder_path, entity_name)))
+                for entity_name in self.ftp_host.listdir(folder_path)]
+
+
+    def stat_entry(self,
+                   entity_path: str):
+
+        return self.get_entry(entity_path, self.ftp_host.stat(entity_path))
+
+
+    def open_read(self,
+                  entity_path: str,
+                  offset: int=0,
+                  file_size=None):
+
+        return self.ftp_host.open(entity_path, mode='rb', rest=offset if offset > 0 else None)
+
+
+    def remove(self,
+               entity_path: str):
+
+        self.ftp_host.remove(entity_path)
+
+        return
+
+
+    def keep_alive(self):
+
+        # NOOP-equivalent round trip on the control connection
+        self.ftp_host.keep_alive()
+
+        return
+
+
+    def exists(self,
+               entity_path: str):
+
+        return self.ftp_host.path.exists(entity_path)
+
+
+    def clear_cache(self):
+
+        # a pooled connection may hold stat results from an
+        # earlier cycle, and stale mtimes would hide changes
+        self.ftp_host.stat_cache.clear()
+
+        return
+
+
+    def close(self):
+
+        self.ftp_host.close()
+
+        return
+
+
+transport_classes = {FtpLibNameEnum.FTPLIB: FtplibTransport,
+                     FtpLibNameEnum.FTPUTIL: FtputilTransport,
+                     FtpLibNameEnum.PARAMIKO: ParamikoTransport,
+                     FtpLibNameEnum.PYSFTP: PysftpTransport}
+
+
+def get_transport_class(host_type: int):
+
+    transport_class = transport_classes.get(host_type)
+    if transport_class is None:
+        raise ValueError('Unsupported host type: %s' % host_type)
+
+    return transport_class
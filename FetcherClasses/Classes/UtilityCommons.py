@@ -1,10 +1,48 @@
-import keyring
+import functools
 import os
+import threading
+import time
+
+
+def ensure_annotations(func):
+    '''
+    Stand-in for ensure.ensure_annotations that defers importing ensure,
+    and wrapping func with it, until func is first called
+    '''
+    checked_funcs = []
+
+    @functools.wraps(func)
+    def lazy_checked_func(*args, **kwargs):
+        if not checked_funcs:
+            from ensure import ensure_annotations as ensure_func_annotations
+            checked_funcs.append(ensure_func_annotations(func))
+        return checked_funcs[0](*args, **kwargs)
+
+    return lazy_checked_func
+
+
+def fsync_path(path_name: str):
+    '''
+    Flush a file's data, or a folder's entries, through to the disk
+    '''
+    path_fd = os.open(path_name, os.O_RDONLY)
+    try:
+        os.fsync(path_fd)
+    finally:
+        os.close(path_fd)
 
-from ensure import ensure_annotations
 
 class DynamicUtilities:
 
+    # keyring passwords are reused for this many seconds, 0 disables the cache
+    password_cache_seconds = 300
+
+    def __init__(self):
+
+        # (key, login) -> (password, time fetched)
+        self._password_cache = {}
+        self._password_lock = threading.Lock()
+
 
     def create_path(self,
                     path_name: str,
@@ -157,24 +195,52 @@ class DynamicUtilities:
         if logger is None:
             logger = self.logger
 
-        # get the password for the specified key and login
-        try:
-            password = keyring.get_password(key, login)
-            if password != None:
+        cache_key = (key, login)
+
+        # one lookup at a time, so that workers connecting together
+        # wait for the first one's keyring call instead of repeating it
+        with self._password_lock:
+            cached_password = self._password_cache.get(cache_key)
+            if cached_password is not None \
+            and time.monotonic() - cached_password[1] < self.password_cache_seconds:
                 if log_results:
-                    logger.info("SUCCESS: Retrieval of password for key: %s and login: %s", key, login)
-                    if redact_passwords:
-                        logger.info("Key: %s, Login: %s, Password: %s", key, login, '[redacted]')
-                    else:
-                        logger.info("Key: %s, Login: %s, Password: %s", key, login, password)
-#                 if isTestMode:
-#                     password = '[redacted]'
-            else:
-                err_str = "ERROR: key: %s for login: %s not in keyring" % (key, login)
+                    logger.debug("SUCCESS: Retrieval of cached password for key: %s and login: %s", key, login)
+                return cached_password[0], None
+
+            # get the password for the specified key and login
+            try:
+                # keyring and its backends load only when a password is needed
+                import keyring
+                password = keyring.get_password(key, login)
+                if password != None:
+                    if self.password_cache_seconds > 0:
+                        self._password_cache[cache_key] = (password, time.monotonic())
+                    if log_results:
+                        logger.info("SUCCESS: Retrieval of password for key: %s and login: %s", key, login)
+                        if redact_passwords:
+                            logger.info("Key: %s, Login: %s, Password: %s", key, login, '[redacted]')
+                        else:
+                            logger.info("Key: %s, Login: %s, Password: %s", key, login, password)
+    #                 if isTestMode:
+    #                     password = '[redacted]'
+                else:
+                    err_str = "ERROR: key: %s for login: %s not in keyring" % (key, login)
+                    logger.error(err_str)
+            except Exception as err:
+                err_str = str(err)
+                logger.error("FAILURE: Retrieval of password for key: %s and login: %s", key, login)
                 logger.error(err_str)
-        except Exception as err:
-            err_str = str(err)
-            logger.error("FAILURE: Retrieval of password for key: %s and login: %s", key, login)
-            logger.error(err_str)
 
         return password, err_str
+
+
+    def invalidate_password(self,
+                            key: str,
+                            login: str):
+        '''
+        Drop a cached password, e.g. once the server has rejected it, so
+        that the next get_pwd_via_keyring goes back to the keyring
+        '''
+
+        with self._password_lock:
+            return self._password_cache.pop((key, login), None) is not None
@@ -6,29 +6,87 @@ Created on May 10, 2016
 
 import logging
 import os
+import posixpath
+import signal
+import sys
+import threading
 import time
 
 import ftplib
-import ftputil
-from ftputil.error import FTPError
-import pysftp
 
-from ensure import ensure_annotations
-
-from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.ArchiveCommons import ArchiveExtractor
+from FetcherClasses.Classes.ConnectionCommons import ConnectionPool
+from FetcherClasses.Classes.DigestCommons import StreamDigester, parse_sidecar
+from FetcherClasses.Classes.EnumCommons import FetchStateEnum, FileStatusEnum, FtpLibNameEnum
+from FetcherClasses.Classes.GovernorCommons import TransferGovernor
+from FetcherClasses.Classes.JournalCommons import FetchJournal
+from FetcherClasses.Classes.ListingCommons import EntryFilter, FileStabilityPolicy, RemoteTreeWalker
 from FetcherClasses.Classes.LoggingCommons import LoggingUtilities
-from FetcherClasses.Classes.UtilityCommons import DynamicUtilities
+from FetcherClasses.Classes.MetricsCommons import MetricsRegistry
+from FetcherClasses.Classes.NotifyCommons import FileNotifySink, LandedFileNotifier, PikaNotifySink
+from FetcherClasses.Classes.ScheduleCommons import PollScheduler
+from FetcherClasses.Classes.ShardCommons import LeaseStore, ShardAssignment
+from FetcherClasses.Classes.SnapshotCommons import RemoteSnapshotStore
+from FetcherClasses.Classes.TransferCommons import ParallelDownloader, TransferJob, TransferProgress, copy_stream, get_order_policy
+from FetcherClasses.Classes.TransportCommons import get_transport_class, transport_classes
+from FetcherClasses.Classes.UtilityCommons import DynamicUtilities, ensure_annotations, fsync_path
 
 host_url = 'localhost'
 host_type = FtpLibNameEnum.FTPUTIL
-host_port = 22 if host_type == FtpLibNameEnum.PYSFTP else 21
+host_port = 22 if host_type in (FtpLibNameEnum.PYSFTP, FtpLibNameEnum.PARAMIKO) else 21
 username = 'fetch_dlz'
 folder_path_prefix = '/'
 folder_paths_list = ['TEST1','TEST2']
 recurse_remote_folders = True
 remove_remote_file_on_download = True
 scan_interval_seconds = 5
+poll_min_interval_seconds = 1
+poll_max_interval_seconds = 30
 output_path_name = 'temp'
+pool_max_idle_seconds = 300
+download_worker_count = 4
+snapshot_file_name = 'remote_snapshot.json'
+stable_listing_count = 2
+stable_min_age_seconds = 0
+stable_marker_suffix = None
+metrics_file_name = 'ftpfetcher.prom'
+metrics_http_port = None
+async_logging = True
+event_log_file_name = 'ftpfetcher_events.jsonl'
+event_success_sample_rate = 1.0
+event_max_success_per_second = None
+password_cache_seconds = 300
+journal_file_name = 'ftpfetcher_journal.db'
+journal_keep_removed_seconds = 7 * 86400
+digest_algorithms = ('sha256',)
+digest_sidecar_suffixes = ('.sha256', '.md5')
+use_sftp_check_file = True
+require_verified_removal = False
+archive_worker_count = 2
+remove_archive_on_extract = False
+notify_amqp_host = None
+notify_amqp_port = 5672
+notify_amqp_virtual_host = '/'
+notify_amqp_username = 'fetch_notify'
+notify_exchange_name = 'ftpfetcher'
+notify_routing_key = 'landed'
+notify_file_name = None
+notify_buffer_file_name = 'ftpfetcher_notify_buffer.jsonl'
+max_bytes_per_second = None
+max_sessions = None
+host_max_bytes_per_second = None
+host_max_sessions = 4
+download_order_policy_name = 'oldest'
+download_priority_weights = ()
+include_file_patterns = ()
+exclude_file_patterns = ('.*', '*.tmp', '*.part', '*.filepart')
+prune_folder_patterns = ('.*',)
+shard_index = 0
+shard_count = 1
+shard_by = 'file'
+lease_file_name = None
+lease_seconds = 300
+lease_keep_done_seconds = 7 * 86400
 
 
 class FtpScanner(object):
@@ -36,7 +94,7 @@ class FtpScanner(object):
 
     host_url = 'localhost'
     host_type = FtpLibNameEnum.PYSFTP
-    host_port = 22 if host_type == FtpLibNameEnum.PYSFTP else 21
+    host_port = 22 if host_type in (FtpLibNameEnum.PYSFTP, FtpLibNameEnum.PARAMIKO) else 21
     username = 'anonymous'
     password = 'anonymous'
     folder_path_prefix = '/'
@@ -52,21 +110,122 @@ class FtpScanner(object):
     
     output_path_name = 'temp'
 
-    bytes_xfered_sofar = 0
-    bytes_xfered_total = 0
-    bytes_xfered_prcnt = 0
-    
     loggingUtilities = LoggingUtilities()
     dynamicUtilities = DynamicUtilities()
 
     logger = logging
     
-    file_dict = {}
-    
+    # when set, each file's progress from discovery to removal is journaled,
+    # and files the journal shows as landed are not transferred again
+    fetch_journal = None
+
+    # digests computed over each download as it streams, checked against a
+    # checksum file listed beside it ("<file name><suffix>", the suffix naming
+    # the algorithm, e.g. ".sha256") or else, over SFTP, the server's own
+    # check-file hash; a mismatch fails the download and keeps the remote file
+    digest_algorithms = ()
+    digest_sidecar_suffixes = ()
+    use_sftp_check_file = False
+    # when set, a remote file is only removed once its download has been verified
+    require_verified_removal = False
+    # a checksum file larger than this is taken for something else
+    max_sidecar_size = 65536
+    # when set, the checksum file lands beside the file it vouches for
+    land_digest_sidecars = True
+
+    # number of archive extraction workers, 0 leaves downloaded archives as they are;
+    # tar archives downloaded whole are extracted from the transfer as it streams
+    archive_worker_count = 0
+    remove_archive_on_extract = False
+    archive_extractor = None
+
+    # when set, every file landed is announced to downstream consumers through it
+    landed_notifier = None
+
+    # when set, transfers are held to its bandwidth limits as they read, and
+    # connections to its session limits, which also cap the download workers
+    transfer_governor = None
+
     ftp_conn = None
-    
-    first_report = True
-    not_yet_reported = True
+
+    connection_pool = None
+
+    # number of parallel download workers, 1 means download inline
+    download_worker_count = 1
+    parallel_downloader = None
+
+    # when set, a DownloadOrderPolicy choosing which waiting file downloads
+    # next; inline, a walk's files are then downloaded once it has listed them all
+    download_order_policy = None
+
+    # walk bounds: None descends the whole tree, and prune_folder_func
+    # is an optional callable(folder_path, depth) returning True to skip
+    max_walk_depth = None
+    prune_folder_func = None
+
+    # when set, an EntryFilter whose rules drop files and folders from each
+    # listing before anything else is asked of the server about them
+    entry_filter = None
+
+    # when several fetcher instances split one host: with a shard assignment
+    # only files whose path hashes to this instance's shard are listed, and
+    # with a lease store a file is only fetched under a lease claimed on it
+    shard_assignment = None
+    lease_store = None
+
+    # running totals of what the remote walks have touched
+    walk_folders_visited = 0
+    walk_files_visited = 0
+    walk_list_calls = 0
+    walk_files_deferred = 0
+    walk_entries_filtered = 0
+    # files handed on for download, queued or inline
+    walk_files_fetched = 0
+    # files downloaded, and files deferred that the previous walk had not
+    # deferred; together what a poll newly found, as files passed over again
+    # and again, e.g. still unstable or leased elsewhere, are not news
+    walk_files_landed = 0
+    walk_files_newly_deferred = 0
+
+    # when set, only new or changed remote entries are processed
+    snapshot_store = None
+
+    # decides from listings whether upstream has finished writing a file;
+    # None takes every listed file as complete, so that a one-off scan
+    # fetches on its first pass, and the service installs a stricter one
+    stability_policy = None
+
+    # downloads land under this prefix and suffix and are renamed once
+    # complete, a leftover partial file is resumed from its current length;
+    # remote files named alike are refused, lest they be taken for one
+    part_file_prefix = '.'
+    part_file_suffix = '.part'
+
+    # SFTP read pipelining: with prefetch the reads for the rest of the
+    # file are issued ahead of the consumer, each of sftp_block_size bytes at most
+    sftp_prefetch = True
+    sftp_block_size = 32768
+    # paramiko leaves Nagle on, which holds pipelined SFTP requests
+    # back behind the server's delayed ACKs
+    sftp_tcp_nodelay = True
+    # FTP data connection read size and receive buffer (None = OS default)
+    ftp_block_size = 65536
+    ftp_socket_buffer_size = None
+
+    # known_hosts file used to verify SFTP host keys, None = ~/.ssh/known_hosts
+    known_hosts_file = None
+
+    # download progress is logged every prcnt_download_amount percent,
+    # or after this many seconds on transfers that move slower than that
+    progress_report_seconds = 10.0
+
+    # when set, connect, list, stat, transfer and delete are measured into it
+    metrics_registry = None
+
+    # when set, every file downloaded, failed or deferred gets a JSON event
+    # line, and the per-file free text goes out at file_log_level instead
+    file_event_logger = None
+    file_log_level = logging.INFO
 
 
     @ensure_annotations
@@ -89,6 +248,10 @@ class FtpScanner(object):
         self.scan_interval_seconds = scan_interval_seconds
         self.is_test_mode = is_test_mode
 
+        # paths deferred by the previous walk, and by the one under way
+        self.last_deferred_paths = set()
+        self.walk_deferred_paths = set()
+        self._landed_lock = threading.Lock()
 
         self.logger, _allLoggerFH, _errLoggerFH, err_str = self.loggingUtilities.get_logger(dft_msg_format=self.loggingUtilities.dft_msg_format,
                                                                                             dft_date_format=self.loggingUtilities.dft_date_format,
@@ -97,42 +260,6 @@ class FtpScanner(object):
         return err_str
 
 
-    @ensure_annotations
-    def get_ftputil_callback(self,
-                             data_block):
-        self.bytes_xfered_sofar += len(data_block)
-        if self.bytes_xfered_total > 0:
-            bytes_xfered_prcnt = int(self.bytes_xfered_sofar * 100.0 / self.bytes_xfered_total)
-        else:
-            bytes_xfered_prcnt = 0
-        if self.first_report:
-            self.logger.info('Bytes xfered: %d of total bytes: %d, pct transferred: %d', self.bytes_xfered_sofar, self.bytes_xfered_total, bytes_xfered_prcnt)
-            self.first_report = False
-        if bytes_xfered_prcnt == 100 or ((bytes_xfered_prcnt - self.bytes_xfered_prcnt) >= self.prcnt_download_amount):
-            self.bytes_xfered_prcnt = bytes_xfered_prcnt
-            self.logger.info('Bytes xfered: %d of total bytes: %d, pct transferred: %d', self.bytes_xfered_sofar, self.bytes_xfered_total, bytes_xfered_prcnt)
-        return
-
-
-    @ensure_annotations
-    def get_pysftp_callback(self,
-                            bytes_xfered_sofar: int,
-                            bytes_xfered_total: int):
-        if bytes_xfered_total > 0:
-            bytes_xfered_prcnt = int(bytes_xfered_sofar * 100.0 / bytes_xfered_total)
-        else:
-            bytes_xfered_prcnt = 0
-        if self.first_report:
-            self.logger.info('Bytes xfered: %d of total bytes: %d, pct transferred: %d', bytes_xfered_sofar, bytes_xfered_total, bytes_xfered_prcnt)
-            self.first_report = False
-        if (bytes_xfered_prcnt == 100 and self.not_yet_reported) or ((bytes_xfered_prcnt - self.bytes_xfered_prcnt) >= self.prcnt_download_amount):
-            self.bytes_xfered_prcnt = bytes_xfered_prcnt
-            self.logger.info('Bytes xfered: %d of total bytes: %d, pct transferred: %d', bytes_xfered_sofar, bytes_xfered_total, bytes_xfered_prcnt)
-        if bytes_xfered_prcnt == 100:
-            self.not_yet_reported = False
-        return
-
-
     @ensure_annotations
     def get_connection(self,
                        logger=None,
@@ -147,34 +274,242 @@ class FtpScanner(object):
             is_test_mode = self.is_test_mode
 
         # obtain password to FTP site via user's password keyring
-        password, err_str = self.dynamicUtilities.get_pwd_via_keyring(key=host_url,
+        password, err_str = self.dynamicUtilities.get_pwd_via_keyring(key=self.host_url,
                                                                       login=self.username,
                                                                       redact_passwords=True,
                                                                       log_results=True,
                                                                       logger=logger,
                                                                       is_test_mode=is_test_mode)
         
+        # partners that ban too many sessions are never sent one more
+        if not err_str and self.transfer_governor is not None \
+        and not self.transfer_governor.acquire_session(self.host_url):
+            err_str = 'Session limit of %s reached for: %s' % (self.transfer_governor.get_session_limit(self.host_url), self.host_url)
+
         if not err_str:
-            if self.host_type == FtpLibNameEnum.PYSFTP:
-                try:
-                    logger.info('Connecting to FTP server "%s" via PYSFTP, please wait...', host_url)
-                    ftp_conn = pysftp.Connection(host=self.host_url, username=self.username, password=password)
-                    logger.info('Connected to FTP server "%s" via PYSFTP', host_url)
-                except Exception as err:
-                    err_str = str(err)
-                    logger.error(err_str)
-            elif self.host_type == FtpLibNameEnum.FTPUTIL:
-                try:
-                    logger.info('Connecting to FTP server "%s" via FTPUTIL, please wait...', host_url)
-                    ftp_conn = ftputil.FTPHost(host=self.host_url, user=self.username, passwd=password)
-                    logger.info('Connected to FTP server "%s" via FTPUTIL!', host_url)
-                except Exception as err:
-                    err_str = str(err)
-                    logger.error(err_str)
+            ftp_conn, connect_err = self.open_transport(password, logger=logger)
+            # a cached password the server now rejects is dropped, and
+            # one retry made should the keyring hold a different one
+            transport_class = transport_classes.get(self.host_type)
+            if connect_err is not None and transport_class is not None and transport_class.is_auth_error(connect_err):
+                logger.warning('Authentication FAILURE, dropping cached password for: %s@%s', self.username, self.host_url)
+                if self.dynamicUtilities.invalidate_password(self.host_url, self.username):
+                    fresh_password, fresh_err_str = self.dynamicUtilities.get_pwd_via_keyring(key=self.host_url,
+                                                                                              login=self.username,
+                                                                                              redact_passwords=True,
+                                                                                              log_results=True,
+                                                                                              logger=logger,
+                                                                                              is_test_mode=is_test_mode)
+                    if fresh_err_str is None and fresh_password != password:
+                        ftp_conn, connect_err = self.open_transport(fresh_password, logger=logger)
+            if connect_err is not None:
+                err_str = str(connect_err)
+
+            if self.transfer_governor is not None:
+                if ftp_conn is not None:
+                    ftp_conn.on_session_closed = lambda: self.transfer_governor.release_session(self.host_url)
+                else:
+                    self.transfer_governor.release_session(self.host_url)
 
         return ftp_conn, err_str
 
 
+    def open_transport(self,
+                       password: str,
+                       logger=None):
+        '''
+        Connect via the backend of host_type, returning (ftp_conn, connect_err)
+        '''
+
+        ftp_conn = None
+        connect_err = None
+
+        if logger is None:
+            logger = self.logger
+
+        start_time = time.time()
+        try:
+            # only the selected backend, and what it pulls in, gets imported
+            transport_class = get_transport_class(self.host_type)
+            logger.info('Connecting to FTP server "%s" via %s, please wait...', self.host_url, FtpLibNameEnum(self.host_type).name)
+            if transport_class.is_sftp:
+                ftp_conn = transport_class.connect(self.host_url,
+                                                   self.host_port,
+                                                   self.username,
+                                                   password,
+                                                   known_hosts_file=self.known_hosts_file,
+                                                   tcp_nodelay=self.sftp_tcp_nodelay,
+                                                   block_size=self.sftp_block_size,
+                                                   prefetch=self.sftp_prefetch)
+            else:
+                ftp_conn = transport_class.connect(self.host_url,
+                                                   self.host_port,
+                                                   self.username,
+                                                   password,
+                                                   socket_buffer_size=self.ftp_socket_buffer_size,
+                                                   block_size=self.ftp_block_size)
+            logger.info('Connected to FTP server "%s" via %s', self.host_url, FtpLibNameEnum(self.host_type).name)
+        except Exception as err:
+            connect_err = err
+            logger.error(str(err))
+        self.record_phase('connect', start_time, err=connect_err)
+
+        return ftp_conn, connect_err
+
+
+    def record_phase(self,
+                     phase: str,
+                     start_time: float,
+                     err=None):
+
+        if self.metrics_registry is not None:
+            self.metrics_registry.record_phase(phase, time.time() - start_time, err=err)
+
+        return
+
+
+    def record_download(self,
+                        start_time: float,
+                        bytes_xfered: int):
+
+        if self.metrics_registry is not None:
+            self.metrics_registry.record_phase('transfer', time.time() - start_time)
+            self.metrics_registry.inc_counter('files_downloaded_total')
+            self.metrics_registry.inc_counter('bytes_downloaded_total', amount=bytes_xfered)
+
+        return
+
+
+    def record_fetch_state(self,
+                           entity_path: str,
+                           fetch_state: int,
+                           remote_entry=None,
+                           target_full_name=None):
+
+        if self.fetch_journal is not None:
+            self.fetch_journal.record_state(self.host_url,
+                                            entity_path,
+                                            fetch_state,
+                                            size=remote_entry.size if remote_entry is not None else None,
+                                            mtime=remote_entry.mtime if remote_entry is not None else None,
+                                            target_full_name=target_full_name)
+
+        return
+
+
+    def record_extraction(self,
+                          extraction_job):
+
+        if self.metrics_registry is not None:
+            self.metrics_registry.inc_counter('archives_extracted_total',
+                                              labels={'status': FileStatusEnum(extraction_job.file_status).name})
+
+        if self.file_event_logger is not None:
+            self.file_event_logger.log_event('extract',
+                                             self.host_url,
+                                             extraction_job.entity_path or extraction_job.archive_full_name,
+                                             err_str=extraction_job.err_str,
+                                             status=FileStatusEnum(extraction_job.file_status).name,
+                                             members=extraction_job.member_count,
+                                             bytes=extraction_job.bytes_extracted,
+                                             streamed=extraction_job.is_streamed,
+                                             duration=round(extraction_job.elapsed_seconds, 3),
+                                             target=extraction_job.extract_path_name)
+
+        return
+
+
+    def record_removal(self,
+                       start_time: float):
+
+        if self.metrics_registry is not None:
+            self.metrics_registry.record_phase('delete', time.time() - start_time)
+            self.metrics_registry.inc_counter('files_removed_total')
+
+        return
+
+
+    @ensure_annotations
+    def borrow_connection(self,
+                          logger=None,
+                          is_test_mode: bool=False):
+
+        if logger is None:
+            logger = self.logger
+
+        # without a pool every borrow is a fresh connection
+        if self.connection_pool is None:
+            return self.get_connection(logger=logger,
+                                       is_test_mode=is_test_mode)
+
+        pool_key = self.connection_pool.get_pool_key(self.host_url,
+                                                     self.host_port,
+                                                     self.username,
+                                                     self.host_type)
+
+        return self.connection_pool.acquire_connection(pool_key,
+                                                       lambda: self.get_connection(logger=logger,
+                                                                                   is_test_mode=is_test_mode),
+                                                       logger=logger)
+
+
+    @ensure_annotations
+    def return_connection(self,
+                          ftp_conn,
+                          discard: bool=False,
+                          logger=None):
+
+        if ftp_conn is None:
+            return
+
+        if logger is None:
+            logger = self.logger
+
+        # an idle connection holding a session slot another connection waits for is closed, not pooled
+        if self.transfer_governor is not None and self.transfer_governor.has_session_waiters(self.host_url):
+            discard = True
+
+        if self.connection_pool is None:
+            # close the FTP connection as appropriate
+            try:
+                logger.info('Closing FTP connection')
+                ftp_conn.close_session()
+                logger.info('Closed FTP connection')
+            except Exception as err:
+                logger.info(err)
+        else:
+            pool_key = self.connection_pool.get_pool_key(self.host_url,
+                                                         self.host_port,
+                                                         self.username,
+                                                         self.host_type)
+            self.connection_pool.release_connection(pool_key,
+                                                    ftp_conn,
+                                                    discard=discard,
+                                                    logger=logger)
+
+        return
+
+
+    @ensure_annotations
+    def check_connection(self,
+                         ftp_conn,
+                         logger=None):
+
+        is_healthy = False
+
+        if logger is None:
+            logger = self.logger
+
+        try:
+            ftp_conn.keep_alive()
+            is_healthy = True
+        except Exception as err:
+            logger.warning('FTP connection health check FAILURE')
+            logger.warning(str(err))
+
+        return is_healthy
+
+
     @ensure_annotations
     def get_remote_file(self,
                         remote_path_name: str,
@@ -185,9 +520,17 @@ class FtpScanner(object):
                         close_connection: bool=False,
                         remove_remote_file_on_download: bool=False,
                         logger=None,
-                        is_test_mode: bool=False):
+                        is_test_mode: bool=False,
+                        remote_entry=None):
         
         err_str = None
+        bytes_xfered = 0
+        is_removed = False
+        is_verified = False
+        is_leased = False
+        landed_state = None
+        digester = None
+        file_start_time = time.time()
         
         if logger is None:
             logger = self.logger
@@ -206,15 +549,22 @@ class FtpScanner(object):
         if remote_dirname.startswith('/'):
             remote_dirname = remote_dirname[1:]
 
-        self.target_full_name = self.dynamicUtilities.expand_path(path_fldr=target_path_name,
-                                                                  path_name=target_file_name,
-                                                                  logger=logger,
-                                                                  is_test_mode=is_test_mode)
+        # kept local so that concurrent download workers
+        # sharing this scanner do not clobber one another
+        target_full_name = self.dynamicUtilities.expand_path(path_fldr=target_path_name,
+                                                             path_name=target_file_name,
+                                                             logger=logger,
+                                                             is_test_mode=is_test_mode)
+        self.target_full_name = target_full_name
 
-        target_path_name = os.path.dirname(self.target_full_name)
-        if not os.path.exists(target_path_name):
+        if self.is_part_file_name(os.path.basename(target_full_name)):
+            err_str = 'Remote file named like a partial download, NOT fetched: "%s"' % posixpath.join(remote_path_name, remote_file_name)
+            logger.error(err_str)
+
+        target_path_name = os.path.dirname(target_full_name)
+        if err_str is None and not os.path.exists(target_path_name):
             try:
-                logger.info('Make directory ATTEMPT: "%s"', target_path_name)
+                logger.log(self.file_log_level, 'Make directory ATTEMPT: "%s"', target_path_name)
                 _dirname, err_str = self.dynamicUtilities.create_path(path_name=target_path_name,
                                                                       contains_file_name=False,
                                                                       logger=logger,
@@ -223,7 +573,7 @@ class FtpScanner(object):
                     logger.error('Make directory FAILURE: "%s"', target_path_name)
                     logger.error(err_str)
                 else:
-                    logger.info('Make directory SUCCESS: "%s"', target_path_name)
+                    logger.log(self.file_log_level, 'Make directory SUCCESS: "%s"', target_path_name)
             except Exception as err:
                 err_str = str(err)
                 logger.error('Make directory FAILURE: "%s"', target_path_name)
@@ -231,7 +581,8 @@ class FtpScanner(object):
 
         if err_str is None:
             if ftp_conn is None:
-                ftp_conn, err_str = self.get_connection()
+                ftp_conn, err_str = self.borrow_connection(logger=logger,
+                                                           is_test_mode=is_test_mode)
                 close_connection = True
 
     #         if err_str is None:
@@ -241,127 +592,452 @@ class FtpScanner(object):
 
         if err_str is None:
             try:
-                _resp_code = None
-                if self.host_type == FtpLibNameEnum.PYSFTP:
-                    # pass because download handled
-                    # in the walktreeFcallback method
-                    if remote_path_name is not None and remote_path_name != '':
-                        entity_path = remote_path_name + '/' + remote_file_name
-                    else:
-                        entity_path = remote_file_name
-                    # derive target path name for use with folder creation if so needed
-                    target_path_name = self.dynamicUtilities.expand_path(path_fldr=self.output_path_name,
-                                                                         path_name=os.path.dirname(entity_path),
-                                                                         logger=logger,
-                                                                         is_test_mode=is_test_mode)
-                    if not os.path.exists(target_path_name):
-                        try:
-                            self.logger.info('Target folder creation ATTEMPT: "%s"', target_path_name)
-                            _dirname, err_str = self.dynamicUtilities.create_path(path_name=target_path_name,
-                                                                                  contains_file_name=False,
-                                                                                  logger=logger,
-                                                                                  is_test_mode=is_test_mode)
-                            self.logger.info('Target folder creation SUCCESS: "%s"', target_path_name)
-                        except Exception as err:
-                            err_str = str(err)
-                            self.logger.error('Target folder creation FAILURE: "%s"', target_path_name)
-                            self.logger.error(err_str)
-            
-                    # derive target destination path                
-                    target_dest_name = self.dynamicUtilities.expand_path(path_fldr=self.output_path_name,
-                                                                         path_name=entity_path,
-                                                                         logger=logger,
-                                                                         is_test_mode=is_test_mode)
-                        
-                    # if the remote file exists
-                    if self.ftp_conn.exists(entity_path):
-                        try:
-                            self.logger.info('Remote file accessible YET? "%s"', entity_path)
-                            _resp_code = self.ftp_conn.open(remote_file=entity_path,
-                                                            mode='a',
-                                                            bufsize=-1)
-                            self.logger.info('Remote file accessible NOW! "%s"', entity_path)
-                            self.bytes_xfered_prcnt = 0
-                            try:
-                                self.logger.info('Remote file download ATTEMPT: "%s"', entity_path)
-                                self.not_yet_reported = True
-                                self.first_report = True
-                                _resp_code = self.ftp_conn.get(remotepath=entity_path,
-                                                               localpath=target_dest_name,
-                                                               callback=self.get_pysftp_callback,
-                                                               preserve_mtime=True)
-                                self.logger.info('Remote file download SUCCESS: "%s"', entity_path)
-                            except Exception as err:
-                                err_str = str(err)
-                                self.logger.error('Remote file download FAILURE! "%s"', entity_path)
-                                self.logger.error(err_str)
-                            if self.remove_remote_file_on_download:
-                                try:
-                                    self.logger.info('Remote file removal ATTEMPT: "%s"', entity_path)
-                                    self.ftp_conn.remove(entity_path)
-                                    self.logger.info('Remote file removal SUCCESS: "%s"', entity_path)
-                                except Exception as err:
-                                    err_str = str(err)
-                                    self.logger.error('Remote file removal FAILURE! "%s"', entity_path)
-                                    self.logger.error(err_str)
-                        except TypeError as err:
-                            self.logger.info(err)
-                            self.logger.info('Remote file accessible NOW! "%s"', entity_path)
-                        except IOError as err:
-                            self.logger.info(err)
-                            self.logger.info('Remote file accessible NOT! "%s"', entity_path)
-                            self.logger.info('Will attempt accessibility on next iteration..')
-                    else:
-                        self.logger.error('Remote file NOT found: %s', entity_path)
-                elif self.host_type == FtpLibNameEnum.FTPUTIL:
-                    # if the source file exists
-                    if ftp_conn.path.exists(remote_file_name):
-                        # resp_code = ftp_util.open(path=src_file_name, mode='rb')
-                        logger.info('Obtaining remote file size for: %s', remote_file_name)
-                        self.bytes_xfered_prcnt = 0
-                        self.bytes_xfered_sofar = 0
-                        self.bytes_xfered_total = ftp_conn.path.getsize(remote_file_name)
-                        logger.info('Obtained remote file size %d for: "%s"', self.bytes_xfered_total, remote_file_name)
-                        logger.info('Download attempted: "%s"', remote_file_name)
-                        self.first_report = True
-                        _resp_code = ftp_conn.download(source=remote_file_name,
-                                                       target=self.target_full_name,
-                                                       callback=self.get_ftputil_callback)
-                        logger.info('Download completed: "%s"', self.target_full_name)
-                        if remove_remote_file_on_download:
-                            logger.info('Remove downloaded file attempted: "%s"', remote_file_name)
-                            ftp_conn.remove(remote_file_name)
-                            logger.info('Remove downloaded file successful: "%s"', remote_file_name)
-                    else:
-                        logger.error('FTP file NOT found: "%s"', remote_file_name)
-                        logger.error('Will attempt download later...')
+                # address the file by its full path rather than
+                # relying on the connection's current folder
+                if remote_path_name is not None and remote_path_name != '':
+                    entity_path = posixpath.join(remote_path_name, remote_file_name)
+                else:
+                    entity_path = remote_file_name
+
+                # a file another fetcher instance holds the lease on is left to it
+                is_leased = self.lease_store is None or self.lease_store.claim_lease(self.host_url, entity_path, remote_entry)
+
+                # a file landed by an earlier run, which may have stopped short
+                # of removing it, needs at most that removal finishing
+                if is_leased and self.fetch_journal is not None and remote_entry is not None:
+                    landed_state = self.fetch_journal.get_landed_state(self.host_url, remote_entry)
+
+                if not is_leased:
+                    logger.log(self.file_log_level, 'Remote file download SKIPPED, leased by another fetcher: "%s"', entity_path)
+                elif landed_state is not None:
+                    is_verified = landed_state == FetchStateEnum.VERIFIED
+                    logger.log(self.file_log_level, 'Remote file download SKIPPED, journal shows it %s: "%s"', landed_state.name, entity_path)
+                # if the remote file exists, which a listed entry already vouches for
+                elif remote_entry is not None or ftp_conn.exists(entity_path):
+                    # completeness is judged up front by the stability
+                    # policy, so no write-mode probe of the remote file
+                    start_time = time.time()
+                    try:
+                        logger.log(self.file_log_level, 'Remote file download ATTEMPT: "%s"', entity_path)
+                        self.record_fetch_state(entity_path, FetchStateEnum.DOWNLOADING, remote_entry, target_full_name)
+                        digester, err_str = self.get_digester(entity_path,
+                                                              remote_entry=remote_entry,
+                                                              ftp_conn=ftp_conn,
+                                                              logger=logger)
+                        if err_str is not None:
+                            raise IOError(err_str)
+                        bytes_xfered, err_str = self.download_remote_file(entity_path,
+                                                                          target_full_name,
+                                                                          remote_entry=remote_entry,
+                                                                          ftp_conn=ftp_conn,
+                                                                          logger=logger,
+                                                                          digester=digester,
+                                                                          sync_to_disk=remove_remote_file_on_download)
+                        if err_str is not None:
+                            raise IOError(err_str)
+                        self.record_fetch_state(entity_path, FetchStateEnum.LANDED)
+                        if digester is not None and digester.is_verifiable():
+                            is_verified = True
+                            self.record_fetch_state(entity_path, FetchStateEnum.VERIFIED)
+                            logger.log(self.file_log_level, 'Remote file digest VERIFIED against %s: "%s"',
+                                       ', '.join(sorted(set(digester.expected_sources.values()))), entity_path)
+                        if self.land_digest_sidecars and digester is not None and digester.sidecar_content is not None:
+                            self.land_digest_sidecar(target_full_name, remote_entry, digester.sidecar_content, logger=logger)
+                        if self.landed_notifier is not None:
+                            self.landed_notifier.notify_landed(self.host_url,
+                                                               remote_path_name,
+                                                               entity_path,
+                                                               target_full_name,
+                                                               size=os.path.getsize(target_full_name),
+                                                               mtime=remote_entry.mtime if remote_entry is not None else None,
+                                                               digests=digester.get_hexdigests() if digester is not None else None)
+                        self.record_download(start_time, bytes_xfered)
+                        with self._landed_lock:
+                            self.walk_files_landed += 1
+                        logger.log(self.file_log_level, 'Remote file download SUCCESS: "%s"', entity_path)
+                    except Exception as err:
+                        err_str = str(err)
+                        self.record_phase('transfer', start_time, err=err)
+                        logger.error('Remote file download FAILURE! "%s"', entity_path)
+                        logger.error(err_str)
+                else:
+                    err_str = 'Remote file NOT found: "%s"' % entity_path
+                    logger.error(err_str)
+                    logger.error('Will attempt download later...')
+
+                if err_str is None and is_leased and remove_remote_file_on_download \
+                and self.require_verified_removal and not is_verified:
+                    logger.warning('Remote file removal SKIPPED, download not verified: "%s"', entity_path)
+                elif err_str is None and is_leased and remove_remote_file_on_download:
+                    start_time = time.time()
+                    try:
+                        logger.log(self.file_log_level, 'Remote file removal ATTEMPT: "%s"', entity_path)
+                        # the landing must be on disk before the only other copy goes
+                        if self.fetch_journal is not None:
+                            journal_err_str = self.fetch_journal.commit_journal(logger=logger)
+                            if journal_err_str is not None:
+                                raise IOError('Journal not committed, remote file kept: %s' % journal_err_str)
+                        ftp_conn.remove(entity_path)
+                        is_removed = True
+                        self.record_fetch_state(entity_path, FetchStateEnum.REMOTE_REMOVED)
+                        self.record_removal(start_time)
+                        logger.log(self.file_log_level, 'Remote file removal SUCCESS: "%s"', entity_path)
+                    except Exception as err:
+                        err_str = str(err)
+                        self.record_phase('delete', start_time, err=err)
+                        logger.error('Remote file removal FAILURE! "%s"', entity_path)
+                        logger.error(err_str)
+                    # the checksum file goes with the file it vouched for, and
+                    # the marker only once the file it completed has
+                    if is_removed and remote_entry is not None and remote_entry.sidecar_name is not None:
+                        self.remove_companion_file(entity_path, remote_entry.sidecar_name, ftp_conn, logger=logger)
+                    if is_removed and remote_entry is not None and remote_entry.marker_name is not None:
+                        self.remove_companion_file(entity_path, remote_entry.marker_name, ftp_conn, logger=logger)
             except TypeError as err:
-                logger.info(err)
-                logger.info('FTP file is now downloadable: "%s"', remote_file_name)
+                err_str = str(err)
+                logger.error('Remote file download FAILURE! "%s"', remote_file_name)
+                logger.error(err_str)
             except ftplib.error_temp as err:
+                err_str = str(err)
                 logger.info(err)
             except ftplib.error_reply as err:
+                err_str = str(err)
                 logger.info(err)
             except ftplib.error_perm as err:
+                err_str = str(err)
                 logger.info(err)
                 logger.info('FTP file is NOT yet downloadable: "%s"', remote_file_name)
                 logger.info('Will attempt download later...')
             except IOError as err:
+                err_str = str(err)
                 logger.info(err)
                 logger.info('FTP file is NOT yet downloadable: "%s"', remote_file_name)
                 logger.info('Will attempt download later..')
 
 
+        # a file fetched stays done in this version, so that instances that
+        # listed it before it was removed let it be; one not fetched is free
+        if is_leased and self.lease_store is not None:
+            self.lease_store.release_lease(self.host_url,
+                                           entity_path,
+                                           is_done=err_str is None and remote_entry is not None)
+
+        if err_str is None and remote_entry is not None and self.stability_policy is not None:
+            self.stability_policy.forget_file(remote_entry.entity_path)
+
+        # remember files left in place so that later scans pass them by,
+        # but not those leased elsewhere, which may yet fail to be fetched
+        if err_str is None and is_leased and remote_entry is not None and self.snapshot_store is not None:
+            if remove_remote_file_on_download:
+                self.snapshot_store.forget_entry(remote_path_name, remote_entry.entity_name)
+            else:
+                self.snapshot_store.record_entry(remote_path_name, remote_entry)
+
+        if self.file_event_logger is not None:
+            self.file_event_logger.log_event('download',
+                                             self.host_url,
+                                             posixpath.join(remote_path_name, remote_file_name),
+                                             err_str=err_str,
+                                             outcome='skipped' if landed_state is not None or not is_leased else None,
+                                             bytes=bytes_xfered,
+                                             duration=round(time.time() - file_start_time, 3),
+                                             target=target_full_name,
+                                             removed=is_removed,
+                                             verified=is_verified,
+                                             digests=digester.get_hexdigests() if digester is not None else None)
+
         if ftp_conn is not None and close_connection:
-            # close the FTP connection as appropriate
+            # hand the FTP connection back as appropriate
+            self.return_connection(ftp_conn, logger=logger)
+
+        return target_full_name, err_str
+
+
+    def get_part_full_name(self,
+                           target_full_name: str):
+
+        return os.path.join(os.path.dirname(target_full_name),
+                            self.part_file_prefix + os.path.basename(target_full_name) + self.part_file_suffix)
+
+
+    def is_part_file_name(self,
+                          file_name: str):
+
+        return file_name.startswith(self.part_file_prefix) and file_name.endswith(self.part_file_suffix)
+
+
+    @ensure_annotations
+    def land_digest_sidecar(self,
+                            target_full_name: str,
+                            remote_entry,
+                            sidecar_content: bytes,
+                            logger=None):
+        '''
+        Write the checksum file read for a download beside where it landed,
+        under the landed name plus the same suffix; a failure only warrants
+        a warning, the download itself having been checked already
+        '''
+
+        if logger is None:
+            logger = self.logger
+
+        sidecar_full_name = target_full_name + remote_entry.sidecar_name[len(remote_entry.entity_name):]
+        try:
+            # like the download, it only appears under its final name complete
+            sidecar_part_name = self.get_part_full_name(sidecar_full_name)
+            with open(sidecar_part_name, 'wb') as sidecar_file:
+                sidecar_file.write(sidecar_content)
+            os.replace(sidecar_part_name, sidecar_full_name)
+            logger.log(self.file_log_level, 'Checksum file landed: "%s"', sidecar_full_name)
+        except Exception as err:
+            logger.warning('Checksum file landing FAILURE: "%s"', sidecar_full_name)
+            logger.warning(str(err))
+
+        return
+
+
+    @ensure_annotations
+    def remove_companion_file(self,
+                              entity_path: str,
+                              companion_name: str,
+                              ftp_conn=None,
+                              logger=None):
+        '''
+        Remove a file that accompanied entity_path, e.g. its marker, once
+        entity_path itself is gone; a failure here only warrants a warning
+        '''
+
+        if logger is None:
+            logger = self.logger
+
+        if ftp_conn is None:
+            ftp_conn = self.ftp_conn
+
+        companion_path = posixpath.join(posixpath.dirname(entity_path), companion_name)
+        try:
+            ftp_conn.remove(companion_path)
+            logger.log(self.file_log_level, 'Remote companion file removal SUCCESS: "%s"', companion_path)
+        except Exception as err:
+            logger.warning('Remote companion file removal FAILURE, left in place: "%s"', companion_path)
+            logger.warning(str(err))
+
+        return
+
+
+    @ensure_annotations
+    def download_remote_file(self,
+                             entity_path: str,
+                             target_full_name: str,
+                             remote_entry=None,
+                             ftp_conn=None,
+                             logger=None,
+                             digester=None,
+                             sync_to_disk: bool=False):
+        '''
+        Download entity_path into its part file, then move it to target_full_name;
+        with sync_to_disk the file and its new name are on the disk on return,
+        as they must be before the remote copy is removed
+        '''
+
+        err_str = None
+
+        if logger is None:
+            logger = self.logger
+
+        if ftp_conn is None:
+            ftp_conn = self.ftp_conn
+
+        if remote_entry is not None and remote_entry.size is not None:
+            remote_size = remote_entry.size
+            remote_mtime = remote_entry.mtime
+        else:
+            logger.log(self.file_log_level, 'Obtaining remote file size for: %s', entity_path)
+            start_time = time.time()
             try:
-                logger.info('Closing FTP connection')
-                ftp_conn.close()
-                logger.info('Closed FTP connection')
+                remote_stat_entry = ftp_conn.stat_entry(entity_path)
             except Exception as err:
-                logger.info(err)
+                self.record_phase('stat', start_time, err=err)
+                raise
+            self.record_phase('stat', start_time)
+            remote_size = remote_stat_entry.size
+            remote_mtime = remote_stat_entry.mtime
+            logger.log(self.file_log_level, 'Obtained remote file size %s for: "%s"', remote_size, entity_path)
+
+        part_full_name = self.get_part_full_name(target_full_name)
+
+        # resume a leftover partial file only if it is no longer than the
+        # remote file and the remote file has not changed since it was written;
+        # any other is removed, so that nothing of it outlives the restart
+        resume_offset = 0
+        if os.path.exists(part_full_name):
+            part_stat = os.stat(part_full_name)
+            if remote_size is not None \
+            and part_stat.st_size <= remote_size \
+            and (remote_mtime is None or remote_mtime <= part_stat.st_mtime):
+                resume_offset = part_stat.st_size
+                logger.log(self.file_log_level, 'Download RESUME at byte %d of %d: "%s"', resume_offset, remote_size, entity_path)
+            else:
+                logger.log(self.file_log_level, 'Download RESTART, partial file is stale: "%s"', part_full_name)
+                os.remove(part_full_name)
+
+        transfer_progress = TransferProgress(entity_path,
+                                             remote_size,
+                                             bytes_start=resume_offset,
+                                             report_prcnt_amount=self.prcnt_download_amount,
+                                             report_interval_seconds=self.progress_report_seconds,
+                                             report_log_level=self.file_log_level,
+                                             logger=logger)
+
+        block_callbacks = [transfer_progress.add_data_block]
+        if digester is not None:
+            # the digests see every block on its way to disk, and those of a
+            # resumed file are first brought up to date with the part file
+            if resume_offset > 0:
+                digester.add_file(part_full_name, resume_offset)
+            block_callbacks.insert(0, digester.add_data_block)
+
+        # a long download keeps its lease renewed, and stops if it is lost
+        if self.lease_store is not None:
+            block_callbacks.append(self.lease_store.get_renewer(self.host_url, entity_path))
+
+        # last, so that the bytes are paced once they have been dealt with
+        if self.transfer_governor is not None:
+            block_callbacks.append(lambda data_block: self.transfer_governor.throttle(self.host_url, len(data_block)))
+
+        # a tar archive fetched from its first byte is extracted as it streams
+        archive_stream = None
+        if self.archive_extractor is not None and resume_offset == 0:
+            archive_stream = self.archive_extractor.open_stream(target_full_name, entity_path=entity_path)
+            if archive_stream is not None:
+                block_callbacks.append(archive_stream.add_data_block)
+
+        if len(block_callbacks) == 1:
+            block_callback = block_callbacks[0]
+        else:
+            def block_callback(data_block):
+                for data_block_callback in block_callbacks:
+                    data_block_callback(data_block)
+
+        bytes_xfered = 0
+        is_landed = False
+        try:
+            if remote_size is None or resume_offset < remote_size:
+                remote_file = ftp_conn.open_read(entity_path, offset=resume_offset, file_size=remote_size)
+
+                try:
+                    with open(part_full_name, 'ab' if resume_offset > 0 else 'wb') as part_file:
+                        bytes_xfered = copy_stream(remote_file,
+                                                   part_file,
+                                                   block_size=ftp_conn.block_size,
+                                                   block_callback=block_callback)
+                finally:
+                    remote_file.close()
+
+            part_size = os.path.getsize(part_full_name) if os.path.exists(part_full_name) else 0
+            digest_err_str = digester.verify() if digester is not None else None
+            if remote_size is not None and part_size != remote_size:
+                err_str = 'Downloaded %d bytes of %d expected: "%s"' % (part_size, remote_size, entity_path)
+            elif digest_err_str is not None:
+                # a corrupt copy is not resumed from, but fetched again in full
+                err_str = '%s: "%s"' % (digest_err_str, entity_path)
+                os.remove(part_full_name)
+            else:
+                # only a complete file ever appears under its final name
+                if part_size == 0 and not os.path.exists(part_full_name):
+                    open(part_full_name, 'wb').close()
+                if remote_mtime is not None:
+                    os.utime(part_full_name, (remote_mtime, remote_mtime))
+                if sync_to_disk:
+                    fsync_path(part_full_name)
+                os.replace(part_full_name, target_full_name)
+                if sync_to_disk:
+                    fsync_path(os.path.dirname(target_full_name))
+                is_landed = True
+        finally:
+            # what was extracted is kept only once the archive has landed
+            if archive_stream is not None:
+                archive_stream.finish(is_landed=is_landed)
+
+        if is_landed and archive_stream is None and self.archive_extractor is not None:
+            self.archive_extractor.submit_archive(target_full_name, entity_path=entity_path)
+
+        return bytes_xfered, err_str
+
+
+    @ensure_annotations
+    def get_digester(self,
+                     entity_path: str,
+                     remote_entry=None,
+                     ftp_conn=None,
+                     logger=None):
+        '''
+        Return a StreamDigester for the download of entity_path, primed with
+        what its checksum file or the server says the digest should be;
+        None when no digest is computed or checked
+        '''
+
+        err_str = None
+
+        if logger is None:
+            logger = self.logger
+
+        if ftp_conn is None:
+            ftp_conn = self.ftp_conn
+
+        sidecar_name = remote_entry.sidecar_name if remote_entry is not None else None
+        is_check_file = self.use_sftp_check_file and ftp_conn.is_sftp
+
+        if len(self.digest_algorithms) == 0 and sidecar_name is None and not is_check_file:
+            return None, err_str
+
+        digester = StreamDigester(self.digest_algorithms)
+
+        if sidecar_name is not None:
+            sidecar_path = posixpath.join(posixpath.dirname(entity_path), sidecar_name)
+            start_time = time.time()
+            try:
+                logger.log(self.file_log_level, 'Remote checksum file read ATTEMPT: "%s"', sidecar_path)
+                sidecar_file = ftp_conn.open_read(sidecar_path)
+                try:
+                    sidecar_blocks = []
+                    sidecar_size = 0
+                    while sidecar_size <= self.max_sidecar_size:
+                        data_block = sidecar_file.read(self.max_sidecar_size + 1 - sidecar_size)
+                        if not data_block:
+                            break
+                        sidecar_blocks.append(data_block)
+                        sidecar_size += len(data_block)
+                finally:
+                    sidecar_file.close()
+                self.record_phase('stat', start_time)
+                if sidecar_size > self.max_sidecar_size:
+                    raise IOError('Remote checksum file exceeds %d bytes: "%s"' % (self.max_sidecar_size, sidecar_path))
+                hex_digest = parse_sidecar(b''.join(sidecar_blocks).decode('utf-8', 'replace'),
+                                           posixpath.basename(entity_path))
+                if hex_digest is None:
+                    raise IOError('Remote checksum file lists no digest for the file: "%s"' % sidecar_path)
+                digester.expect_digest(posixpath.splitext(sidecar_name)[1][1:], hex_digest, sidecar_name)
+                digester.sidecar_content = b''.join(sidecar_blocks)
+                logger.log(self.file_log_level, 'Remote checksum file read SUCCESS: "%s"', sidecar_path)
+            except Exception as err:
+                err_str = str(err)
+                self.record_phase('stat', start_time, err=err)
+                logger.error('Remote checksum file read FAILURE! "%s"', sidecar_path)
+                logger.error(err_str)
+        elif is_check_file:
+            # one round trip, but the server reads the whole file to answer it
+            start_time = time.time()
+            try:
+                remote_digest = ftp_conn.get_remote_digest(entity_path, self.digest_algorithms)
+                self.record_phase('stat', start_time)
+                if remote_digest is not None:
+                    digester.expect_digest(remote_digest[0], remote_digest[1], 'check-file')
+            except Exception as err:
+                self.record_phase('stat', start_time, err=err)
+                logger.warning('Remote file check-file FAILURE, download unverified: "%s"', entity_path)
+                logger.warning(str(err))
 
-        return self.target_full_name, err_str
+        return digester, err_str
 
 
     @ensure_annotations
@@ -396,8 +1072,9 @@ class FtpScanner(object):
             self.target_path_name = target_path_name
             
         if ftp_conn is None:
-            ftp_conn = self.get_connection(logger=logger,
-                                           is_test_mode=is_test_mode)
+            ftp_conn, err_str = self.borrow_connection(logger=logger,
+                                                       is_test_mode=is_test_mode)
+            self.ftp_conn = ftp_conn
             close_connection = True
         else:
             self.ftp_conn = ftp_conn
@@ -415,50 +1092,37 @@ class FtpScanner(object):
 
         if err_str is None:
             logger.info('Navigate to remote folder ATTEMPT: "%s"', remote_path_name)
-            if self.remote_path_exists(remote_path_name):
-                ftp_conn.chdir(remote_path_name)
+            path_exists, err_str = self.remote_path_exists(remote_path_name)
+            if path_exists:
                 logger.info('Navigate to remote folder SUCCESS: "%s"', remote_path_name)
                 try:
                     logger.info('Scanning remote folder: "%s"' % remote_path_name)
-                    if self.host_type == FtpLibNameEnum.FTPUTIL:
-                        file_names_list = ftp_conn.listdir(remote_path_name)
-                        for remote_file_name in file_names_list:
-                            if ftp_conn.path.isfile(remote_file_name):
-                                logger.info('Fetching remote file: "%s"', remote_file_name)
-                                self.get_remote_file(remote_path_name=remote_path_name,
-                                                     remove_file_name=remote_file_name,
-                                                     target_path_name=target_path_name,
-                                                     target_file_name=remote_file_name,
-                                                     ftp_conn=ftp_conn,
-                                                     close_connection=close_connection,
-                                                     remove_remote_file_on_download=remove_remote_file_on_download,
-                                                     logger=logger,
-                                                     is_test_mode=is_test_mode)
-                    else:
-                        file_names_list = ftp_conn.listdir()
-                        for remote_file_name in file_names_list:
-                            if ftp_conn.isfile(remote_file_name):
-                                logger.info('Fetching remote file: "%s"', remote_file_name)
-                                self.get_remote_file(remote_path_name=remote_path_name,
-                                                     remote_file_name=remote_file_name,
-                                                     target_path_name=target_path_name,
-                                                     target_file_name=remote_file_name,
-                                                     ftp_conn=ftp_conn,
-                                                     close_connection=close_connection,
-                                                     remove_remote_file_on_download=remove_remote_file_on_download,
-                                                     logger=logger,
-                                                     is_test_mode=is_test_mode)
+                    for remote_entry in ftp_conn.list_folder(remote_path_name):
+                        if self.entry_filter is not None \
+                        and not self.entry_filter.is_file_included(remote_entry.entity_name, remote_entry.entity_path):
+                            logger.debug('Remote file filtered out: "%s"', remote_entry.entity_name)
+                            continue
+                        if remote_entry.is_file:
+                            logger.info('Fetching remote file: "%s"', remote_entry.entity_name)
+                            self.get_remote_file(remote_path_name=remote_path_name,
+                                                 remote_file_name=remote_entry.entity_name,
+                                                 target_path_name=target_path_name,
+                                                 target_file_name=remote_entry.entity_name,
+                                                 ftp_conn=ftp_conn,
+                                                 close_connection=False,
+                                                 remove_remote_file_on_download=remove_remote_file_on_download,
+                                                 logger=logger,
+                                                 is_test_mode=is_test_mode,
+                                                 remote_entry=remote_entry)
                 except Exception as err:
                     logger.error(err)
             else:
                 logger.error('Navigate to remote folder FAILURE: "%s"', remote_path_name)
                 logger.error('Remote path does not exist or is inaccessible!')
 
-        # close the FTP connection as appropriate
+        # hand the FTP connection back as appropriate
         if ftp_conn is not None and close_connection:
-            logger.info('Closing FTP connection')
-            ftp_conn.close()
-            logger.info('Closed FTP connection')
+            self.return_connection(ftp_conn, logger=logger)
 
         return list_of_files, err_str
 
@@ -515,180 +1179,662 @@ class FtpScanner(object):
         else:
             self.is_test_mode = is_test_mode
 
-        if self.host_type == FtpLibNameEnum.PYSFTP:
-            try:
-                logger.info('Current working folder: "%s"', ftp_conn.pwd)
-                logger.info('Does remote path exist? "%s"', remote_path_name)
-                if ftp_conn.exists(remote_path_name):
-                    logger.info('Remote path does exist! "%s"', remote_path_name)
-                    logger.info('Navigate to remote folder ATTEMPT: "%s"', remote_path_name)
-                    ftp_conn.cd(remote_path_name)
-                    logger.info('Navigate to remote folder SUCCESS: "%s"', remote_path_name)
-                    ftp_conn.walktree(remote_path_name,
-                                      self.walktreeFcallback,
-                                      self.walktreeDcallback,
-                                      self.walktreeUcallback)
-                else:
-                    logger.error('Remote path does NOT exist! "%s"', remote_path_name)
-            except FTPError as err:
-                errStr = str(err)
-                logger.error('WALK of FTP folder "%s" encountered an FTP error: %s%s', errStr, os.linesep)
-                logger.error('Program will retry WALK on the next iteration!%s', os.linesep)
+        # the outermost call owns the download worker pool,
+        # nested calls simply queue their files onto it
+        owns_parallel_downloader = False
+        download_worker_count = self.download_worker_count
+        if self.transfer_governor is not None:
+            session_limit = self.transfer_governor.get_session_limit(self.host_url)
+            # the walk keeps a session of its own, and workers waiting
+            # on sessions it holds would wait for as long as it walks
+            if session_limit is not None and session_limit - 1 < download_worker_count:
+                download_worker_count = session_limit - 1
+                logger.info('Download workers capped at %d by the session limit of: %s', max(download_worker_count, 1), self.host_url)
+        if download_worker_count > 1 and self.parallel_downloader is None:
+            self.parallel_downloader = ParallelDownloader(self,
+                                                          worker_count=download_worker_count,
+                                                          remove_remote_file_on_download=remove_remote_file_on_download,
+                                                          order_policy=self.download_order_policy,
+                                                          logger=logger,
+                                                          is_test_mode=is_test_mode)
+            self.parallel_downloader.start()
+            owns_parallel_downloader = True
+
+        # likewise the archive extraction workers, which run alongside the downloads
+        owns_archive_extractor = False
+        if self.archive_worker_count > 0 and self.archive_extractor is None:
+            self.archive_extractor = ArchiveExtractor(worker_count=self.archive_worker_count,
+                                                      on_job_done=self.record_extraction,
+                                                      logger=logger)
+            self.archive_extractor.remove_archive_on_extract = self.remove_archive_on_extract
+            self.archive_extractor.start()
+            owns_archive_extractor = True
+
+        # a pooled connection may hold stat results from an
+        # earlier cycle, and stale mtimes would hide changes
+        ftp_conn.clear_cache()
+
+        walk_files_deferred = self.walk_files_deferred
+        walk_entries_filtered = self.walk_entries_filtered
+
+        cycle_start_time = time.time()
+        if self.metrics_registry is not None:
+            files_downloaded = self.metrics_registry.get_value('files_downloaded_total') or 0
+            bytes_downloaded = self.metrics_registry.get_value('bytes_downloaded_total') or 0
+
+        # one attribute-bearing listing per folder feeds both
+        # the walk and the downloads, whichever the backend
+        walker = RemoteTreeWalker(lambda folder_path, folder_entry: self.list_remote_candidates(folder_path,
+                                                                                               folder_entry,
+                                                                                               ftp_conn=ftp_conn,
+                                                                                               logger=logger),
+                                  max_depth=self.max_walk_depth if recursively else 0,
+                                  prune_folder_func=self.prune_folder_func,
+                                  logger=logger)
+        # downloading inline in policy order means holding the walk's files until it is done
+        held_jobs = [] if self.download_order_policy is not None and self.parallel_downloader is None else None
+        for dirpath, _dir_entries, file_entries in walker.walk(remote_path_name):
+            target_path_name_temp = self.dynamicUtilities.expand_path(path_fldr=self.output_path_name,
+                                                                      path_name=dirpath[1:] if dirpath.startswith('/') else dirpath,
+                                                                      logger=logger,
+                                                                      is_test_mode=is_test_mode)
+            for file_entry in file_entries:
+                if held_jobs is not None:
+                    held_jobs.append(TransferJob(dirpath, file_entry.entity_name, target_path_name_temp, file_entry.entity_name, remote_entry=file_entry))
+                    continue
+                try:
+                    self.fetch_remote_file(dirpath, file_entry.entity_name, target_path_name_temp, file_entry.entity_name, ftp_conn, remove_remote_file_on_download, logger=logger, remote_entry=file_entry)
+                except Exception as err:
+                    err_str = str(err)
+                    logger.error('Remote file fetch FAILURE: "%s"', file_entry.entity_path)
+                    logger.error(err_str)
+
+        if held_jobs is not None:
+            # sorted is stable, so equal scores keep their walk order
+            for transfer_job in sorted(held_jobs, key=self.download_order_policy.get_score):
+                try:
+                    self.fetch_remote_file(transfer_job.remote_path_name, transfer_job.remote_file_name, transfer_job.target_path_name, transfer_job.target_file_name, ftp_conn, remove_remote_file_on_download, logger=logger, remote_entry=transfer_job.remote_entry)
+                except Exception as err:
+                    err_str = str(err)
+                    logger.error('Remote file fetch FAILURE: "%s"', transfer_job.remote_entry.entity_path)
+                    logger.error(err_str)
+
+        self.walk_folders_visited += walker.folders_visited
+        self.walk_files_visited += walker.files_visited
+        self.walk_list_calls += walker.list_calls
+        logger.info('Remote walk of "%s" visited %d folders and %d files using %d listings (%d folders pruned)',
+                    remote_path_name, walker.folders_visited, walker.files_visited, walker.list_calls, walker.folders_pruned)
+
+        if self.stability_policy is not None:
+            logger.info('Remote walk of "%s" deferred %d files not yet stable',
+                        remote_path_name, self.walk_files_deferred - walk_files_deferred)
+            self.stability_policy.prune_observations()
+            self.last_deferred_paths = self.walk_deferred_paths
+            self.walk_deferred_paths = set()
+
+        if self.entry_filter is not None:
+            logger.info('Remote walk of "%s" filtered out %d entries',
+                        remote_path_name, self.walk_entries_filtered - walk_entries_filtered)
+
+        if owns_parallel_downloader:
+            _jobs_done, _jobs_failed = self.parallel_downloader.join()
+            self.parallel_downloader = None
+
+        if owns_archive_extractor:
+            _jobs_completed, _jobs_failed = self.archive_extractor.join()
+            self.archive_extractor = None
+
+        if self.fetch_journal is not None:
+            self.fetch_journal.commit_journal(logger=logger)
+
+        if self.metrics_registry is not None:
+            cycle_seconds = max(time.time() - cycle_start_time, 1e-6)
+            cycle_labels = {'folder': remote_path_name}
+            files_downloaded = (self.metrics_registry.get_value('files_downloaded_total') or 0) - files_downloaded
+            bytes_downloaded = (self.metrics_registry.get_value('bytes_downloaded_total') or 0) - bytes_downloaded
+            self.metrics_registry.set_gauge('cycle_seconds', cycle_seconds, labels=cycle_labels)
+            self.metrics_registry.set_gauge('cycle_files_per_second', files_downloaded / cycle_seconds, labels=cycle_labels)
+            self.metrics_registry.set_gauge('cycle_bytes_per_second', bytes_downloaded / cycle_seconds, labels=cycle_labels)
+
+        if self.snapshot_store is not None:
+            logger.info('Remote snapshot of "%s": %d folders unchanged, %d files unchanged',
+                        remote_path_name, self.snapshot_store.folders_skipped, self.snapshot_store.entries_unchanged)
+            self.snapshot_store.folders_skipped = 0
+            self.snapshot_store.entries_unchanged = 0
+            self.snapshot_store.save_snapshot(logger=logger)
+
+        return err_str
+
+
+    @ensure_annotations
+    def fetch_remote_file(self,
+                          remote_path_name: str,
+                          remote_file_name: str,
+                          target_path_name: str,
+                          target_file_name: str,
+                          ftp_conn=None,
+                          remove_remote_file_on_download: bool=False,
+                          logger=None,
+                          is_test_mode: bool=False,
+                          remote_entry=None):
+
+        err_str = None
+
+        if logger is None:
+            logger = self.logger
+
+        self.walk_files_fetched += 1
+
+        if remote_entry is not None:
+            self.record_fetch_state(remote_entry.entity_path, FetchStateEnum.DISCOVERED, remote_entry)
+
+        # queue onto the download workers when running in parallel,
+        # otherwise download inline over the walking connection
+        if self.parallel_downloader is not None:
+            self.parallel_downloader.submit_job(TransferJob(remote_path_name,
+                                                            remote_file_name,
+                                                            target_path_name,
+                                                            target_file_name,
+                                                            remote_entry=remote_entry))
         else:
-            for dirpath, dirnames, filenames in ftp_conn.walk(remote_path_name):
-                for filename in filenames:
-                    target_path_name_temp = self.dynamicUtilities.expand_path(path_fldr=self.output_path_name,
-                                                                              path_name=dirpath[1:] if dirpath.startswith('/') else dirpath,
-                                                                              logger=logger,
-                                                                              is_test_mode=is_test_mode)
-                    try:
-                        logger.info('Navigate to remote folder ATTEMPT: "%s"', dirpath)
-                        ftp_conn.chdir(dirpath)
-                        logger.info('Navigate to remote folder SUCCESS: "%s"', dirpath)
-                        self.get_remote_file(dirpath, filename, target_path_name_temp, filename, ftp_conn, close_connection, remove_remote_file_on_download, logger=logger)
-                    except Exception as err:
-                        err_str = str(err)
-                        logger.error('Navigate to remote folder FAILURE: "%s"', dirpath)
-                        logger.error(err_str)
-                if recursively:
-                    for dirname in dirnames:
-                        temppath = ftp_conn.path.join(dirpath, dirname)
-                        target_path_name_temp = self.dynamicUtilities.expand_path(path_fldr=self.output_path_name,
-                                                                                  path_name=dirpath[1:] if dirpath.startswith('/') else dirpath,
-                                                                                  logger=logger,
-                                                                                  is_test_mode=is_test_mode)
-                        self.get_remote_folders_files(remote_path_name=temppath,
-                                                      entity_path_name=dirpath,
-                                                      target_path_name=target_path_name,
-                                                      recursively=recursively,
-                                                      ftp_conn=ftp_conn,
-                                                      close_connection=close_connection,
-                                                      remove_remote_file_on_download=remove_remote_file_on_download,
-                                                      logger=logger,
-                                                      is_test_mode=is_test_mode)
+            _target_full_name, err_str = self.get_remote_file(remote_path_name,
+                                                              remote_file_name,
+                                                              target_path_name,
+                                                              target_file_name,
+                                                              ftp_conn,
+                                                              False,
+                                                              remove_remote_file_on_download,
+                                                              logger=logger,
+                                                              is_test_mode=is_test_mode,
+                                                              remote_entry=remote_entry)
 
         return err_str
     
     
     @ensure_annotations
-    def remote_path_exists(self,
-                           path_name: str,
-                           logger=None):
-        
-        exists = False
+    def list_remote_entries(self,
+                            folder_path: str,
+                            ftp_conn=None,
+                            logger=None,
+                            listed_names=None):
+        '''
+        Return (dir_entries, file_entries, err_str) for a folder, less what
+        entry_filter drops; listed_names, if given, is a set receiving the
+        name of every entry listed, so that marker and checksum files are
+        found whether or not the filter drops them
+        '''
+
+        dir_entries = []
+        file_entries = []
         err_str = None
-        
+
         if logger is None:
             logger = self.logger
-        
+
+        if ftp_conn is None:
+            ftp_conn = self.ftp_conn
+
+        phase = 'list'
+        start_time = time.time()
         try:
-            if self.host_type == FtpLibNameEnum.FTPUTIL:
-                logger.info('Remote path exists via FTPUTIL? "%s"', path_name)
-                exists = self.ftp_conn.path.exists(path_name)
-                logger.info('Remote path exists via FTPUTIL! "%s"', path_name)
-            else:
-                logger.info('Remote path exists via PYSFTP? "%s"', path_name)
-                exists = self.ftp_conn.exists(path_name)
-                logger.info('Remote path exists via PYSFTP! "%s"', path_name)
+            # a single listing carries every entry's attributes
+            remote_entries = ftp_conn.list_folder(folder_path)
+            self.record_phase('list', start_time)
+
+            if listed_names is not None:
+                listed_names.update(remote_entry.entity_name for remote_entry in remote_entries)
+
+            for remote_entry in remote_entries:
+                # judged on the listing alone, before a link is resolved
+                if self.entry_filter is not None and not self.is_entry_wanted(remote_entry, logger=logger):
+                    continue
+                if self.shard_assignment is not None and not remote_entry.is_dir \
+                and not self.shard_assignment.is_owned(remote_entry.entity_path):
+                    continue
+                if remote_entry.is_link:
+                    # only links need a further round trip to resolve their
+                    # target, and links to folders are not descended into
+                    phase = 'stat'
+                    start_time = time.time()
+                    remote_entry.is_file = ftp_conn.stat_entry(remote_entry.entity_path).is_file
+                    self.record_phase('stat', start_time)
+                if remote_entry.is_dir:
+                    dir_entries.append(remote_entry)
+                elif remote_entry.is_file:
+                    file_entries.append(remote_entry)
         except Exception as err:
             err_str = str(err)
-            logger.error('Remote path name does NOT exist: "%s"', path_name)
-            logger.error(err_str)
+            self.record_phase(phase, start_time, err=err)
 
-        return exists, err_str
+        return dir_entries, file_entries, err_str
 
 
     @ensure_annotations
-    def walktreeFcallback(self,
-                          entity_path: str):
-        
-        # derive target path name for use with folder creation if so needed
-        target_path_name = self.dynamicUtilities.expand_path(path_fldr=self.output_path_name,
-                                                             path_name=os.path.dirname(entity_path),
-                                                             logger=self.logger,
-                                                             is_test_mode=self.is_test_mode)
-        
-        _target_full_name, _err_str = self.get_remote_file(os.path.dirname(entity_path), os.path.basename(entity_path), target_path_name, os.path.basename(entity_path), self.ftp_conn, self.close_connection, self.remove_remote_file_on_download, self.logger)
-        
-        return
+    def list_remote_changes(self,
+                            folder_path: str,
+                            folder_entry=None,
+                            ftp_conn=None,
+                            logger=None):
+
+        if logger is None:
+            logger = self.logger
+
+        if ftp_conn is None:
+            ftp_conn = self.ftp_conn
+
+        if folder_entry is not None:
+            folder_mtime = folder_entry.mtime
+        elif ftp_conn.has_folder_stat:
+            try:
+                folder_mtime = ftp_conn.stat_entry(folder_path).mtime
+            except Exception:
+                folder_mtime = None
+        else:
+            folder_mtime = None
+
+        sub_folder_names = [dir_name for dir_name in self.snapshot_store.get_sub_folder_names(folder_path)
+                            if self.entry_filter is None
+                            or not self.entry_filter.is_folder_pruned(dir_name, posixpath.join(folder_path, dir_name))]
+
+        # an unchanged folder mtime means its own entries are as they
+        # were when it settled, so skip its listing and only look at
+        # its sub-folders, whose contents may have changed regardless;
+        # where a folder stat costs a listing of its parent, or reports
+        # no mtime, the sub-folders are found by listing the folder
+        if (len(sub_folder_names) == 0 or ftp_conn.has_folder_stat) \
+        and self.snapshot_store.is_folder_unchanged(folder_path, folder_mtime):
+            try:
+                dir_entries = [ftp_conn.stat_entry(posixpath.join(folder_path, dir_name))
+                               for dir_name in sub_folder_names]
+                return dir_entries, [], None
+            except Exception as err:
+                logger.warning('Remote folder snapshot stale, listing it: "%s"', folder_path)
+                logger.warning(str(err))
+
+        sibling_names = set()
+        dir_entries, file_entries, err_str = self.list_remote_entries(folder_path,
+                                                                      ftp_conn=ftp_conn,
+                                                                      logger=logger,
+                                                                      listed_names=sibling_names)
+
+        if err_str is None:
+            changed_entries = [file_entry for file_entry in file_entries
+                               if self.snapshot_store.is_entry_changed(folder_path, file_entry)]
+            self.snapshot_store.record_folder(folder_path,
+                                              folder_mtime,
+                                              dir_entries,
+                                              file_entries,
+                                              has_pending_entries=len(changed_entries) > 0)
+            # marker files are looked for among all listed names, changed or not
+            file_entries = self.select_stable_entries(changed_entries,
+                                                      sibling_names=sibling_names,
+                                                      logger=logger)
+            file_entries = self.attach_digest_sidecars(file_entries, sibling_names)
+
+        return dir_entries, file_entries, err_str
 
 
     @ensure_annotations
-    def walktreeDcallback(self,
-                          entity_path: str):
-        
-        return
+    def list_remote_candidates(self,
+                               folder_path: str,
+                               folder_entry=None,
+                               ftp_conn=None,
+                               logger=None):
+
+        if self.snapshot_store is not None:
+            return self.list_remote_changes(folder_path,
+                                            folder_entry,
+                                            ftp_conn=ftp_conn,
+                                            logger=logger)
+
+        sibling_names = set()
+        dir_entries, file_entries, err_str = self.list_remote_entries(folder_path,
+                                                                      ftp_conn=ftp_conn,
+                                                                      logger=logger,
+                                                                      listed_names=sibling_names)
+        if err_str is None:
+            file_entries = self.select_stable_entries(file_entries,
+                                                      sibling_names=sibling_names,
+                                                      logger=logger)
+            file_entries = self.attach_digest_sidecars(file_entries, sibling_names)
+
+        return dir_entries, file_entries, err_str
+
+
+    def is_entry_wanted(self,
+                        remote_entry,
+                        logger=None):
+        '''
+        Apply entry_filter to a listed entry: folders to its prune rules, the
+        rest, links included, to its file rules; counts and logs what it drops
+        '''
+
+        if logger is None:
+            logger = self.logger
+
+        if remote_entry.is_dir:
+            is_wanted = not self.entry_filter.is_folder_pruned(remote_entry.entity_name, remote_entry.entity_path)
+        else:
+            is_wanted = self.entry_filter.is_file_included(remote_entry.entity_name, remote_entry.entity_path)
+
+        if not is_wanted:
+            self.walk_entries_filtered += 1
+            logger.debug('Remote %s filtered out: "%s"', 'folder' if remote_entry.is_dir else 'file', remote_entry.entity_path)
+
+        return is_wanted
+
+
+    @ensure_annotations
+    def select_stable_entries(self,
+                              file_entries: list,
+                              sibling_names=None,
+                              logger=None):
+
+        if self.stability_policy is None:
+            return file_entries
+
+        if logger is None:
+            logger = self.logger
+
+        stable_entries = []
+        for file_entry in file_entries:
+            # marker files are neither downloads nor deferred ones, but are
+            # removed once the files they complete have landed and gone
+            if self.stability_policy.is_marker_file(file_entry.entity_name):
+                continue
+            is_stable, reason = self.stability_policy.is_file_stable(file_entry, sibling_names=sibling_names)
+            if is_stable:
+                if self.stability_policy.marker_suffix is not None:
+                    file_entry.marker_name = file_entry.entity_name + self.stability_policy.marker_suffix
+                stable_entries.append(file_entry)
+            else:
+                # deferred files cost nothing further until a later listing
+                self.walk_files_deferred += 1
+                if file_entry.entity_path not in self.last_deferred_paths:
+                    self.walk_files_newly_deferred += 1
+                self.walk_deferred_paths.add(file_entry.entity_path)
+                logger.debug('Remote file deferred, %s: "%s"', reason, file_entry.entity_path)
+                if self.file_event_logger is not None:
+                    self.file_event_logger.log_event('defer',
+                                                     self.host_url,
+                                                     file_entry.entity_path,
+                                                     outcome='deferred',
+                                                     bytes=file_entry.size,
+                                                     reason=reason)
+
+        return stable_entries
 
 
     @ensure_annotations
-    def walktreeUcallback(self,
-                          entity_path: str):
+    def attach_digest_sidecars(self,
+                               file_entries: list,
+                               sibling_names: set):
+        '''
+        Point each file at the checksum file listed beside it, and drop the
+        checksum files of listed files, which are fetched along with them
+        '''
+
+        if len(self.digest_sidecar_suffixes) == 0:
+            return file_entries
+
+        data_entries = []
+        for file_entry in file_entries:
+            is_sidecar = False
+            for sidecar_suffix in self.digest_sidecar_suffixes:
+                if file_entry.entity_name.endswith(sidecar_suffix) \
+                and file_entry.entity_name[:-len(sidecar_suffix)] in sibling_names:
+                    is_sidecar = True
+                    break
+                if file_entry.sidecar_name is None and file_entry.entity_name + sidecar_suffix in sibling_names:
+                    file_entry.sidecar_name = file_entry.entity_name + sidecar_suffix
+            if not is_sidecar:
+                data_entries.append(file_entry)
+
+        return data_entries
+
+
+    @ensure_annotations
+    def remote_path_exists(self,
+                           path_name: str,
+                           logger=None):
         
+        exists = False
+        err_str = None
         
-        return
+        if logger is None:
+            logger = self.logger
+        
+        try:
+            logger.info('Remote path exists? "%s"', path_name)
+            exists = self.ftp_conn.exists(path_name)
+            logger.info('Remote path exists! "%s"', path_name)
+        except Exception as err:
+            err_str = str(err)
+            logger.error('Remote path name does NOT exist: "%s"', path_name)
+            logger.error(err_str)
+
+        return exists, err_str
 
 
 if __name__ == '__main__':
 
-    while True:
+    logger = FtpScanner.logger
+
+    # log records are written from a background thread, not the scan thread
+    FtpScanner.loggingUtilities.async_mode = async_logging
+
+    # the keyring is asked once per password_cache_seconds, not on every connect
+    FtpScanner.dynamicUtilities.password_cache_seconds = password_cache_seconds
+
+    # one pool for the life of the process so that
+    # connections are reused across folders and scan cycles
+    connection_pool = ConnectionPool(max_idle_seconds=pool_max_idle_seconds,
+                                     max_pooled_per_key=download_worker_count + 1)
+
+    # what has already been seen survives restarts
+    snapshot_store = RemoteSnapshotStore(snapshot_file_name=snapshot_file_name)
+    snapshot_store.load_snapshot()
+
+    # each file's progress survives a crash between download and removal
+    fetch_journal = None
+    if journal_file_name is not None:
+        fetch_journal = FetchJournal(journal_file_name=journal_file_name)
+        if fetch_journal.open_journal() is not None:
+            fetch_journal = None
+
+    # several instances split the host's folders, or its files by path
+    # hash, and leases keep any two of them off the same file meanwhile
+    shard_assignment = ShardAssignment(shard_index, shard_count) if shard_count > 1 else None
+    if shard_assignment is not None and shard_by == 'folder':
+        folder_paths_list = shard_assignment.get_owned_keys(folder_paths_list)
+        if len(folder_paths_list) == 0:
+            raise ValueError('Shard %d of %d has no folders to fetch' % (shard_index, shard_count))
+    lease_store = None
+    if lease_file_name is not None:
+        lease_store = LeaseStore(lease_file_name=lease_file_name, lease_seconds=lease_seconds)
+        if lease_store.open_store() is not None:
+            lease_store = None
+
+    # scraped over HTTP when a port is set, and written out after every cycle
+    metrics_registry = MetricsRegistry()
+    if metrics_http_port is not None:
+        metrics_registry.start_http_server(metrics_http_port)
+
+    # per-file events as JSON lines, which stand in for the per-file free text
+    file_event_logger = None
+    if event_log_file_name is not None:
+        file_event_logger, err_str = FtpScanner.loggingUtilities.get_event_logger(event_log_file_name=event_log_file_name,
+                                                                                  success_sample_rate=event_success_sample_rate,
+                                                                                  max_success_events_per_second=event_max_success_per_second)
+
+    # landed files are announced rather than left for consumers to poll for
+    landed_notifier = None
+    notify_sink = None
+    if notify_amqp_host is not None:
+        notify_password, err_str = FtpScanner.dynamicUtilities.get_pwd_via_keyring(key=notify_amqp_host,
+                                                                                 login=notify_amqp_username,
+                                                                                 logger=logger)
+        if err_str is None and notify_password is None:
+            err_str = 'No password in the keyring for: %s@%s' % (notify_amqp_username, notify_amqp_host)
+        if err_str is not None:
+            # files are still fetched, only nobody is told of them
+            logger.error('Landed file notifier DISABLED, AMQP password FAILURE')
+            logger.error(err_str)
+        else:
+            notify_sink = PikaNotifySink(host_url=notify_amqp_host,
+                                         host_port=notify_amqp_port,
+                                         virtual_host=notify_amqp_virtual_host,
+                                         username=notify_amqp_username,
+                                         password=notify_password,
+                                         exchange_name=notify_exchange_name,
+                                         routing_key=notify_routing_key)
+    elif notify_file_name is not None:
+        notify_sink = FileNotifySink(notify_file_name)
+    if notify_sink is not None:
+        landed_notifier = LandedFileNotifier(notify_sink, buffer_file_name=notify_buffer_file_name)
+        landed_notifier.start()
+
+    # one governor for the process, so its limits hold across every folder
+    transfer_governor = TransferGovernor(max_bytes_per_second=max_bytes_per_second,
+                                         max_sessions=max_sessions)
+    transfer_governor.set_host_limits(host_url,
+                                      max_bytes_per_second=host_max_bytes_per_second,
+                                      max_sessions=host_max_sessions)
+
+    # files waiting to download go in this order, heavier weighted patterns first
+    download_order_policy = get_order_policy(download_order_policy_name, pattern_weights=download_priority_weights)
+
+    # temporary and hidden upload files are dropped from listings unlooked at
+    entry_filter = EntryFilter(include_patterns=include_file_patterns,
+                               exclude_patterns=exclude_file_patterns,
+                               prune_patterns=prune_folder_patterns)
+
+    # one scanner per folder, created on first use
+    ftp_scanners = {}
+
+    # each folder is polled when due rather than all of them in turn, sooner
+    # after a poll that found files, ever later while it finds none
+    poll_scheduler = PollScheduler(min_interval_seconds=poll_min_interval_seconds,
+                                   max_interval_seconds=poll_max_interval_seconds,
+                                   initial_interval_seconds=scan_interval_seconds)
+    for current_folder_path in folder_paths_list:
+        poll_scheduler.add_folder(current_folder_path)
+
+    # notices still queued are published, or buffered, on the way out,
+    # a service stop's SIGTERM included
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: sys.exit(0))
+    try:
+        while True:
         
-        for current_folder_path in folder_paths_list:
+            for current_folder_path in poll_scheduler.pop_due_folders():
     
-            remote_path_name = folder_path_prefix + current_folder_path
+                remote_path_name = folder_path_prefix + current_folder_path
         
-            ftpScanner = FtpScanner(host_url=host_url,
-                                    host_type=host_type,
-                                    host_port=host_port,
-                                    username=username,
-                                    folder_path_prefix=folder_path_prefix,
-                                    initial_folder_path=current_folder_path,
-                                    scan_interval_seconds=scan_interval_seconds,
-                                    is_test_mode=False)
-
-            ftpScanner.output_path_name = output_path_name
-            if not os.path.exists(output_path_name):
-                _dirname, err_str = ftpScanner.dynamicUtilities.create_path(path_name=output_path_name,
-                                                                            contains_file_name=False,
-                                                                            logger=ftpScanner.logger,
-                                                                            is_test_mode=ftpScanner.is_test_mode)
+                ftpScanner = ftp_scanners.get(current_folder_path)
+                if ftpScanner is None:
+                    ftpScanner = FtpScanner(host_url=host_url,
+                                            host_type=host_type,
+                                            host_port=host_port,
+                                            username=username,
+                                            folder_path_prefix=folder_path_prefix,
+                                            initial_folder_path=current_folder_path,
+                                            scan_interval_seconds=scan_interval_seconds,
+                                            is_test_mode=False)
+                    ftpScanner.connection_pool = connection_pool
+                    ftpScanner.download_worker_count = download_worker_count
+                    ftpScanner.snapshot_store = snapshot_store
+                    ftpScanner.fetch_journal = fetch_journal
+                    ftpScanner.digest_algorithms = digest_algorithms
+                    ftpScanner.digest_sidecar_suffixes = digest_sidecar_suffixes
+                    ftpScanner.use_sftp_check_file = use_sftp_check_file
+                    ftpScanner.require_verified_removal = require_verified_removal
+                    ftpScanner.archive_worker_count = archive_worker_count
+                    ftpScanner.remove_archive_on_extract = remove_archive_on_extract
+                    ftpScanner.landed_notifier = landed_notifier
+                    ftpScanner.transfer_governor = transfer_governor
+                    ftpScanner.download_order_policy = download_order_policy
+                    ftpScanner.entry_filter = entry_filter
+                    if shard_by == 'file':
+                        ftpScanner.shard_assignment = shard_assignment
+                    ftpScanner.lease_store = lease_store
+                    ftpScanner.metrics_registry = metrics_registry
+                    if file_event_logger is not None:
+                        ftpScanner.file_event_logger = file_event_logger
+                        ftpScanner.file_log_level = logging.DEBUG
+                    ftpScanner.stability_policy = FileStabilityPolicy(stable_listing_count=stable_listing_count,
+                                                                      min_age_seconds=stable_min_age_seconds,
+                                                                      marker_suffix=stable_marker_suffix,
+                                                                      logger=ftpScanner.logger)
+                    ftp_scanners[current_folder_path] = ftpScanner
+
+                ftpScanner.output_path_name = output_path_name
+                if not os.path.exists(output_path_name):
+                    _dirname, err_str = ftpScanner.dynamicUtilities.create_path(path_name=output_path_name,
+                                                                                contains_file_name=False,
+                                                                                logger=ftpScanner.logger,
+                                                                                is_test_mode=ftpScanner.is_test_mode)
         
-            ftpScanner.ftp_conn, err_str = ftpScanner.get_connection()
+                # new files and files still settling both call for an early look
+                files_found = ftpScanner.walk_files_landed + ftpScanner.walk_files_newly_deferred
+
+                ftpScanner.ftp_conn, err_str = ftpScanner.borrow_connection()
             
-            if not err_str:
+                if not err_str:
                 
-                ftpScanner.logger.info('Remote path exists YES? "%s"', remote_path_name)
-                path_exists, err_str = ftpScanner.remote_path_exists(remote_path_name)
-                if not path_exists:
-                    ftpScanner.logger.warning('Remote path exists NOT! "%s"', remote_path_name)
-                    if folder_path_prefix == '/':
-                        ftpScanner.logger.warning('Remove folder_path_prefix, try existence check again.')
-                        remote_path_name = current_folder_path
-                    else:
-                        ftpScanner.logger.warning('Prepend folder_path_prefix, try existence check again.')
-                        remote_path_name = folder_path_prefix + current_folder_path
                     ftpScanner.logger.info('Remote path exists YES? "%s"', remote_path_name)
                     path_exists, err_str = ftpScanner.remote_path_exists(remote_path_name)
+                    if not path_exists:
+                        ftpScanner.logger.warning('Remote path exists NOT! "%s"', remote_path_name)
+                        if folder_path_prefix == '/':
+                            ftpScanner.logger.warning('Remove folder_path_prefix, try existence check again.')
+                            remote_path_name = current_folder_path
+                        else:
+                            ftpScanner.logger.warning('Prepend folder_path_prefix, try existence check again.')
+                            remote_path_name = folder_path_prefix + current_folder_path
+                        ftpScanner.logger.info('Remote path exists YES? "%s"', remote_path_name)
+                        path_exists, err_str = ftpScanner.remote_path_exists(remote_path_name)
                     
-                if path_exists:
-                    ftpScanner.logger.info('Remote path exists YES!: "%s"', remote_path_name)
-                    ftpScanner.logger.info('Attempt download of files from remote path: "%s"', remote_path_name)
-                    ftpScanner.get_remote_folders_files(remote_path_name=remote_path_name,
-                                                        entity_path_name=remote_path_name,
-                                                        target_path_name=output_path_name,
-                                                        recursively=recurse_remote_folders,
-                                                        ftp_conn=ftpScanner.ftp_conn,
-                                                        close_connection=False,
-                                                        remove_remote_file_on_download=remove_remote_file_on_download)
-                else:
-                    ftpScanner.logger.error('Remote path exists NOT! "%s"', remote_path_name)
+                    if path_exists:
+                        ftpScanner.logger.info('Remote path exists YES!: "%s"', remote_path_name)
+                        ftpScanner.logger.info('Attempt download of files from remote path: "%s"', remote_path_name)
+                        ftpScanner.get_remote_folders_files(remote_path_name=remote_path_name,
+                                                            entity_path_name=remote_path_name,
+                                                            target_path_name=output_path_name,
+                                                            recursively=recurse_remote_folders,
+                                                            ftp_conn=ftpScanner.ftp_conn,
+                                                            close_connection=False,
+                                                            remove_remote_file_on_download=remove_remote_file_on_download)
+                    else:
+                        ftpScanner.logger.error('Remote path exists NOT! "%s"', remote_path_name)
                 
-        if ftpScanner.ftp_conn is not None:
-            ftpScanner.logger.info('Closing FTP connection')
-            ftpScanner.ftp_conn.close()
-            ftpScanner.logger.info('Closed FTP connection')
-
-        ftpScanner.logger.info('---------------------------------------')
-        ftpScanner.logger.info('Sleeping for %d seconds, please wait...', scan_interval_seconds)
-        ftpScanner.logger.info('=======================================')
-        time.sleep(scan_interval_seconds)
-        # break
+                # hand the connection back to the pool for the next folder or cycle
+                ftpScanner.return_connection(ftpScanner.ftp_conn)
+                ftpScanner.ftp_conn = None
+
+                files_found = ftpScanner.walk_files_landed + ftpScanner.walk_files_newly_deferred - files_found
+                interval_seconds = poll_scheduler.record_poll(current_folder_path, files_found)
+                ftpScanner.logger.info('Remote path "%s" found %d files, next poll in %.1f seconds',
+                                       remote_path_name, files_found, interval_seconds)
+
+            connection_pool.evict_idle_connections(logger=ftpScanner.logger)
+
+            if fetch_journal is not None:
+                fetch_journal.prune_entries(journal_keep_removed_seconds)
+
+            if lease_store is not None:
+                lease_store.prune_leases(lease_keep_done_seconds)
+
+            if metrics_file_name is not None:
+                metrics_registry.write_prometheus_file(metrics_file_name, logger=ftpScanner.logger)
+
+            ftpScanner.logger.info('---------------------------------------')
+            sleep_seconds = poll_scheduler.get_sleep_seconds()
+            ftpScanner.logger.info('Sleeping for %.1f seconds, please wait...', sleep_seconds)
+            ftpScanner.logger.info('=======================================')
+            time.sleep(sleep_seconds)
+            # break
+    finally:
+        if landed_notifier is not None:
+            landed_notifier.stop()
+        if fetch_journal is not None:
+            fetch_journal.close_journal()
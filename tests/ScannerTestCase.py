@@ -0,0 +1,183 @@
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from Benchmarks.BenchmarkServers import LocalFtpServer
+from Benchmarks.BenchmarkServers import LocalSftpServer
+from Benchmarks.BenchmarkServers import StaticCredentials
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.FtpOps import FtpScanner
+
+username = 'fetch_dlz'
+password = 'fetch_dlz'
+
+sftp_host_types = (FtpLibNameEnum.PYSFTP, FtpLibNameEnum.PARAMIKO)
+
+
+def write_remote_file(root_path: str,
+                      relative_path: str,
+                      data: bytes,
+                      age_seconds: float=3600.0):
+    '''
+    Write a file under the server's root, backdated so that it reads as settled
+    '''
+
+    full_name = os.path.join(root_path, relative_path)
+    os.makedirs(os.path.dirname(full_name), exist_ok=True)
+    with open(full_name, 'wb') as data_file:
+        data_file.write(data)
+    os.utime(full_name, (time.time() - age_seconds, time.time() - age_seconds))
+
+    return full_name
+
+
+class FileEventRecorder(object):
+    '''
+    Stands in for the FileEventLogger, keeping every event it is given
+    '''
+
+    def __init__(self):
+
+        self.events = []
+
+
+    def log_event(self, event, host, path, err_str=None, outcome=None, **fields):
+
+        self.events.append(dict(fields, event=event, host=host, path=path, err_str=err_str, outcome=outcome))
+
+
+    def get_events(self,
+                   event: str,
+                   path=None):
+
+        return [file_event for file_event in self.events
+                if file_event['event'] == event and (path is None or file_event['path'] == path)]
+
+
+class ScannerTestCase(unittest.TestCase):
+    '''
+    One local server of host_type's protocol per test class, over a remote
+    root and local output folder both emptied before each test
+    '''
+
+    host_type = None
+
+    @classmethod
+    def setUpClass(cls):
+
+        if cls.host_type is None:
+            raise unittest.SkipTest('No host type')
+
+        cls.start_path = os.getcwd()
+        cls.root_path = tempfile.mkdtemp(prefix='test_remote_')
+        if cls.host_type in sftp_host_types:
+            cls.server = LocalSftpServer(cls.root_path, username=username, password=password)
+        else:
+            cls.server = LocalFtpServer(cls.root_path, username=username, password=password)
+        cls.server_port = cls.server.start()
+
+
+    @classmethod
+    def tearDownClass(cls):
+
+        cls.server.stop()
+        os.chdir(cls.start_path)
+        shutil.rmtree(cls.root_path, ignore_errors=True)
+
+
+    def setUp(self):
+
+        # pyftpdlib's threaded server changes folder process-wide on CWD,
+        # and concurrent sessions can leave it in one removed below
+        os.chdir(self.start_path)
+        for entity_name in os.listdir(self.root_path):
+            shutil.rmtree(os.path.join(self.root_path, entity_name))
+        os.makedirs(os.path.join(self.root_path, 'in'))
+
+        self.work_path = tempfile.mkdtemp(prefix='test_local_')
+        self.output_path = os.path.join(self.work_path, 'out')
+        os.makedirs(self.output_path)
+
+        self.scanners = []
+
+
+    def tearDown(self):
+
+        for ftp_scanner in self.scanners:
+            if ftp_scanner.fetch_journal is not None:
+                ftp_scanner.fetch_journal.close_journal()
+            if ftp_scanner.lease_store is not None:
+                ftp_scanner.lease_store.close_store()
+            if ftp_scanner.connection_pool is not None:
+                ftp_scanner.connection_pool.close_all_connections()
+        shutil.rmtree(self.work_path, ignore_errors=True)
+
+
+    def make_scanner(self,
+                     **scanner_attrs):
+        '''
+        Return an FtpScanner of this class's host type, landing into
+        output_path, with scanner_attrs set on it
+        '''
+
+        ftp_scanner = FtpScanner(host_url='127.0.0.1',
+                                 host_type=self.host_type,
+                                 host_port=self.server_port,
+                                 username=username,
+                                 folder_path_prefix='/',
+                                 initial_folder_path='in')
+        ftp_scanner.logger.setLevel(logging.WARNING)
+        ftp_scanner.dynamicUtilities = StaticCredentials(password)
+        ftp_scanner.known_hosts_file = self.server.known_hosts_file if self.host_type in sftp_host_types else None
+        ftp_scanner.output_path_name = self.output_path
+        ftp_scanner.file_event_logger = FileEventRecorder()
+        for attr_name, attr_value in scanner_attrs.items():
+            setattr(ftp_scanner, attr_name, attr_value)
+        self.scanners.append(ftp_scanner)
+
+        return ftp_scanner
+
+
+    def run_scan(self,
+                 ftp_scanner,
+                 remove_remote_file_on_download: bool=True):
+        '''
+        One walk of /in by ftp_scanner on a connection of its own, returning its err_str
+        '''
+
+        ftp_conn, err_str = ftp_scanner.borrow_connection()
+        self.assertIsNone(err_str)
+        try:
+            err_str = ftp_scanner.get_remote_folders_files(remote_path_name='/in',
+                                                           entity_path_name='/in',
+                                                           target_path_name=self.output_path,
+                                                           recursively=True,
+                                                           ftp_conn=ftp_conn,
+                                                           close_connection=False,
+                                                           remove_remote_file_on_download=remove_remote_file_on_download)
+        finally:
+            ftp_scanner.return_connection(ftp_conn)
+
+        return err_str
+
+
+    def get_remote_name(self,
+                        relative_path: str):
+
+        return os.path.join(self.root_path, relative_path)
+
+
+    def get_local_name(self,
+                       relative_path: str):
+
+        return os.path.join(self.output_path, relative_path)
+
+
+    def read_local_file(self,
+                        relative_path: str):
+
+        with open(self.get_local_name(relative_path), 'rb') as data_file:
+            return data_file.read()
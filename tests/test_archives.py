@@ -0,0 +1,188 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from FetcherClasses.Classes.ArchiveCommons import ArchiveExtractor, ExtractionJob, get_archive_type, get_extract_path_name
+from FetcherClasses.Classes.EnumCommons import ArchiveTypeEnums, FileStatusEnum, FtpLibNameEnum
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+def get_tar_bytes(member_files: dict):
+
+    tar_buffer = io.BytesIO()
+    with tarfile.open(fileobj=tar_buffer, mode='w:gz') as tar_archive:
+        for member_name, data in member_files.items():
+            tar_info = tarfile.TarInfo(member_name)
+            tar_info.size = len(data)
+            tar_archive.addfile(tar_info, io.BytesIO(data))
+
+    return tar_buffer.getvalue()
+
+
+def get_zip_bytes(member_files: dict):
+
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w') as zip_archive:
+        for member_name, data in member_files.items():
+            zip_archive.writestr(member_name, data)
+
+    return zip_buffer.getvalue()
+
+
+class ArchiveTests(object):
+    '''
+    Landed archives extracted alongside the downloads, run against each
+    backend by the classes below
+    '''
+
+    def test_archives_extracted(self):
+
+        tar_members = {'a.txt': b'tar member', 'sub/b.txt': os.urandom(5000)}
+        zip_members = {'c.txt': b'zip member'}
+        write_remote_file(self.root_path, 'in/bundle.tar.gz', get_tar_bytes(tar_members))
+        write_remote_file(self.root_path, 'in/pack.zip', get_zip_bytes(zip_members))
+        write_remote_file(self.root_path, 'in/plain.dat', b'not an archive')
+
+        ftp_scanner = self.make_scanner(archive_worker_count=1)
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        for member_name, data in tar_members.items():
+            self.assertEqual(self.read_local_file(os.path.join('in/bundle.tar.gz.d', member_name)), data)
+        for member_name, data in zip_members.items():
+            self.assertEqual(self.read_local_file(os.path.join('in/pack.zip.d', member_name)), data)
+        # archives are kept beside what they extracted into
+        self.assertTrue(os.path.exists(self.get_local_name('in/bundle.tar.gz')))
+        self.assertTrue(os.path.exists(self.get_local_name('in/pack.zip')))
+        self.assertFalse(os.path.exists(self.get_local_name('in/plain.dat.d')))
+
+        extract_events = ftp_scanner.file_event_logger.get_events('extract')
+        self.assertEqual(sorted(extract_event['path'] for extract_event in extract_events), ['/in/bundle.tar.gz', '/in/pack.zip'])
+        self.assertTrue(all(extract_event['status'] == 'FS_GOOD_STATUS' for extract_event in extract_events))
+
+
+    def test_archive_extracted_again(self):
+
+        write_remote_file(self.root_path, 'in/bundle.tar.gz', get_tar_bytes({'a.txt': b'first'}))
+        ftp_scanner = self.make_scanner(archive_worker_count=1)
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        write_remote_file(self.root_path, 'in/bundle.tar.gz', get_tar_bytes({'b.txt': b'second'}))
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        # a later copy of the archive replaces what the earlier one extracted
+        self.assertEqual(sorted(os.listdir(self.get_local_name('in/bundle.tar.gz.d'))), ['b.txt'])
+
+
+    def test_mirrored_names_untouched(self):
+
+        # the remote holds a folder and a file named as the archives less their suffixes
+        write_remote_file(self.root_path, 'in/bundle.tar.gz', get_tar_bytes({'a.txt': b'tar member'}))
+        write_remote_file(self.root_path, 'in/bundle/kept.dat', b'mirrored folder')
+        write_remote_file(self.root_path, 'in/pack.zip', get_zip_bytes({'c.txt': b'zip member'}))
+        write_remote_file(self.root_path, 'in/pack', b'mirrored file')
+
+        ftp_scanner = self.make_scanner(archive_worker_count=1)
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertEqual(os.listdir(self.get_local_name('in/bundle')), ['kept.dat'])
+        self.assertEqual(self.read_local_file('in/pack'), b'mirrored file')
+        self.assertEqual(self.read_local_file('in/bundle.tar.gz.d/a.txt'), b'tar member')
+        self.assertEqual(self.read_local_file('in/pack.zip.d/c.txt'), b'zip member')
+
+
+class FtplibArchiveTest(ArchiveTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class ParamikoArchiveTest(ArchiveTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+class ArchiveCommonsTest(unittest.TestCase):
+    '''
+    Archive detection, and extraction of landed archives without a scanner
+    '''
+
+    def setUp(self):
+
+        self.work_path = tempfile.mkdtemp(prefix='test_archive_')
+
+
+    def tearDown(self):
+
+        shutil.rmtree(self.work_path, ignore_errors=True)
+
+
+    def write_file(self,
+                   file_name: str,
+                   data: bytes):
+
+        full_name = os.path.join(self.work_path, file_name)
+        with open(full_name, 'wb') as data_file:
+            data_file.write(data)
+
+        return full_name
+
+
+    def test_archive_types(self):
+
+        self.assertEqual(get_archive_type(self.write_file('b.tar.gz', get_tar_bytes({'a': b'a'}))), ArchiveTypeEnums.TAR)
+        self.assertEqual(get_archive_type(self.write_file('p.zip', get_zip_bytes({'a': b'a'}))), ArchiveTypeEnums.ZIP)
+        # a lone .gz is a compressed file, not an archive
+        self.assertEqual(get_archive_type(self.write_file('f.gz', get_tar_bytes({'a': b'a'}))), ArchiveTypeEnums.UNKNOWN)
+        self.assertEqual(get_archive_type(self.write_file('f.dat', b'plain')), ArchiveTypeEnums.UNKNOWN)
+
+
+    def test_extract_path_names(self):
+
+        self.assertEqual(get_extract_path_name('/out/bundle.tar.gz'), '/out/bundle.tar.gz.d')
+        self.assertEqual(get_extract_path_name('/out/pack.ZIP'), '/out/pack.ZIP.d')
+        self.assertEqual(get_extract_path_name('/out/other.bin'), '/out/other.bin.d')
+
+
+    def test_unsafe_member_refused(self):
+
+        tar_buffer = io.BytesIO()
+        with tarfile.open(fileobj=tar_buffer, mode='w') as tar_archive:
+            tar_info = tarfile.TarInfo('../escaped.txt')
+            tar_info.size = 1
+            tar_archive.addfile(tar_info, io.BytesIO(b'x'))
+        archive_full_name = self.write_file('bad.tar', tar_buffer.getvalue())
+
+        archive_extractor = ArchiveExtractor(worker_count=1)
+        extraction_job = ExtractionJob(archive_full_name,
+                                       ArchiveTypeEnums.TAR,
+                                       get_extract_path_name(archive_full_name))
+        file_status, err_str = archive_extractor.extract_archive(extraction_job)
+
+        self.assertEqual(file_status, FileStatusEnum.FS_ARCHIVE_INVALID_ERR)
+        self.assertIsNotNone(err_str)
+        self.assertFalse(os.path.exists(os.path.join(self.work_path, 'escaped.txt')))
+        self.assertFalse(os.path.exists(extraction_job.extract_path_name))
+
+
+    def test_file_in_target_place_kept(self):
+
+        archive_full_name = self.write_file('pack.zip', get_zip_bytes({'c.txt': b'zip member'}))
+        extraction_job = ExtractionJob(archive_full_name,
+                                       ArchiveTypeEnums.ZIP,
+                                       get_extract_path_name(archive_full_name))
+        self.write_file('pack.zip.d', b'landed file')
+
+        file_status, err_str = ArchiveExtractor(worker_count=1).extract_archive(extraction_job)
+
+        self.assertEqual(file_status, FileStatusEnum.FS_FILE_EXISTS_ERR)
+        self.assertIsNotNone(err_str)
+        with open(extraction_job.extract_path_name, 'rb') as data_file:
+            self.assertEqual(data_file.read(), b'landed file')
+        self.assertFalse(os.path.exists(ArchiveExtractor().get_work_path_name(extraction_job)))
+
+
+if __name__ == '__main__':
+    unittest.main()
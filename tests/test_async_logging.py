@@ -0,0 +1,88 @@
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import unittest
+
+from FetcherClasses.Classes.EnumCommons import LogOverflowPolicyEnum
+from FetcherClasses.Classes.LoggingCommons import BoundedQueueHandler, LoggingUtilities, stop_async_logging
+
+
+def get_record(level: int,
+               msg: str):
+
+    return logging.makeLogRecord({'name': 'test', 'levelno': level, 'levelname': logging.getLevelName(level), 'msg': msg})
+
+
+class AsyncLoggingTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.work_path = tempfile.mkdtemp(prefix='test_logging_')
+
+
+    def tearDown(self):
+
+        shutil.rmtree(self.work_path, ignore_errors=True)
+
+
+    def test_queued_records_written_on_stop(self):
+
+        all_log_file_name = os.path.join(self.work_path, 'all.log')
+        logger, all_logger_fh, _err_logger_fh, err_str = LoggingUtilities().get_logger(log_name='test_async_logging',
+                                                                                       all_log_file_name=all_log_file_name,
+                                                                                       async_mode=True)
+        self.assertIsNone(err_str)
+        logger.propagate = False
+        try:
+            handler, = logger.handlers
+            self.assertIsInstance(handler, BoundedQueueHandler)
+
+            for line_nbr in range(500):
+                logger.info('line %d', line_nbr)
+            stop_async_logging(logger)
+
+            with open(all_log_file_name) as log_file:
+                log_lines = log_file.read().splitlines()
+            self.assertEqual(len(log_lines), 500)
+            self.assertTrue(log_lines[-1].endswith('line 499'))
+        finally:
+            logger.handlers = []
+            all_logger_fh.close()
+
+
+    def test_overflow_policies(self):
+
+        # DROP loses whatever does not fit, whatever its level
+        queue_handler = BoundedQueueHandler(queue.Queue(maxsize=1), overflow_policy=LogOverflowPolicyEnum.DROP)
+        queue_handler.enqueue(get_record(logging.INFO, 'kept'))
+        queue_handler.enqueue(get_record(logging.ERROR, 'dropped'))
+        self.assertEqual(queue_handler.dropped_count, 1)
+
+        # DROP_BELOW_WARNING waits for room for warnings, and drops them only after that
+        queue_handler = BoundedQueueHandler(queue.Queue(maxsize=1), overflow_policy=LogOverflowPolicyEnum.DROP_BELOW_WARNING)
+        queue_handler.block_timeout_seconds = 0.01
+        queue_handler.enqueue(get_record(logging.INFO, 'kept'))
+        queue_handler.enqueue(get_record(logging.INFO, 'dropped at once'))
+        queue_handler.enqueue(get_record(logging.WARNING, 'dropped after waiting'))
+        self.assertEqual(queue_handler.dropped_count, 2)
+
+
+    def test_dropped_records_reported(self):
+
+        log_queue = queue.Queue(maxsize=1)
+        queue_handler = BoundedQueueHandler(log_queue, overflow_policy=LogOverflowPolicyEnum.DROP)
+        queue_handler.enqueue(get_record(logging.INFO, 'kept'))
+        queue_handler.enqueue(get_record(logging.INFO, 'dropped'))
+        log_queue.get_nowait()
+
+        # once there is room again, the next record is followed by a count of what was lost
+        log_queue.maxsize = 2
+        queue_handler.enqueue(get_record(logging.INFO, 'after'))
+        self.assertEqual(log_queue.get_nowait().msg, 'after')
+        self.assertEqual(log_queue.get_nowait().getMessage(), 'Log queue full, 1 records dropped')
+
+
+if __name__ == '__main__':
+    unittest.main()
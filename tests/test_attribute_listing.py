@@ -0,0 +1,62 @@
+import os
+import unittest
+from unittest import mock
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.TransportCommons import get_transport_class
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+class AttributeListingTests(object):
+    '''
+    Walks working from the sizes and mtimes their listings report, run
+    against each backend by the classes below
+    '''
+
+    def test_no_stat_per_file(self):
+
+        tree_files = {'in/f1.dat': os.urandom(3000),
+                      'in/a/f2.dat': os.urandom(20),
+                      'in/a/f3.dat': b''}
+        for relative_path, data in tree_files.items():
+            write_remote_file(self.root_path, relative_path, data)
+
+        transport_class = get_transport_class(self.host_type)
+        stat_entry = transport_class.stat_entry
+        stat_paths = []
+
+        def counting_stat_entry(ftp_conn, entity_path):
+            stat_paths.append(entity_path)
+            return stat_entry(ftp_conn, entity_path)
+
+        ftp_scanner = self.make_scanner()
+        with mock.patch.object(transport_class, 'stat_entry', counting_stat_entry):
+            self.assertIsNone(self.run_scan(ftp_scanner))
+
+        for relative_path, data in tree_files.items():
+            self.assertEqual(self.read_local_file(relative_path), data)
+        self.assertEqual(stat_paths, [])
+
+
+class FtplibAttributeListingTest(AttributeListingTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class FtputilAttributeListingTest(AttributeListingTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPUTIL
+
+
+class ParamikoAttributeListingTest(AttributeListingTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+class PysftpAttributeListingTest(AttributeListingTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PYSFTP
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import time
+import unittest
+
+from FetcherClasses.Classes.ConnectionCommons import ConnectionPool
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+class ConnectionPoolTests(object):
+    '''
+    Pooled connections as the scanner borrows and returns them, run
+    against one FTP and one SFTP backend by the classes below
+    '''
+
+    def test_connection_reused_across_scans(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'first')
+
+        ftp_scanner = self.make_scanner(connection_pool=ConnectionPool())
+        self.assertIsNone(self.run_scan(ftp_scanner))
+        write_remote_file(self.root_path, 'in/f2.dat', b'second')
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertEqual(self.read_local_file('in/f2.dat'), b'second')
+        self.assertEqual(ftp_scanner.connection_pool.connects_total, 1)
+        self.assertEqual(ftp_scanner.connection_pool.reuses_total, 1)
+
+
+    def test_broken_connection_dropped(self):
+
+        connection_pool = ConnectionPool(check_idle_seconds=0)
+        ftp_scanner = self.make_scanner(connection_pool=connection_pool)
+
+        ftp_conn, err_str = ftp_scanner.borrow_connection()
+        self.assertIsNone(err_str)
+        ftp_conn.close()
+        ftp_scanner.return_connection(ftp_conn)
+        time.sleep(0.01)
+
+        # the health check finds the pooled connection dead and opens another
+        fresh_conn, err_str = ftp_scanner.borrow_connection()
+        self.assertIsNone(err_str)
+        self.assertIsNot(fresh_conn, ftp_conn)
+        fresh_conn.keep_alive()
+        ftp_scanner.return_connection(fresh_conn)
+        self.assertEqual(connection_pool.connects_total, 2)
+
+
+    def test_idle_connection_evicted(self):
+
+        connection_pool = ConnectionPool(max_idle_seconds=0)
+        ftp_scanner = self.make_scanner(connection_pool=connection_pool)
+
+        ftp_conn, err_str = ftp_scanner.borrow_connection()
+        self.assertIsNone(err_str)
+        ftp_scanner.return_connection(ftp_conn)
+        time.sleep(0.01)
+
+        self.assertEqual(connection_pool.evict_idle_connections(), 1)
+        self.assertEqual(connection_pool.evictions_total, 1)
+        self.assertEqual(connection_pool.evict_idle_connections(), 0)
+
+
+class FtplibConnectionPoolTest(ConnectionPoolTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class ParamikoConnectionPoolTest(ConnectionPoolTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import logging
+import unittest
+from unittest import mock
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.UtilityCommons import DynamicUtilities
+from tests.ScannerTestCase import ScannerTestCase, password
+
+
+class CredentialCacheTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.dynamic_utilities = DynamicUtilities()
+        self.logger = logging.getLogger('test_credential_cache')
+
+
+    def get_password(self):
+
+        return self.dynamic_utilities.get_pwd_via_keyring('h', 'u', logger=self.logger)
+
+
+    def test_password_cached(self):
+
+        with mock.patch('keyring.get_password', return_value='secret') as get_password:
+            self.assertEqual(self.get_password(), ('secret', None))
+            self.assertEqual(self.get_password(), ('secret', None))
+
+        self.assertEqual(get_password.call_count, 1)
+
+
+    def test_cache_expiry_and_invalidation(self):
+
+        with mock.patch('keyring.get_password', side_effect=['first', 'second', 'third']) as get_password:
+            self.assertEqual(self.get_password(), ('first', None))
+            self.assertTrue(self.dynamic_utilities.invalidate_password('h', 'u'))
+            self.assertFalse(self.dynamic_utilities.invalidate_password('h', 'u'))
+            self.assertEqual(self.get_password(), ('second', None))
+
+            self.dynamic_utilities.password_cache_seconds = 0
+            self.assertEqual(self.get_password(), ('third', None))
+
+        self.assertEqual(get_password.call_count, 3)
+
+
+    def test_missing_password_not_cached(self):
+
+        with mock.patch('keyring.get_password', side_effect=[None, 'late']):
+            password, err_str = self.get_password()
+            self.assertIsNone(password)
+            self.assertIsNotNone(err_str)
+            self.assertEqual(self.get_password(), ('late', None))
+
+
+class CredentialRetryTests(object):
+    '''
+    A cached password the server rejects, run against one FTP and one SFTP
+    backend by the classes below
+    '''
+
+    def test_rejected_password_fetched_again(self):
+
+        ftp_scanner = self.make_scanner()
+        ftp_scanner.dynamicUtilities = DynamicUtilities()
+
+        with mock.patch('keyring.get_password', side_effect=['stale', password]) as get_password:
+            ftp_conn, err_str = ftp_scanner.borrow_connection()
+            self.assertIsNone(err_str)
+            ftp_scanner.return_connection(ftp_conn)
+
+        self.assertEqual(get_password.call_count, 2)
+
+
+class FtplibCredentialRetryTest(CredentialRetryTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class ParamikoCredentialRetryTest(CredentialRetryTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+if __name__ == '__main__':
+    unittest.main()
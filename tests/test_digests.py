@@ -0,0 +1,207 @@
+import errno
+import hashlib
+import os
+import unittest
+from unittest import mock
+
+from FetcherClasses.Classes.DigestCommons import StreamDigester, parse_sidecar
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.TransportCommons import ParamikoTransport
+from tests.ScannerTestCase import ScannerTestCase, password, username, write_remote_file
+
+
+class DigestScanTests(object):
+    '''
+    Downloads hashed inline and checked against checksum files, run against
+    each backend by the classes below
+    '''
+
+    def test_digest_verified_then_removed(self):
+
+        data = os.urandom(30000)
+        write_remote_file(self.root_path, 'in/f1.dat', data)
+        write_remote_file(self.root_path, 'in/f1.dat.sha256', ('%s  f1.dat\n' % hashlib.sha256(data).hexdigest()).encode('ascii'))
+
+        ftp_scanner = self.make_scanner(digest_algorithms=('sha256',),
+                                        digest_sidecar_suffixes=('.sha256', '.md5'),
+                                        require_verified_removal=True)
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertEqual(self.read_local_file('in/f1.dat'), data)
+        # the checksum file lands beside its file, and goes from the server with it
+        self.assertTrue(os.path.exists(self.get_local_name('in/f1.dat.sha256')))
+        self.assertFalse(os.path.exists(self.get_remote_name('in/f1.dat')))
+        self.assertFalse(os.path.exists(self.get_remote_name('in/f1.dat.sha256')))
+        download_event, = ftp_scanner.file_event_logger.get_events('download', '/in/f1.dat')
+        self.assertTrue(download_event['verified'])
+
+
+    def test_digest_mismatch_keeps_remote(self):
+
+        data = os.urandom(30000)
+        write_remote_file(self.root_path, 'in/f1.dat', data)
+        write_remote_file(self.root_path, 'in/f1.dat.sha256', ('%s  f1.dat\n' % ('0' * 64)).encode('ascii'))
+
+        ftp_scanner = self.make_scanner(digest_algorithms=('sha256',),
+                                        digest_sidecar_suffixes=('.sha256',))
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        # nothing lands, no part file is left to resume from, and the server keeps both files
+        self.assertFalse(os.path.exists(self.get_local_name('in/f1.dat')))
+        self.assertFalse(os.path.exists(self.get_local_name('in/.f1.dat.part')))
+        self.assertTrue(os.path.exists(self.get_remote_name('in/f1.dat')))
+        self.assertTrue(os.path.exists(self.get_remote_name('in/f1.dat.sha256')))
+        download_event, = ftp_scanner.file_event_logger.get_events('download', '/in/f1.dat')
+        self.assertIsNotNone(download_event['err_str'])
+        self.assertFalse(download_event['removed'])
+
+
+    def test_resumed_digest_covers_whole_file(self):
+
+        data = os.urandom(200000)
+        write_remote_file(self.root_path, 'in/f1.dat', data)
+        os.makedirs(self.get_local_name('in'))
+        with open(self.get_local_name('in/.f1.dat.part'), 'wb') as part_file:
+            part_file.write(data[:65000])
+
+        ftp_scanner = self.make_scanner(digest_algorithms=('sha256',))
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertEqual(self.read_local_file('in/f1.dat'), data)
+        download_event, = ftp_scanner.file_event_logger.get_events('download', '/in/f1.dat')
+        self.assertEqual(download_event['bytes'], len(data) - 65000)
+        self.assertEqual(download_event['digests']['sha256'], hashlib.sha256(data).hexdigest())
+
+
+class FtplibDigestScanTest(DigestScanTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class FtputilDigestScanTest(DigestScanTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPUTIL
+
+
+class ParamikoDigestScanTest(DigestScanTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+class PysftpDigestScanTest(DigestScanTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PYSFTP
+
+
+class SftpCheckFileTest(ScannerTestCase):
+    '''
+    Digests the SFTP server computes through the check-file extension
+    '''
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+    def setUp(self):
+
+        super().setUp()
+
+        self.data = os.urandom(30000)
+        write_remote_file(self.root_path, 'in/f1.dat', self.data)
+        self.ftp_conn = ParamikoTransport.connect('127.0.0.1', self.server_port, username, password,
+                                                  known_hosts_file=self.server.known_hosts_file)
+
+
+    def tearDown(self):
+
+        self.ftp_conn.close_session()
+        super().tearDown()
+
+
+    def test_check_file_verifies(self):
+
+        ftp_scanner = self.make_scanner(use_sftp_check_file=True, require_verified_removal=True)
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertEqual(self.read_local_file('in/f1.dat'), self.data)
+        self.assertFalse(os.path.exists(self.get_remote_name('in/f1.dat')))
+        download_event, = ftp_scanner.file_event_logger.get_events('download', '/in/f1.dat')
+        self.assertTrue(download_event['verified'])
+
+
+    def fail_check_file(self,
+                        err):
+        '''
+        Patch the SFTP client so that check-file requests fail with err,
+        returning the list of those requests
+        '''
+
+        from paramiko.sftp import CMD_EXTENDED
+
+        check_file_requests = []
+        send_request = self.ftp_conn.sftp_client._request
+
+        def request(resp_type, *args):
+            if resp_type == CMD_EXTENDED and args[0] == 'check-file':
+                check_file_requests.append(args)
+                raise err
+            return send_request(resp_type, *args)
+
+        return mock.patch.object(self.ftp_conn.sftp_client, '_request', request), check_file_requests
+
+
+    def test_unsupported_check_file_not_asked_again(self):
+
+        request_patch, check_file_requests = self.fail_check_file(IOError('Operation unsupported'))
+        with request_patch:
+            self.assertIsNone(self.ftp_conn.get_remote_digest('/in/f1.dat'))
+            self.assertIsNone(self.ftp_conn.get_remote_digest('/in/f1.dat'))
+
+        self.assertIs(self.ftp_conn.has_check_file, False)
+        self.assertEqual(len(check_file_requests), 1)
+
+
+    def test_failed_check_file_asked_again(self):
+
+        request_patch, check_file_requests = self.fail_check_file(IOError(errno.EACCES, 'Permission denied'))
+        with request_patch:
+            with self.assertRaises(IOError):
+                self.ftp_conn.get_remote_digest('/in/f1.dat')
+
+        # one file's failure leaves the extension in use for the next
+        self.assertIsNone(self.ftp_conn.has_check_file)
+        self.assertEqual(self.ftp_conn.get_remote_digest('/in/f1.dat'), ('sha1', hashlib.sha1(self.data).hexdigest()))
+        self.assertTrue(self.ftp_conn.has_check_file)
+
+
+class DigestCommonsTest(unittest.TestCase):
+
+    def test_parse_sidecar(self):
+
+        hex_digest = 'ab' * 32
+
+        self.assertEqual(parse_sidecar('%s  f1.dat\n' % hex_digest.upper(), 'f1.dat'), hex_digest)
+        self.assertEqual(parse_sidecar('SHA256 (f1.dat) = %s\n' % hex_digest, 'f1.dat'), hex_digest)
+        self.assertEqual(parse_sidecar('%s  other.dat\n%s *f1.dat\n' % ('cd' * 32, hex_digest), 'f1.dat'), hex_digest)
+        # a lone digest is taken to be the file's, whatever it is listed as
+        self.assertEqual(parse_sidecar('%s\n' % hex_digest, 'f1.dat'), hex_digest)
+        self.assertIsNone(parse_sidecar('no digest here\n', 'f1.dat'))
+
+
+    def test_stream_digester(self):
+
+        digester = StreamDigester(('sha256',))
+        digester.expect_digest('md5', '5d41402abc4b2a76b9719d911017c592', 'f1.dat.md5')
+        digester.add_data_block(b'hel')
+        digester.add_data_block(b'lo')
+
+        self.assertTrue(digester.is_verifiable())
+        self.assertIsNone(digester.verify())
+        self.assertEqual(sorted(digester.get_hexdigests()), ['md5', 'sha256'])
+
+        digester = StreamDigester(())
+        digester.expect_digest('md5', '0' * 32, 'f1.dat.md5')
+        digester.add_data_block(b'hello')
+        self.assertIsNotNone(digester.verify())
+
+
+if __name__ == '__main__':
+    unittest.main()
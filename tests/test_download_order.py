@@ -0,0 +1,70 @@
+import os
+import unittest
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.ListingCommons import RemoteEntry
+from FetcherClasses.Classes.TransferCommons import TransferJob, get_order_policy
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+def get_remote_entry(entity_path: str,
+                     size: int=100,
+                     mtime: float=1000.0):
+
+    return RemoteEntry(entity_path.rsplit('/', 1)[-1], entity_path, size=size, mtime=mtime, is_file=True)
+
+
+class DownloadOrderTests(object):
+    '''
+    Files of a walk downloaded in the order a policy gives them, run
+    against each backend by the classes below
+    '''
+
+    def test_smallest_first(self):
+
+        # the larger a file's number, the smaller the file
+        for file_nbr in range(6):
+            write_remote_file(self.root_path, 'in/f%d.dat' % file_nbr, os.urandom(1000 * (6 - file_nbr)))
+
+        ftp_scanner = self.make_scanner(download_order_policy=get_order_policy('smallest'))
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        download_events = ftp_scanner.file_event_logger.get_events('download')
+        self.assertEqual([download_event['path'] for download_event in download_events],
+                         ['/in/f%d.dat' % file_nbr for file_nbr in reversed(range(6))])
+
+
+class FtplibDownloadOrderTest(DownloadOrderTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class ParamikoDownloadOrderTest(DownloadOrderTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+class OrderPolicyTest(unittest.TestCase):
+
+    def test_order_policies(self):
+
+        transfer_jobs = [TransferJob('/in', entity_name, '/out', entity_name,
+                                     remote_entry=get_remote_entry('/in/' + entity_name, size=size, mtime=mtime))
+                         for entity_name, size, mtime in (('new.dat', 10, 3000.0),
+                                                          ('big.dat', 900, 1000.0),
+                                                          ('sla.dat', 500, 2000.0))]
+
+        def get_order(order_policy):
+            return [transfer_job.remote_file_name for transfer_job in sorted(transfer_jobs, key=order_policy.get_score)]
+
+        self.assertEqual(get_order(get_order_policy('fifo')), ['new.dat', 'big.dat', 'sla.dat'])
+        self.assertEqual(get_order(get_order_policy('oldest')), ['big.dat', 'sla.dat', 'new.dat'])
+        self.assertEqual(get_order(get_order_policy('smallest')), ['new.dat', 'sla.dat', 'big.dat'])
+        self.assertEqual(get_order(get_order_policy('oldest', pattern_weights=[('/in/sla*', 10)])),
+                         ['sla.dat', 'big.dat', 'new.dat'])
+        with self.assertRaises(ValueError):
+            get_order_policy('largest')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import re
+import unittest
+from unittest import mock
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.ListingCommons import EntryFilter
+from FetcherClasses.Classes.TransportCommons import get_transport_class
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+class EntryFilterTests(object):
+    '''
+    Entries filtered from the listings before they cost a stat or a
+    transfer, run against each backend by the classes below
+    '''
+
+    def test_filtered_walk(self):
+
+        for relative_path in ('in/a.csv', 'in/a.txt', 'in/archive/b.csv', 'in/sub/c.csv'):
+            write_remote_file(self.root_path, relative_path, relative_path.encode('utf-8'))
+
+        transport_class = get_transport_class(self.host_type)
+        list_folder = transport_class.list_folder
+        listed_paths = []
+
+        def recording_list_folder(ftp_conn, folder_path):
+            listed_paths.append(folder_path)
+            return list_folder(ftp_conn, folder_path)
+
+        entry_filter = EntryFilter(include_patterns=('*.csv',), prune_patterns=('archive',))
+        ftp_scanner = self.make_scanner(entry_filter=entry_filter)
+        with mock.patch.object(transport_class, 'list_folder', recording_list_folder):
+            self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertEqual(self.read_local_file('in/a.csv'), b'in/a.csv')
+        self.assertEqual(self.read_local_file('in/sub/c.csv'), b'in/sub/c.csv')
+        download_events = ftp_scanner.file_event_logger.get_events('download')
+        self.assertEqual(sorted(download_event['path'] for download_event in download_events), ['/in/a.csv', '/in/sub/c.csv'])
+        # a pruned folder is never listed
+        self.assertEqual(sorted(listed_paths), ['/in', '/in/sub'])
+        self.assertEqual(ftp_scanner.walk_entries_filtered, 2)
+
+
+class FtplibEntryFilterTest(EntryFilterTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class ParamikoEntryFilterTest(EntryFilterTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+class EntryFilterTest(unittest.TestCase):
+
+    def test_entry_filter(self):
+
+        entry_filter = EntryFilter(include_patterns=('*.csv', 'feeds/*'),
+                                   exclude_patterns=('.*', re.compile(r'/tmp/')),
+                                   prune_patterns=('archive',))
+
+        self.assertTrue(entry_filter.is_file_included('a.csv', '/in/a.csv'))
+        self.assertFalse(entry_filter.is_file_included('a.txt', '/in/a.txt'))
+        self.assertFalse(entry_filter.is_file_included('.a.csv', '/in/.a.csv'))
+        self.assertFalse(entry_filter.is_file_included('a.csv', '/in/tmp/a.csv'))
+        self.assertTrue(entry_filter.is_folder_pruned('archive', '/in/archive'))
+        self.assertFalse(entry_filter.is_folder_pruned('current', '/in/current'))
+        self.assertTrue(EntryFilter().is_file_included('anything', '/in/anything'))
+
+
+if __name__ == '__main__':
+    unittest.main()
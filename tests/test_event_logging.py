@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.LoggingCommons import LoggingUtilities, stop_async_logging
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+class FileEventLoggerTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.work_path = tempfile.mkdtemp(prefix='test_events_')
+        self.event_log_file_name = os.path.join(self.work_path, 'events.log')
+
+
+    def tearDown(self):
+
+        shutil.rmtree(self.work_path, ignore_errors=True)
+
+
+    def get_event_logger(self,
+                         **event_logger_args):
+
+        event_logger, err_str = LoggingUtilities().get_event_logger(self.event_log_file_name,
+                                                                    log_name='test_event_logging',
+                                                                    **event_logger_args)
+        self.assertIsNone(err_str)
+        self.addCleanup(self.close_event_logger, event_logger)
+
+        return event_logger
+
+
+    def close_event_logger(self,
+                           event_logger):
+
+        stop_async_logging(event_logger.logger)
+        for handler in event_logger.logger.handlers:
+            handler.close()
+        event_logger.logger.handlers = []
+
+
+    def read_events(self,
+                    event_logger):
+
+        stop_async_logging(event_logger.logger)
+        for handler in event_logger.logger.handlers:
+            handler.flush()
+        with open(self.event_log_file_name) as event_file:
+            return [json.loads(event_line) for event_line in event_file]
+
+
+    def test_events_are_json_lines(self):
+
+        event_logger = self.get_event_logger(async_mode=True)
+
+        self.assertTrue(event_logger.log_event('download', 'h', '/in/f1.dat', bytes=10))
+        self.assertTrue(event_logger.log_event('download', 'h', '/in/f2.dat', err_str='refused'))
+        self.assertTrue(event_logger.log_event('download', 'h', '/in/f3.dat', outcome='skipped'))
+
+        success_event, failure_event, skipped_event = self.read_events(event_logger)
+        self.assertEqual((success_event['event'], success_event['outcome'], success_event['path'], success_event['bytes']),
+                         ('download', 'success', '/in/f1.dat', 10))
+        self.assertEqual((failure_event['outcome'], failure_event['error']), ('failure', 'refused'))
+        self.assertEqual(skipped_event['outcome'], 'skipped')
+        self.assertEqual(event_logger.events_written, 3)
+
+
+    def test_successes_sampled_failures_kept(self):
+
+        event_logger = self.get_event_logger(success_sample_rate=0.0)
+
+        self.assertFalse(event_logger.log_event('download', 'h', '/in/f1.dat'))
+        self.assertTrue(event_logger.log_event('download', 'h', '/in/f2.dat', err_str='refused'))
+
+        self.assertEqual([file_event['path'] for file_event in self.read_events(event_logger)], ['/in/f2.dat'])
+        self.assertEqual((event_logger.events_written, event_logger.events_suppressed), (1, 1))
+
+
+    def test_successes_rate_limited(self):
+
+        event_logger = self.get_event_logger(max_success_events_per_second=5)
+
+        written_count = sum(event_logger.log_event('download', 'h', '/in/f%d.dat' % file_nbr) for file_nbr in range(50))
+
+        # one second's worth of events, give or take what the clock refills meanwhile
+        self.assertGreaterEqual(written_count, 5)
+        self.assertLess(written_count, 10)
+        self.assertEqual(event_logger.events_suppressed, 50 - written_count)
+
+
+class EventScanTests(object):
+    '''
+    Events a walk logs, run against one FTP and one SFTP backend by the classes below
+    '''
+
+    def test_download_events(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'x' * 1000)
+        write_remote_file(self.root_path, 'in/.f2.dat.part', b'refused')
+
+        ftp_scanner = self.make_scanner()
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        download_event, = ftp_scanner.file_event_logger.get_events('download', '/in/f1.dat')
+        self.assertIsNone(download_event['err_str'])
+        self.assertEqual(download_event['bytes'], 1000)
+        self.assertTrue(download_event['removed'])
+        failed_event, = ftp_scanner.file_event_logger.get_events('download', '/in/.f2.dat.part')
+        self.assertIsNotNone(failed_event['err_str'])
+        self.assertFalse(failed_event['removed'])
+
+
+class FtplibEventScanTest(EventScanTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class ParamikoEventScanTest(EventScanTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+if __name__ == '__main__':
+    unittest.main()
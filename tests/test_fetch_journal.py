@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from FetcherClasses.Classes.EnumCommons import FetchStateEnum, FtpLibNameEnum
+from FetcherClasses.Classes.JournalCommons import FetchJournal
+from FetcherClasses.Classes.ListingCommons import RemoteEntry
+from FetcherClasses.Classes.UtilityCommons import fsync_path
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+def get_remote_entry(entity_path: str,
+                     size: int=100,
+                     mtime: float=1000.0):
+
+    return RemoteEntry(entity_path.rsplit('/', 1)[-1], entity_path, size=size, mtime=mtime, is_file=True)
+
+
+class FetchJournalTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.work_path = tempfile.mkdtemp(prefix='test_journal_')
+        self.journal_file_name = os.path.join(self.work_path, 'journal.db')
+
+
+    def tearDown(self):
+
+        shutil.rmtree(self.work_path, ignore_errors=True)
+
+
+    def test_landed_state_survives_restart(self):
+
+        remote_entry = get_remote_entry('/in/f1.dat')
+
+        fetch_journal = FetchJournal(self.journal_file_name, commit_batch_size=1000, commit_interval_seconds=1000)
+        self.assertIsNone(fetch_journal.open_journal())
+        fetch_journal.record_state('h', '/in/f1.dat', FetchStateEnum.DOWNLOADING, size=100, mtime=1000.0)
+        fetch_journal.record_state('h', '/in/f1.dat', FetchStateEnum.VERIFIED)
+        # listing the landed file again, unchanged, leaves it landed
+        fetch_journal.record_state('h', '/in/f1.dat', FetchStateEnum.DISCOVERED, size=100, mtime=1000.0)
+        self.assertIsNone(fetch_journal.close_journal())
+
+        fetch_journal = FetchJournal(self.journal_file_name)
+        self.assertIsNone(fetch_journal.open_journal())
+        try:
+            self.assertEqual(fetch_journal.get_landed_state('h', remote_entry), FetchStateEnum.VERIFIED)
+            self.assertIsNone(fetch_journal.get_landed_state('h', get_remote_entry('/in/f1.dat', size=101)))
+            self.assertIsNone(fetch_journal.get_landed_state('h', get_remote_entry('/in/f2.dat')))
+            self.assertEqual(fetch_journal.entries_skipped, 1)
+        finally:
+            fetch_journal.close_journal()
+
+
+    def test_commits_synced(self):
+
+        fetch_journal = FetchJournal(self.journal_file_name)
+        self.assertIsNone(fetch_journal.open_journal())
+        try:
+            # FULL, rather than NORMAL, which in WAL mode leaves the fsync to checkpoints
+            self.assertEqual(fetch_journal._db_conn.execute('PRAGMA synchronous').fetchone()[0], 2)
+        finally:
+            fetch_journal.close_journal()
+
+
+class FetchJournalScanTests(object):
+    '''
+    Walks recording into the journal, run against one FTP and one SFTP
+    backend by the classes below
+    '''
+
+    def test_journal_skip_after_restart(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'landed once')
+        journal_file_name = os.path.join(self.work_path, 'journal.db')
+
+        fetch_journal = FetchJournal(journal_file_name)
+        self.assertIsNone(fetch_journal.open_journal())
+        ftp_scanner = self.make_scanner(fetch_journal=fetch_journal)
+        self.assertIsNone(self.run_scan(ftp_scanner, remove_remote_file_on_download=False))
+        self.assertIsNone(fetch_journal.close_journal())
+
+        # a landed copy the new run must leave alone
+        with open(self.get_local_name('in/f1.dat'), 'wb') as data_file:
+            data_file.write(b'not to be overwritten')
+
+        fetch_journal = FetchJournal(journal_file_name)
+        self.assertIsNone(fetch_journal.open_journal())
+        ftp_scanner = self.make_scanner(fetch_journal=fetch_journal)
+        self.assertIsNone(self.run_scan(ftp_scanner, remove_remote_file_on_download=True))
+
+        self.assertEqual(self.read_local_file('in/f1.dat'), b'not to be overwritten')
+        self.assertEqual(fetch_journal.entries_skipped, 1)
+        download_event, = ftp_scanner.file_event_logger.get_events('download', '/in/f1.dat')
+        self.assertEqual(download_event['outcome'], 'skipped')
+        # the removal the first run left undone is finished
+        self.assertTrue(download_event['removed'])
+        self.assertFalse(os.path.exists(self.get_remote_name('in/f1.dat')))
+        self.assertEqual(fetch_journal.get_entry('127.0.0.1', '/in/f1.dat')[0], FetchStateEnum.REMOTE_REMOVED)
+
+
+    def test_landed_file_synced_before_removal(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'synced')
+        write_remote_file(self.root_path, 'in/f2.dat', b'kept')
+        synced_paths = []
+
+        def recording_fsync_path(path_name):
+            synced_paths.append((path_name, os.path.exists(self.get_remote_name('in/f1.dat'))))
+            fsync_path(path_name)
+
+        ftp_scanner = self.make_scanner()
+        with mock.patch('FetcherClasses.FtpOps.fsync_path', recording_fsync_path):
+            self.assertIsNone(self.run_scan(ftp_scanner, remove_remote_file_on_download=False))
+            self.assertEqual(synced_paths, [])
+
+            os.remove(self.get_local_name('in/f1.dat'))
+            os.remove(self.get_remote_name('in/f2.dat'))
+            self.assertIsNone(self.run_scan(ftp_scanner, remove_remote_file_on_download=True))
+
+        # the part file, then its folder once renamed, both while the remote copy remains
+        self.assertEqual(synced_paths, [(self.get_local_name('in/.f1.dat.part'), True),
+                                        (self.get_local_name('in'), True)])
+        self.assertEqual(self.read_local_file('in/f1.dat'), b'synced')
+        self.assertFalse(os.path.exists(self.get_remote_name('in/f1.dat')))
+
+
+class FtplibFetchJournalScanTest(FetchJournalScanTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class ParamikoFetchJournalScanTest(FetchJournalScanTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+import unittest
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.GovernorCommons import TokenBucket, TransferGovernor
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+class GovernorTests(object):
+    '''
+    Bandwidth and session limits as the scanner keeps to them, run against
+    each backend by the classes below
+    '''
+
+    def test_bandwidth_limit(self):
+
+        data = os.urandom(300000)
+        write_remote_file(self.root_path, 'in/f1.dat', data)
+
+        transfer_governor = TransferGovernor(max_bytes_per_second=600000, burst_seconds=0.1)
+        ftp_scanner = self.make_scanner(transfer_governor=transfer_governor)
+        start_time = time.monotonic()
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertEqual(self.read_local_file('in/f1.dat'), data)
+        # all but the 60000 byte burst paced at 600000 bytes/s
+        self.assertGreater(time.monotonic() - start_time, 0.35)
+        self.assertGreater(transfer_governor.throttled_seconds, 0.3)
+
+
+    def test_session_limit(self):
+
+        tree_files = dict(('in/f%02d.dat' % file_nbr, os.urandom(1000)) for file_nbr in range(8))
+        for relative_path, data in tree_files.items():
+            write_remote_file(self.root_path, relative_path, data)
+
+        transfer_governor = TransferGovernor(max_sessions=2, session_wait_seconds=10)
+        ftp_scanner = self.make_scanner(transfer_governor=transfer_governor, download_worker_count=4)
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        for relative_path, data in tree_files.items():
+            self.assertEqual(self.read_local_file(relative_path), data)
+        # every session was handed back as its connection closed
+        self.assertEqual(transfer_governor.get_session_count(), 0)
+
+
+class FtplibGovernorTest(GovernorTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class ParamikoGovernorTest(GovernorTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+class TransferGovernorTest(unittest.TestCase):
+
+    def test_token_bucket(self):
+
+        token_bucket = TokenBucket(1000, burst_seconds=1.0)
+
+        self.assertEqual(token_bucket.reserve(1000), 0.0)
+        # in debt, each caller waits out its own share
+        self.assertAlmostEqual(token_bucket.reserve(500), 0.5, delta=0.05)
+        self.assertAlmostEqual(token_bucket.reserve(500), 1.0, delta=0.05)
+
+
+    def test_host_and_global_session_limits(self):
+
+        transfer_governor = TransferGovernor(max_sessions=3)
+        transfer_governor.set_host_limits('a', max_sessions=2)
+
+        self.assertEqual(transfer_governor.get_session_limit('a'), 2)
+        self.assertEqual(transfer_governor.get_session_limit('b'), 3)
+        self.assertTrue(transfer_governor.acquire_session('a', timeout=0))
+        self.assertTrue(transfer_governor.acquire_session('a', timeout=0))
+        self.assertFalse(transfer_governor.acquire_session('a', timeout=0.05))
+        self.assertTrue(transfer_governor.acquire_session('b', timeout=0))
+        self.assertFalse(transfer_governor.acquire_session('b', timeout=0.05))
+        self.assertEqual(transfer_governor.get_session_count(), 3)
+
+
+    def test_released_session_wakes_waiter(self):
+
+        transfer_governor = TransferGovernor(max_sessions=1)
+        self.assertTrue(transfer_governor.acquire_session('a', timeout=0))
+
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(transfer_governor.acquire_session('a', timeout=5)))
+        waiter.start()
+        time.sleep(0.05)
+        self.assertTrue(transfer_governor.has_session_waiters('a'))
+        transfer_governor.release_session('a')
+        waiter.join(5)
+
+        self.assertEqual(acquired, [True])
+        self.assertEqual(transfer_governor.get_session_count('a'), 1)
+
+
+    def test_throttle(self):
+
+        transfer_governor = TransferGovernor(max_bytes_per_second=100000, burst_seconds=0.1)
+
+        self.assertEqual(transfer_governor.throttle('a', 10000), 0.0)
+        self.assertGreater(transfer_governor.throttle('a', 30000), 0.25)
+        # a governor without limits never sleeps
+        self.assertEqual(TransferGovernor().throttle('a', 10 ** 9), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from FetcherClasses.Classes.UtilityCommons import ensure_annotations
+
+package_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@ensure_annotations
+def get_doubled(value: int):
+
+    return value * 2
+
+
+class LazyImportTest(unittest.TestCase):
+
+    def run_child(self,
+                  child_source: str,
+                  *python_options):
+        '''
+        Run child_source in a fresh interpreter, returning its stdout lines
+        '''
+
+        child_result = subprocess.run([sys.executable] + list(python_options) + ['-c', child_source],
+                                      cwd=package_path,
+                                      capture_output=True,
+                                      text=True,
+                                      timeout=60)
+        self.assertEqual(child_result.returncode, 0, child_result.stderr)
+
+        return child_result.stdout.splitlines()
+
+
+    def test_backends_not_imported_up_front(self):
+
+        loaded_modules = self.run_child('import sys\n'
+                                        'import FetcherClasses.FtpOps\n'
+                                        'for module_name in ("paramiko", "pysftp", "ftputil", "ensure", "keyring", "pika"):\n'
+                                        '    if module_name in sys.modules:\n'
+                                        '        print(module_name)\n')
+
+        self.assertEqual(loaded_modules, [])
+
+
+    def test_annotations_checked_on_first_call(self):
+
+        self.assertEqual(get_doubled(2), 4)
+        with self.assertRaises(Exception):
+            get_doubled('2')
+
+
+    def test_annotations_checked_when_optimized(self):
+
+        check_results = self.run_child('from tests.test_lazy_imports import get_doubled\n'
+                                       'try:\n'
+                                       '    get_doubled("2")\n'
+                                       '    print("unchecked")\n'
+                                       'except Exception:\n'
+                                       '    print("checked")\n',
+                                       '-O')
+
+        self.assertEqual(check_results, ['checked'])
+
+
+if __name__ == '__main__':
+    unittest.main()
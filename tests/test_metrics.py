@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import unittest
+import urllib.request
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.MetricsCommons import MetricsRegistry
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+class MetricsRegistryTest(unittest.TestCase):
+
+    def test_counters_gauges_histograms(self):
+
+        metrics_registry = MetricsRegistry(latency_buckets=(0.1, 1.0))
+        metrics_registry.inc_counter('files_downloaded_total')
+        metrics_registry.inc_counter('files_downloaded_total', amount=2)
+        metrics_registry.set_gauge('queue_depth', 7)
+        metrics_registry.record_phase('list', 0.05)
+        metrics_registry.record_phase('list', 0.5, err=IOError('refused'))
+        metrics_registry.record_phase('list', 5.0, err='timed out')
+
+        self.assertEqual(metrics_registry.get_value('files_downloaded_total'), 3)
+        self.assertEqual(metrics_registry.get_value('queue_depth'), 7)
+        self.assertEqual(metrics_registry.get_value('phase_seconds', {'phase': 'list'}), 3)
+        self.assertEqual(metrics_registry.get_value('errors_total', {'phase': 'list', 'error_type': 'OSError'}), 1)
+        self.assertEqual(metrics_registry.get_value('errors_total', {'phase': 'list', 'error_type': 'Error'}), 1)
+        self.assertIsNone(metrics_registry.get_value('phase_seconds', {'phase': 'stat'}))
+
+
+    def test_prometheus_text(self):
+
+        metrics_registry = MetricsRegistry(latency_buckets=(0.1, 1.0))
+        metrics_registry.inc_counter('files_downloaded_total')
+        metrics_registry.record_phase('list', 0.05)
+        metrics_registry.record_phase('list', 0.5)
+        metrics_registry.record_phase('list', 5.0)
+
+        text_lines = metrics_registry.get_prometheus_text().splitlines()
+
+        self.assertIn('# TYPE ftpfetcher_files_downloaded_total counter', text_lines)
+        self.assertIn('ftpfetcher_files_downloaded_total 1', text_lines)
+        self.assertIn('# TYPE ftpfetcher_phase_seconds histogram', text_lines)
+        # buckets are cumulative
+        self.assertIn('ftpfetcher_phase_seconds_bucket{phase="list",le="0.1"} 1', text_lines)
+        self.assertIn('ftpfetcher_phase_seconds_bucket{phase="list",le="1.0"} 2', text_lines)
+        self.assertIn('ftpfetcher_phase_seconds_bucket{phase="list",le="+Inf"} 3', text_lines)
+        self.assertIn('ftpfetcher_phase_seconds_count{phase="list"} 3', text_lines)
+
+
+    def test_prometheus_file_and_http(self):
+
+        work_path = tempfile.mkdtemp(prefix='test_metrics_')
+        metrics_registry = MetricsRegistry()
+        metrics_registry.inc_counter('files_downloaded_total')
+        try:
+            metrics_file_name = os.path.join(work_path, 'fetcher.prom')
+            self.assertIsNone(metrics_registry.write_prometheus_file(metrics_file_name))
+            with open(metrics_file_name) as metrics_file:
+                self.assertEqual(metrics_file.read(), metrics_registry.get_prometheus_text())
+
+            self.assertIsNone(metrics_registry.start_http_server(0))
+            server_port = metrics_registry._http_server.server_address[1]
+            with urllib.request.urlopen('http://127.0.0.1:%d/metrics' % server_port) as response:
+                self.assertEqual(response.read().decode('utf-8'), metrics_registry.get_prometheus_text())
+        finally:
+            metrics_registry.stop_http_server()
+            shutil.rmtree(work_path, ignore_errors=True)
+
+
+class MetricsScanTests(object):
+    '''
+    Metrics a walk records, run against one FTP and one SFTP backend by the classes below
+    '''
+
+    def test_walk_metrics(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'x' * 1000)
+        write_remote_file(self.root_path, 'in/a/f2.dat', b'x' * 500)
+
+        metrics_registry = MetricsRegistry()
+        ftp_scanner = self.make_scanner(metrics_registry=metrics_registry)
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertEqual(metrics_registry.get_value('files_downloaded_total'), 2)
+        self.assertEqual(metrics_registry.get_value('bytes_downloaded_total'), 1500)
+        self.assertEqual(metrics_registry.get_value('files_removed_total'), 2)
+        self.assertEqual(metrics_registry.get_value('phase_seconds', {'phase': 'connect'}), 1)
+        self.assertEqual(metrics_registry.get_value('phase_seconds', {'phase': 'list'}), 2)
+        self.assertEqual(metrics_registry.get_value('phase_seconds', {'phase': 'transfer'}), 2)
+        self.assertEqual(metrics_registry.get_value('phase_seconds', {'phase': 'delete'}), 2)
+
+
+class FtplibMetricsScanTest(MetricsScanTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class ParamikoMetricsScanTest(MetricsScanTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.NotifyCommons import FileNotifySink, LandedFileNotifier, MemoryNotifySink
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+class LandedFileNotifierTest(unittest.TestCase):
+    '''
+    Batched landed-file notices, and the buffer file that keeps them while the sink is down
+    '''
+
+    def setUp(self):
+
+        self.work_path = tempfile.mkdtemp(prefix='test_notify_')
+        self.buffer_file_name = os.path.join(self.work_path, 'notify_buffer.jsonl')
+
+
+    def tearDown(self):
+
+        shutil.rmtree(self.work_path, ignore_errors=True)
+
+
+    def make_notifier(self,
+                      notify_sink,
+                      batch_size: int=100):
+
+        return LandedFileNotifier(notify_sink,
+                                  buffer_file_name=self.buffer_file_name,
+                                  batch_size=batch_size,
+                                  batch_interval_seconds=0.05,
+                                  retry_seconds=0.05)
+
+
+    def notify_files(self,
+                     landed_notifier,
+                     file_count: int,
+                     first_nbr: int=0):
+
+        for file_nbr in range(first_nbr, first_nbr + file_count):
+            landed_notifier.notify_landed('127.0.0.1', '/in', '/in/f%d.dat' % file_nbr, '/out/in/f%d.dat' % file_nbr, size=file_nbr)
+
+
+    def get_paths(self,
+                  notices: list):
+
+        return [notice['path'] for notice in notices]
+
+
+    def test_notices_batched(self):
+
+        notify_sink = MemoryNotifySink()
+        landed_notifier = self.make_notifier(notify_sink, batch_size=3)
+        landed_notifier.start()
+        self.notify_files(landed_notifier, 7)
+        landed_notifier.stop()
+
+        self.assertEqual(self.get_paths(notify_sink.notices), ['/in/f%d.dat' % file_nbr for file_nbr in range(7)])
+        self.assertGreaterEqual(notify_sink.batch_count, 3)
+        self.assertEqual(landed_notifier.notices_published, 7)
+        self.assertEqual(notify_sink.notices[0]['event'], 'landed')
+        self.assertFalse(os.path.exists(self.buffer_file_name))
+
+
+    def test_buffered_while_sink_down(self):
+
+        notify_sink = MemoryNotifySink()
+        notify_sink.fail_with = 'Broker down'
+        landed_notifier = self.make_notifier(notify_sink)
+        landed_notifier.start()
+        self.notify_files(landed_notifier, 3)
+        landed_notifier.stop()
+
+        self.assertEqual(notify_sink.notices, [])
+        self.assertEqual(landed_notifier.get_buffered_count(), 3)
+        self.assertGreater(landed_notifier.batches_failed, 0)
+
+        # the next run sends the backlog first, in the order the files landed
+        notify_sink.fail_with = None
+        landed_notifier = self.make_notifier(notify_sink)
+        landed_notifier.start()
+        self.notify_files(landed_notifier, 2, first_nbr=3)
+        landed_notifier.stop()
+
+        self.assertEqual(self.get_paths(notify_sink.notices), ['/in/f%d.dat' % file_nbr for file_nbr in range(5)])
+        self.assertFalse(os.path.exists(self.buffer_file_name))
+
+
+    def test_torn_line_set_aside(self):
+
+        # a crash mid-write leaves a torn line, with more buffered after it on restart
+        with open(self.buffer_file_name, 'w', encoding='utf-8') as buffer_file:
+            buffer_file.write('{"path":"/in/f0.dat"}\n\n{"path":"/in/f1\n{"path":"/in/f2.dat"}\n\n')
+
+        notify_sink = MemoryNotifySink()
+        landed_notifier = self.make_notifier(notify_sink)
+        self.assertEqual(landed_notifier.get_buffered_count(), 3)
+        landed_notifier.start()
+        self.notify_files(landed_notifier, 1, first_nbr=3)
+        landed_notifier.stop()
+
+        self.assertEqual(self.get_paths(notify_sink.notices), ['/in/f0.dat', '/in/f2.dat', '/in/f3.dat'])
+        self.assertFalse(os.path.exists(self.buffer_file_name))
+        with open(self.buffer_file_name + '.bad', 'r', encoding='utf-8') as bad_file:
+            self.assertEqual(bad_file.read(), '{"path":"/in/f1\n')
+
+
+    def test_file_sink(self):
+
+        notify_file_name = os.path.join(self.work_path, 'notices.jsonl')
+        notify_sink = FileNotifySink(notify_file_name)
+
+        self.assertIsNone(notify_sink.publish_batch([{'path': '/in/f1.dat'}, {'path': '/in/f2.dat'}]))
+        self.assertIsNone(notify_sink.publish_batch([{'path': '/in/f3.dat'}]))
+
+        with open(notify_file_name, 'r', encoding='utf-8') as notify_file:
+            notices = [json.loads(notice_line) for notice_line in notify_file]
+        self.assertEqual(self.get_paths(notices), ['/in/f1.dat', '/in/f2.dat', '/in/f3.dat'])
+
+        notify_sink = FileNotifySink(os.path.join(self.work_path, 'missing', 'notices.jsonl'))
+        self.assertIsNotNone(notify_sink.publish_batch([{'path': '/in/f1.dat'}]))
+
+
+class FtplibNotifyTest(ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+    def test_landed_file_notified(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'landed')
+
+        notify_sink = MemoryNotifySink()
+        landed_notifier = LandedFileNotifier(notify_sink,
+                                             buffer_file_name=os.path.join(self.work_path, 'notify_buffer.jsonl'),
+                                             batch_interval_seconds=0.05)
+        landed_notifier.start()
+        ftp_scanner = self.make_scanner(landed_notifier=landed_notifier)
+        self.assertIsNone(self.run_scan(ftp_scanner))
+        landed_notifier.stop()
+
+        notice, = notify_sink.notices
+        self.assertEqual(notice['path'], '/in/f1.dat')
+        self.assertEqual(notice['target'], self.get_local_name('in/f1.dat'))
+        self.assertEqual(notice['size'], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
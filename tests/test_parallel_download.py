@@ -0,0 +1,65 @@
+import os
+import unittest
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+class ParallelDownloadTests(object):
+    '''
+    Walks handing their files to download workers, run against each backend
+    by the classes below
+    '''
+
+    def test_parallel_download(self):
+
+        tree_files = dict(('in/d%d/f%02d.dat' % (file_nbr % 3, file_nbr), os.urandom(file_nbr * 100))
+                          for file_nbr in range(24))
+        for relative_path, data in tree_files.items():
+            write_remote_file(self.root_path, relative_path, data)
+
+        ftp_scanner = self.make_scanner(download_worker_count=4)
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        for relative_path, data in tree_files.items():
+            self.assertEqual(self.read_local_file(relative_path), data)
+            self.assertFalse(os.path.exists(self.get_remote_name(relative_path)))
+        self.assertEqual(ftp_scanner.walk_files_landed, len(tree_files))
+
+
+    def test_parallel_download_keeps_remote(self):
+
+        tree_files = dict(('in/f%02d.dat' % file_nbr, os.urandom(2000)) for file_nbr in range(6))
+        for relative_path, data in tree_files.items():
+            write_remote_file(self.root_path, relative_path, data)
+
+        ftp_scanner = self.make_scanner(download_worker_count=3)
+        self.assertIsNone(self.run_scan(ftp_scanner, remove_remote_file_on_download=False))
+
+        for relative_path, data in tree_files.items():
+            self.assertEqual(self.read_local_file(relative_path), data)
+            self.assertTrue(os.path.exists(self.get_remote_name(relative_path)))
+
+
+class FtplibParallelDownloadTest(ParallelDownloadTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class FtputilParallelDownloadTest(ParallelDownloadTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPUTIL
+
+
+class ParamikoParallelDownloadTest(ParallelDownloadTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+class PysftpParallelDownloadTest(ParallelDownloadTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PYSFTP
+
+
+if __name__ == '__main__':
+    unittest.main()
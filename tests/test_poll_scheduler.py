@@ -0,0 +1,46 @@
+import unittest
+
+from FetcherClasses.Classes.ScheduleCommons import PollScheduler
+
+
+class PollSchedulerTest(unittest.TestCase):
+
+    def test_intervals_follow_what_polls_find(self):
+
+        poll_scheduler = PollScheduler(min_interval_seconds=1, max_interval_seconds=60, initial_interval_seconds=8)
+        poll_scheduler.add_folder('/in', now=0.0)
+
+        self.assertEqual(poll_scheduler.pop_due_folders(now=0.0), ['/in'])
+        # off the timetable until its poll is recorded
+        self.assertEqual(poll_scheduler.pop_due_folders(now=100.0), [])
+
+        self.assertEqual(poll_scheduler.record_poll('/in', 0, now=0.0), 16)
+        self.assertEqual(poll_scheduler.get_sleep_seconds(now=10.0), 6)
+        self.assertEqual(poll_scheduler.pop_due_folders(now=15.9), [])
+        self.assertEqual(poll_scheduler.pop_due_folders(now=16.0), ['/in'])
+
+        # idle polls back off up to the maximum, a fruitful one tightens down to the minimum
+        for _poll_nbr in range(5):
+            interval_seconds = poll_scheduler.record_poll('/in', 0, now=16.0)
+            poll_scheduler.pop_due_folders(now=1000.0)
+        self.assertEqual(interval_seconds, 60)
+        self.assertEqual(poll_scheduler.record_poll('/in', 3, now=16.0), 15)
+        poll_scheduler.pop_due_folders(now=1000.0)
+        self.assertEqual(poll_scheduler.record_poll('/in', 1, now=16.0), 3.75)
+        poll_scheduler.pop_due_folders(now=1000.0)
+        self.assertEqual(poll_scheduler.record_poll('/in', 1, now=16.0), 1)
+        self.assertEqual(poll_scheduler.fruitful_polls_total, 3)
+
+
+    def test_most_overdue_first(self):
+
+        poll_scheduler = PollScheduler(initial_interval_seconds=10)
+        poll_scheduler.add_folder('/a', now=5.0)
+        poll_scheduler.add_folder('/b', now=1.0)
+        poll_scheduler.add_folder('/a', now=0.0)
+
+        self.assertEqual(poll_scheduler.pop_due_folders(now=5.0), ['/b', '/a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
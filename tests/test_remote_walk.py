@@ -0,0 +1,146 @@
+import os
+import unittest
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.ListingCommons import RemoteEntry, RemoteTreeWalker
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+class RemoteWalkTests(object):
+    '''
+    Scanner walks of /in, run against each backend by the classes below
+    '''
+
+    def test_download_and_remove(self):
+
+        tree_files = {'in/f1.dat': os.urandom(70000),
+                      'in/a/f2.dat': b'',
+                      'in/a/b/f3.dat': os.urandom(1000)}
+        for relative_path, data in tree_files.items():
+            write_remote_file(self.root_path, relative_path, data)
+        remote_mtime = os.path.getmtime(self.get_remote_name('in/f1.dat'))
+
+        ftp_scanner = self.make_scanner()
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        for relative_path, data in tree_files.items():
+            self.assertEqual(self.read_local_file(relative_path), data)
+            self.assertFalse(os.path.exists(self.get_remote_name(relative_path)))
+        self.assertEqual(ftp_scanner.walk_files_landed, len(tree_files))
+        # the remote mtime carries over to the landed file, to the
+        # minute at worst, which is all some listings report
+        self.assertAlmostEqual(os.path.getmtime(self.get_local_name('in/f1.dat')), remote_mtime, delta=60)
+
+
+    def test_download_keeps_remote(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'kept')
+
+        ftp_scanner = self.make_scanner()
+        self.assertIsNone(self.run_scan(ftp_scanner, remove_remote_file_on_download=False))
+
+        self.assertEqual(self.read_local_file('in/f1.dat'), b'kept')
+        self.assertTrue(os.path.exists(self.get_remote_name('in/f1.dat')))
+
+
+    def test_each_folder_listed_once(self):
+
+        for relative_path in ('in/f1.dat', 'in/a/f2.dat', 'in/a/b/f3.dat', 'in/c/f4.dat'):
+            write_remote_file(self.root_path, relative_path, b'x')
+
+        ftp_scanner = self.make_scanner()
+        self.assertIsNone(self.run_scan(ftp_scanner, remove_remote_file_on_download=False))
+
+        self.assertEqual(ftp_scanner.walk_folders_visited, 4)
+        self.assertEqual(ftp_scanner.walk_list_calls, 4)
+        self.assertEqual(ftp_scanner.walk_files_visited, 4)
+
+
+    def test_walk_depth_bounded(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'top')
+        write_remote_file(self.root_path, 'in/a/f2.dat', b'one down')
+        write_remote_file(self.root_path, 'in/a/b/f3.dat', b'two down')
+
+        ftp_scanner = self.make_scanner(max_walk_depth=1)
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertEqual(self.read_local_file('in/f1.dat'), b'top')
+        self.assertEqual(self.read_local_file('in/a/f2.dat'), b'one down')
+        self.assertFalse(os.path.exists(self.get_local_name('in/a/b/f3.dat')))
+        self.assertTrue(os.path.exists(self.get_remote_name('in/a/b/f3.dat')))
+
+
+class FtplibRemoteWalkTest(RemoteWalkTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class FtputilRemoteWalkTest(RemoteWalkTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPUTIL
+
+
+class ParamikoRemoteWalkTest(RemoteWalkTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+class PysftpRemoteWalkTest(RemoteWalkTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PYSFTP
+
+
+class RemoteTreeWalkerTest(unittest.TestCase):
+    '''
+    The walk itself, over a tree held in a dict
+    '''
+
+    tree_folders = {'/in': ['/in/a', '/in/b'],
+                    '/in/a': ['/in/a/c'],
+                    '/in/a/c': [],
+                    '/in/b': []}
+
+    def setUp(self):
+
+        self.listed_paths = []
+
+
+    def list_folder(self,
+                    folder_path: str,
+                    folder_entry):
+
+        self.listed_paths.append(folder_path)
+        if folder_path == '/in/b':
+            return None, None, 'listing refused'
+        dir_entries = [RemoteEntry(sub_folder_path.rsplit('/', 1)[-1], sub_folder_path, is_dir=True)
+                       for sub_folder_path in self.tree_folders[folder_path]]
+
+        return dir_entries, [], None
+
+
+    def test_walk_top_down_in_listing_order(self):
+
+        walker = RemoteTreeWalker(self.list_folder)
+
+        walked_paths = [dirpath for dirpath, _dir_entries, _file_entries in walker.walk('/in')]
+
+        # a folder that cannot be listed is left out, and the walk goes on
+        self.assertEqual(walked_paths, ['/in', '/in/a', '/in/a/c'])
+        self.assertEqual(self.listed_paths, ['/in', '/in/a', '/in/a/c', '/in/b'])
+        self.assertEqual((walker.folders_visited, walker.list_calls), (3, 4))
+
+
+    def test_walk_bounded_and_pruned(self):
+
+        walker = RemoteTreeWalker(self.list_folder, max_depth=1)
+        self.assertEqual([dirpath for dirpath, _dir_entries, _file_entries in walker.walk('/in')], ['/in', '/in/a'])
+
+        walker = RemoteTreeWalker(self.list_folder,
+                                  prune_folder_func=lambda folder_path, depth: folder_path == '/in/a')
+        self.assertEqual([dirpath for dirpath, _dir_entries, _file_entries in walker.walk('/in')], ['/in'])
+        self.assertEqual(walker.folders_pruned, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
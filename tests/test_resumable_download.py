@@ -0,0 +1,140 @@
+import os
+import unittest
+from unittest import mock
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.TransportCommons import get_transport_class
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+class ResumableDownloadTests(object):
+    '''
+    Downloads staged in .part files, run against each backend by the classes below
+    '''
+
+    def write_part_file(self,
+                        relative_path: str,
+                        data: bytes):
+
+        part_full_name = self.get_local_name(relative_path)
+        os.makedirs(os.path.dirname(part_full_name), exist_ok=True)
+        with open(part_full_name, 'wb') as part_file:
+            part_file.write(data)
+
+        return part_full_name
+
+
+    def test_resume_from_part_file(self):
+
+        data = os.urandom(200000)
+        write_remote_file(self.root_path, 'in/f1.dat', data)
+        self.write_part_file('in/.f1.dat.part', data[:65000])
+
+        ftp_scanner = self.make_scanner()
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertEqual(self.read_local_file('in/f1.dat'), data)
+        self.assertFalse(os.path.exists(self.get_local_name('in/.f1.dat.part')))
+        download_event, = ftp_scanner.file_event_logger.get_events('download', '/in/f1.dat')
+        # only what the part file lacked crossed the wire
+        self.assertEqual(download_event['bytes'], len(data) - 65000)
+
+
+    def test_stale_part_file_restarted(self):
+
+        data = os.urandom(5000)
+        write_remote_file(self.root_path, 'in/f1.dat', data)
+        # longer than the remote file, so it cannot be a prefix of it
+        self.write_part_file('in/.f1.dat.part', os.urandom(8000))
+
+        ftp_scanner = self.make_scanner()
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertEqual(self.read_local_file('in/f1.dat'), data)
+        download_event, = ftp_scanner.file_event_logger.get_events('download', '/in/f1.dat')
+        self.assertEqual(download_event['bytes'], len(data))
+
+
+    def test_stale_part_file_of_empty_file_removed(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'')
+        self.write_part_file('in/.f1.dat.part', b'left from an earlier version')
+
+        ftp_scanner = self.make_scanner()
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertEqual(self.read_local_file('in/f1.dat'), b'')
+        self.assertFalse(os.path.exists(self.get_local_name('in/.f1.dat.part')))
+        download_event, = ftp_scanner.file_event_logger.get_events('download', '/in/f1.dat')
+        self.assertIsNone(download_event['err_str'])
+        self.assertFalse(os.path.exists(self.get_remote_name('in/f1.dat')))
+
+
+    def test_unknown_size_fetched_in_full(self):
+
+        data = os.urandom(100000)
+        write_remote_file(self.root_path, 'in/f1.dat', data)
+        self.write_part_file('in/.f1.dat.part', data[:1000])
+
+        transport_class = get_transport_class(self.host_type)
+        list_folder = transport_class.list_folder
+        stat_entry = transport_class.stat_entry
+
+        def list_folder_without_sizes(ftp_conn, folder_path):
+            remote_entries = list_folder(ftp_conn, folder_path)
+            for remote_entry in remote_entries:
+                remote_entry.size = None
+            return remote_entries
+
+        def stat_entry_without_size(ftp_conn, entity_path):
+            remote_entry = stat_entry(ftp_conn, entity_path)
+            remote_entry.size = None
+            return remote_entry
+
+        ftp_scanner = self.make_scanner()
+        with mock.patch.object(transport_class, 'list_folder', list_folder_without_sizes), \
+             mock.patch.object(transport_class, 'stat_entry', stat_entry_without_size):
+            self.assertIsNone(self.run_scan(ftp_scanner))
+
+        # with nothing to check the part file against, it is not resumed from
+        self.assertEqual(self.read_local_file('in/f1.dat'), data)
+        download_event, = ftp_scanner.file_event_logger.get_events('download', '/in/f1.dat')
+        self.assertIsNone(download_event['err_str'])
+        self.assertEqual(download_event['bytes'], len(data))
+
+
+    def test_part_named_remote_file_refused(self):
+
+        write_remote_file(self.root_path, 'in/.f1.dat.part', b'staged elsewhere')
+
+        ftp_scanner = self.make_scanner()
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertFalse(os.path.exists(self.get_local_name('in/.f1.dat.part')))
+        self.assertTrue(os.path.exists(self.get_remote_name('in/.f1.dat.part')))
+        download_event, = ftp_scanner.file_event_logger.get_events('download', '/in/.f1.dat.part')
+        self.assertIsNotNone(download_event['err_str'])
+
+
+class FtplibResumableDownloadTest(ResumableDownloadTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class FtputilResumableDownloadTest(ResumableDownloadTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPUTIL
+
+
+class ParamikoResumableDownloadTest(ResumableDownloadTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+class PysftpResumableDownloadTest(ResumableDownloadTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PYSFTP
+
+
+if __name__ == '__main__':
+    unittest.main()
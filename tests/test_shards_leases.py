@@ -0,0 +1,161 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.ListingCommons import RemoteEntry
+from FetcherClasses.Classes.ShardCommons import LeaseStore, ShardAssignment
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+def get_remote_entry(entity_path: str,
+                     size: int=100,
+                     mtime: float=1000.0):
+
+    return RemoteEntry(entity_path.rsplit('/', 1)[-1], entity_path, size=size, mtime=mtime, is_file=True)
+
+
+class ShardLeaseTests(object):
+    '''
+    Several fetchers splitting one host, by shard and by lease, run
+    against each backend by the classes below
+    '''
+
+    def test_leased_file_left_alone(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'leased')
+        lease_file_name = os.path.join(self.work_path, 'leases.db')
+
+        other_store = LeaseStore(lease_file_name, owner_name='other')
+        self.assertIsNone(other_store.open_store())
+        self.assertTrue(other_store.claim_lease('127.0.0.1', '/in/f1.dat'))
+
+        lease_store = LeaseStore(lease_file_name, owner_name='self')
+        self.assertIsNone(lease_store.open_store())
+        ftp_scanner = self.make_scanner(lease_store=lease_store)
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertFalse(os.path.exists(self.get_local_name('in/f1.dat')))
+        self.assertTrue(os.path.exists(self.get_remote_name('in/f1.dat')))
+        self.assertEqual(lease_store.leases_refused, 1)
+
+        # once the other instance lets go, without fetching it, the file is free
+        other_store.release_lease('127.0.0.1', '/in/f1.dat')
+        other_store.close_store()
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertEqual(self.read_local_file('in/f1.dat'), b'leased')
+        self.assertFalse(os.path.exists(self.get_remote_name('in/f1.dat')))
+
+
+    def test_shards_split_files(self):
+
+        entity_paths = ['/in/f%02d.dat' % file_nbr for file_nbr in range(10)]
+        for entity_path in entity_paths:
+            write_remote_file(self.root_path, entity_path[1:], b'sharded')
+
+        # each instance fetches its own shard, the two of them the whole folder
+        for shard_index in range(2):
+            shard_assignment = ShardAssignment(shard_index, 2)
+            ftp_scanner = self.make_scanner(shard_assignment=shard_assignment)
+            self.assertIsNone(self.run_scan(ftp_scanner))
+
+            download_events = ftp_scanner.file_event_logger.get_events('download')
+            self.assertEqual(sorted(download_event['path'] for download_event in download_events),
+                             [entity_path for entity_path in entity_paths if shard_assignment.is_owned(entity_path)])
+
+        self.assertEqual(os.listdir(self.get_remote_name('in')), [])
+
+
+class FtplibShardLeaseTest(ShardLeaseTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class ParamikoShardLeaseTest(ShardLeaseTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+class LeaseStoreTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.work_path = tempfile.mkdtemp(prefix='test_lease_')
+        lease_file_name = os.path.join(self.work_path, 'leases.db')
+        self.lease_stores = [LeaseStore(lease_file_name, owner_name=owner_name) for owner_name in ('one', 'two')]
+        for lease_store in self.lease_stores:
+            self.assertIsNone(lease_store.open_store())
+
+
+    def tearDown(self):
+
+        for lease_store in self.lease_stores:
+            lease_store.close_store()
+        shutil.rmtree(self.work_path, ignore_errors=True)
+
+
+    def test_one_holder_at_a_time(self):
+
+        lease_one, lease_two = self.lease_stores
+        remote_entry = get_remote_entry('/in/f1.dat')
+
+        self.assertTrue(lease_one.claim_lease('h', '/in/f1.dat', remote_entry))
+        self.assertFalse(lease_two.claim_lease('h', '/in/f1.dat', remote_entry))
+        # the holder may claim again, and renew
+        self.assertTrue(lease_one.claim_lease('h', '/in/f1.dat', remote_entry))
+        self.assertTrue(lease_one.renew_lease('h', '/in/f1.dat'))
+        self.assertFalse(lease_two.renew_lease('h', '/in/f1.dat'))
+
+        lease_one.release_lease('h', '/in/f1.dat')
+        self.assertTrue(lease_two.claim_lease('h', '/in/f1.dat', remote_entry))
+
+
+    def test_done_version_not_fetched_again(self):
+
+        lease_one, lease_two = self.lease_stores
+        remote_entry = get_remote_entry('/in/f1.dat')
+
+        self.assertTrue(lease_one.claim_lease('h', '/in/f1.dat', remote_entry))
+        lease_one.release_lease('h', '/in/f1.dat', is_done=True)
+
+        self.assertFalse(lease_two.claim_lease('h', '/in/f1.dat', remote_entry))
+        # a new version of the file, under the same name, is fetched afresh
+        self.assertTrue(lease_two.claim_lease('h', '/in/f1.dat', get_remote_entry('/in/f1.dat', mtime=2000.0)))
+
+
+    def test_lapsed_lease_taken_over(self):
+
+        lease_one, lease_two = self.lease_stores
+        lease_one.lease_seconds = 0.05
+
+        self.assertTrue(lease_one.claim_lease('h', '/in/f1.dat'))
+        time.sleep(0.1)
+        self.assertTrue(lease_two.claim_lease('h', '/in/f1.dat'))
+        # the lease is lost, and a transfer renewing it stops
+        self.assertFalse(lease_one.renew_lease('h', '/in/f1.dat'))
+        lease_one.lease_seconds = 0.0
+        with self.assertRaises(IOError):
+            lease_one.get_renewer('h', '/in/f1.dat')(b'block')
+
+
+class ShardAssignmentTest(unittest.TestCase):
+
+    def test_shards(self):
+
+        shard_assignments = [ShardAssignment(shard_index, 3) for shard_index in range(3)]
+        entity_paths = ['/in/f%02d.dat' % file_nbr for file_nbr in range(30)]
+
+        # every path falls to exactly one instance
+        for entity_path in entity_paths:
+            self.assertEqual(sum(shard_assignment.is_owned(entity_path) for shard_assignment in shard_assignments), 1)
+        self.assertEqual(sorted(sum((shard_assignment.get_owned_keys(['/c', '/a', '/b'])
+                                     for shard_assignment in shard_assignments), [])), ['/a', '/b', '/c'])
+        with self.assertRaises(ValueError):
+            ShardAssignment(3, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.ListingCommons import RemoteEntry
+from FetcherClasses.Classes.SnapshotCommons import RemoteSnapshotStore
+from FetcherClasses.Classes.TransportCommons import get_transport_class
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+def get_remote_entry(entity_path: str,
+                     size: int=100,
+                     mtime: float=1000.0,
+                     is_dir: bool=False):
+
+    return RemoteEntry(entity_path.rsplit('/', 1)[-1], entity_path, size=size, mtime=mtime,
+                       is_dir=is_dir, is_file=not is_dir)
+
+
+class SnapshotScanTests(object):
+    '''
+    Walks against a remote snapshot, run against one FTP and one SFTP
+    backend by the classes below
+    '''
+
+    def backdate_remote_folder(self,
+                               relative_path: str,
+                               age_seconds: float=3600.0):
+
+        os.utime(self.get_remote_name(relative_path), (time.time() - age_seconds, time.time() - age_seconds))
+
+
+    def run_listed_scan(self,
+                        ftp_scanner):
+        '''
+        run_scan, keeping remote files, returning the folders it listed
+        and, in stat_paths, the entries it statted
+        '''
+
+        transport_class = get_transport_class(self.host_type)
+        list_folder = transport_class.list_folder
+        stat_entry = transport_class.stat_entry
+        listed_paths = []
+        self.stat_paths = []
+
+        def recording_list_folder(ftp_conn, folder_path):
+            listed_paths.append(folder_path)
+            return list_folder(ftp_conn, folder_path)
+
+        def recording_stat_entry(ftp_conn, entity_path):
+            self.stat_paths.append(entity_path)
+            return stat_entry(ftp_conn, entity_path)
+
+        with mock.patch.object(transport_class, 'list_folder', recording_list_folder), \
+             mock.patch.object(transport_class, 'stat_entry', recording_stat_entry):
+            self.assertIsNone(self.run_scan(ftp_scanner, remove_remote_file_on_download=False))
+
+        return listed_paths
+
+
+    def test_unchanged_file_not_fetched_again(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'once')
+
+        ftp_scanner = self.make_scanner(snapshot_store=RemoteSnapshotStore())
+        self.assertIsNone(self.run_scan(ftp_scanner, remove_remote_file_on_download=False))
+        with open(self.get_local_name('in/f1.dat'), 'wb') as data_file:
+            data_file.write(b'not to be overwritten')
+        self.assertIsNone(self.run_scan(ftp_scanner, remove_remote_file_on_download=False))
+
+        self.assertEqual(self.read_local_file('in/f1.dat'), b'not to be overwritten')
+        self.assertEqual(len(ftp_scanner.file_event_logger.get_events('download', '/in/f1.dat')), 1)
+
+        # a changed file is fetched again
+        write_remote_file(self.root_path, 'in/f1.dat', b'twice')
+        self.assertIsNone(self.run_scan(ftp_scanner, remove_remote_file_on_download=False))
+        self.assertEqual(self.read_local_file('in/f1.dat'), b'twice')
+
+
+    def test_settled_folder_not_listed(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'one')
+        write_remote_file(self.root_path, 'in/a/f2.dat', b'two')
+        self.backdate_remote_folder('in/a')
+        self.backdate_remote_folder('in')
+
+        ftp_scanner = self.make_scanner(snapshot_store=RemoteSnapshotStore())
+        # landing the files, then finding them unchanged, settles both folders
+        self.assertEqual(sorted(self.run_listed_scan(ftp_scanner)), ['/in', '/in/a'])
+        self.assertEqual(sorted(self.run_listed_scan(ftp_scanner)), ['/in', '/in/a'])
+        self.assertEqual(self.run_listed_scan(ftp_scanner), [])
+
+        # a file new to a sub-folder is still found beneath its settled parent
+        write_remote_file(self.root_path, 'in/a/f3.dat', b'three')
+        self.assertEqual(self.run_listed_scan(ftp_scanner), ['/in/a'])
+        self.assertEqual(self.read_local_file('in/a/f3.dat'), b'three')
+
+
+class FtplibSnapshotScanTest(SnapshotScanTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class ParamikoSnapshotScanTest(SnapshotScanTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+class FtputilSnapshotScanTest(SnapshotScanTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPUTIL
+
+
+    def test_settled_folder_not_listed(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'one')
+        write_remote_file(self.root_path, 'in/a/f2.dat', b'two')
+        self.backdate_remote_folder('in/a')
+        self.backdate_remote_folder('in')
+
+        ftp_scanner = self.make_scanner(snapshot_store=RemoteSnapshotStore())
+        self.assertEqual(sorted(self.run_listed_scan(ftp_scanner)), ['/in', '/in/a'])
+        self.assertEqual(sorted(self.run_listed_scan(ftp_scanner)), ['/in', '/in/a'])
+        # a folder stat would list the parent, so a folder with sub-folders is
+        # listed to find their mtimes, while one without is still skipped
+        self.assertEqual(self.run_listed_scan(ftp_scanner), ['/in'])
+        self.assertEqual(self.stat_paths, [])
+
+        write_remote_file(self.root_path, 'in/a/f3.dat', b'three')
+        self.assertEqual(sorted(self.run_listed_scan(ftp_scanner)), ['/in', '/in/a'])
+        self.assertEqual(self.read_local_file('in/a/f3.dat'), b'three')
+
+
+class FtplibWithoutMlstSnapshotScanTest(FtputilSnapshotScanTest):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+    def make_scanner(self,
+                     **scanner_attrs):
+
+        ftp_scanner = super().make_scanner(**scanner_attrs)
+        borrow_connection = ftp_scanner.borrow_connection
+
+        def borrow_connection_without_mlst(*args, **kwargs):
+            ftp_conn, err_str = borrow_connection(*args, **kwargs)
+            if ftp_conn is not None:
+                ftp_conn.has_mlst = ftp_conn.has_folder_stat = False
+            return ftp_conn, err_str
+
+        ftp_scanner.borrow_connection = borrow_connection_without_mlst
+
+        return ftp_scanner
+
+
+class RemoteSnapshotStoreTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.work_path = tempfile.mkdtemp(prefix='test_snapshot_')
+        self.snapshot_file_name = os.path.join(self.work_path, 'snapshot.json')
+
+
+    def tearDown(self):
+
+        shutil.rmtree(self.work_path, ignore_errors=True)
+
+
+    def test_snapshot_survives_restart(self):
+
+        snapshot_store = RemoteSnapshotStore(self.snapshot_file_name)
+        file_entry = get_remote_entry('/in/f1.dat')
+        self.assertTrue(snapshot_store.is_entry_changed('/in', file_entry))
+        snapshot_store.record_folder('/in', 1000.0, [get_remote_entry('/in/a', is_dir=True)], [file_entry],
+                                     has_pending_entries=False)
+        snapshot_store.record_entry('/in', file_entry)
+        self.assertIsNone(snapshot_store.save_snapshot())
+
+        snapshot_store = RemoteSnapshotStore(self.snapshot_file_name)
+        self.assertIsNone(snapshot_store.load_snapshot())
+        self.assertTrue(snapshot_store.is_folder_unchanged('/in', 1000.0))
+        self.assertFalse(snapshot_store.is_folder_unchanged('/in', 1001.0))
+        self.assertFalse(snapshot_store.is_folder_unchanged('/in', None))
+        self.assertEqual(snapshot_store.get_sub_folder_names('/in'), ['a'])
+        self.assertFalse(snapshot_store.is_entry_changed('/in', file_entry))
+        self.assertTrue(snapshot_store.is_entry_changed('/in', get_remote_entry('/in/f1.dat', size=101)))
+
+
+    def test_recent_or_pending_folder_not_settled(self):
+
+        snapshot_store = RemoteSnapshotStore()
+
+        self.assertFalse(snapshot_store.record_folder('/in', time.time(), [], [], has_pending_entries=False))
+        self.assertFalse(snapshot_store.record_folder('/in', 1000.0, [], [], has_pending_entries=True))
+        self.assertTrue(snapshot_store.record_folder('/in', 1000.0, [], [], has_pending_entries=False))
+
+
+    def test_removed_folder_forgotten(self):
+
+        snapshot_store = RemoteSnapshotStore()
+        snapshot_store.record_folder('/in', 1000.0, [get_remote_entry('/in/a', is_dir=True)], [],
+                                     has_pending_entries=False)
+        snapshot_store.record_folder('/in/a', 1000.0, [], [], has_pending_entries=False)
+        snapshot_store.record_entry('/in/a', get_remote_entry('/in/a/f1.dat'))
+
+        snapshot_store.record_folder('/in', 1100.0, [], [], has_pending_entries=False)
+
+        self.assertFalse(snapshot_store.is_folder_unchanged('/in/a', 1000.0))
+        self.assertTrue(snapshot_store.is_entry_changed('/in/a', get_remote_entry('/in/a/f1.dat')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import unittest
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.ListingCommons import FileStabilityPolicy, RemoteEntry
+from tests.ScannerTestCase import ScannerTestCase, write_remote_file
+
+
+def get_remote_entry(entity_path: str,
+                     size: int=100,
+                     mtime: float=1000.0):
+
+    return RemoteEntry(entity_path.rsplit('/', 1)[-1], entity_path, size=size, mtime=mtime, is_file=True)
+
+
+class StableFileTests(object):
+    '''
+    Walks deferring files their writers may not have finished, run against
+    one FTP and one SFTP backend by the classes below
+    '''
+
+    def test_marker_gating(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'complete')
+
+        ftp_scanner = self.make_scanner(stability_policy=FileStabilityPolicy(stable_listing_count=1, marker_suffix='.done'))
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertFalse(os.path.exists(self.get_local_name('in/f1.dat')))
+        self.assertTrue(os.path.exists(self.get_remote_name('in/f1.dat')))
+        self.assertEqual(ftp_scanner.walk_files_newly_deferred, 1)
+
+        write_remote_file(self.root_path, 'in/f1.dat.done', b'')
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        # the marker itself is never landed, and goes once its file has
+        self.assertEqual(self.read_local_file('in/f1.dat'), b'complete')
+        self.assertFalse(os.path.exists(self.get_local_name('in/f1.dat.done')))
+        self.assertFalse(os.path.exists(self.get_remote_name('in/f1.dat')))
+        self.assertFalse(os.path.exists(self.get_remote_name('in/f1.dat.done')))
+
+
+    def test_stability_gating(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'settled')
+        write_remote_file(self.root_path, 'in/f2.dat', b'fresh', age_seconds=0)
+
+        ftp_scanner = self.make_scanner(stability_policy=FileStabilityPolicy(stable_listing_count=2, min_age_seconds=600))
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertFalse(os.path.exists(self.get_local_name('in/f1.dat')))
+        self.assertEqual(ftp_scanner.walk_files_newly_deferred, 2)
+
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        # seen unchanged twice, but only the older file is old enough
+        self.assertEqual(self.read_local_file('in/f1.dat'), b'settled')
+        self.assertFalse(os.path.exists(self.get_local_name('in/f2.dat')))
+        self.assertTrue(os.path.exists(self.get_remote_name('in/f2.dat')))
+        # a file deferred again is not counted as newly found again
+        self.assertEqual(ftp_scanner.walk_files_newly_deferred, 2)
+
+
+    def test_default_policy_fetches_at_once(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'at once', age_seconds=0)
+
+        ftp_scanner = self.make_scanner()
+        self.assertIsNone(self.run_scan(ftp_scanner))
+
+        self.assertEqual(self.read_local_file('in/f1.dat'), b'at once')
+
+
+class FtplibStableFileTest(StableFileTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class ParamikoStableFileTest(StableFileTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+class FileStabilityPolicyTest(unittest.TestCase):
+
+    def test_marker_and_listing_count(self):
+
+        stability_policy = FileStabilityPolicy(stable_listing_count=2, marker_suffix='.ok')
+        remote_entry = get_remote_entry('/in/f1.dat')
+
+        self.assertEqual(stability_policy.is_file_stable(remote_entry, sibling_names={'f1.dat'}),
+                         (False, 'marker not yet present'))
+        self.assertEqual(stability_policy.is_file_stable(get_remote_entry('/in/f1.dat.ok'), sibling_names={'f1.dat.ok'}),
+                         (False, 'marker file'))
+        self.assertEqual(stability_policy.is_file_stable(remote_entry, sibling_names={'f1.dat', 'f1.dat.ok'}),
+                         (True, None))
+        # a change of size starts the count over
+        is_stable, _reason = stability_policy.is_file_stable(get_remote_entry('/in/f1.dat', size=200),
+                                                             sibling_names={'f1.dat', 'f1.dat.ok'})
+        self.assertFalse(is_stable)
+
+
+if __name__ == '__main__':
+    unittest.main()
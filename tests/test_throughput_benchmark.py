@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Benchmarks.ThroughputBenchmark import count_landed_files, get_workload_files, make_workload_tree, run_scanner
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from tests.ScannerTestCase import ScannerTestCase
+
+
+class WorkloadTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.work_path = tempfile.mkdtemp(prefix='test_bench_')
+
+
+    def tearDown(self):
+
+        shutil.rmtree(self.work_path, ignore_errors=True)
+
+
+    def test_workloads_reproducible(self):
+
+        for workload_name in ('tiny', 'huge', 'deep', 'wide'):
+            self.assertEqual(get_workload_files(workload_name, 0.01), get_workload_files(workload_name, 0.01))
+        with self.assertRaises(ValueError):
+            get_workload_files('none')
+
+
+    def test_count_landed_files(self):
+
+        workload_files = get_workload_files('deep', 0.05)
+        file_count, total_bytes = make_workload_tree(self.work_path, 'deep', 0.05)
+        self.assertEqual(file_count, len(workload_files))
+
+        self.assertEqual(count_landed_files(self.work_path, workload_files),
+                         (file_count, total_bytes, [], [], []))
+
+        missing_path, short_path = workload_files[0][0], workload_files[1][0]
+        os.remove(os.path.join(self.work_path, missing_path))
+        with open(os.path.join(self.work_path, short_path), 'r+b') as data_file:
+            data_file.truncate(1)
+        with open(os.path.join(self.work_path, 'deep', 'stray.log'), 'wb') as data_file:
+            data_file.write(b'not part of the workload')
+
+        files_downloaded, _bytes_downloaded, missing_paths, wrong_size_paths, unexpected_paths = \
+            count_landed_files(self.work_path, workload_files)
+        self.assertEqual(files_downloaded, file_count - 2)
+        self.assertEqual(missing_paths, [missing_path])
+        self.assertEqual(wrong_size_paths, [short_path])
+        self.assertEqual(unexpected_paths, ['deep/stray.log'])
+
+
+class FtplibRunScannerTest(ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+    def test_run_scanner_lands_workload(self):
+
+        workload_files = get_workload_files('tiny', 0.01)
+        make_workload_tree(self.root_path, 'tiny', 0.01)
+
+        scan_result = run_scanner('ftplib', self.server_port, None, 'tiny', self.output_path, 2)
+
+        self.assertIsNone(scan_result['err_str'])
+        self.assertEqual(count_landed_files(self.output_path, workload_files)[2:], ([], [], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import logging
+import unittest
+
+from FetcherClasses.Classes.TransferCommons import TransferProgress
+
+
+class TransferProgressTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.logger = logging.getLogger('test_transfer_progress')
+        self.logger.setLevel(logging.INFO)
+
+
+    def feed_blocks(self,
+                    transfer_progress,
+                    block_size: int,
+                    block_count: int):
+
+        with self.assertLogs(self.logger, logging.INFO) as logs:
+            self.logger.info('start')
+            for _block_nbr in range(block_count):
+                transfer_progress.add_data_block(b'x' * block_size)
+
+        return logs.output[1:]
+
+
+    def test_reports_by_percent_steps(self):
+
+        transfer_progress = TransferProgress('/in/f1.dat', 1000 * 1000, report_prcnt_amount=25,
+                                             report_interval_seconds=3600, logger=self.logger)
+        transfer_progress.check_interval_bytes = 1
+
+        report_lines = self.feed_blocks(transfer_progress, 1000, 1000)
+
+        # the first block, then one report per 25 percent rather than per block
+        self.assertEqual(len(report_lines), 5)
+        self.assertIn('pct transferred: 100', report_lines[-1])
+
+
+    def test_resumed_transfer_counts_from_offset(self):
+
+        transfer_progress = TransferProgress('/in/f1.dat', 10000, bytes_start=6000, report_prcnt_amount=50,
+                                             report_interval_seconds=3600, logger=self.logger)
+
+        report_lines = self.feed_blocks(transfer_progress, 1000, 4)
+
+        self.assertEqual(transfer_progress.bytes_sofar, 10000)
+        self.assertIn('Bytes xfered: 10000 of total bytes: 10000', report_lines[-1])
+
+
+    def test_unknown_total_reports_by_clock(self):
+
+        transfer_progress = TransferProgress('/in/f1.dat', None, report_interval_seconds=0, logger=self.logger)
+        transfer_progress.check_interval_bytes = 1000
+
+        report_lines = self.feed_blocks(transfer_progress, 1000, 3)
+
+        self.assertEqual(len(report_lines), 3)
+        self.assertIn('of total bytes: unknown', report_lines[-1])
+
+        transfer_progress = TransferProgress('/in/f1.dat', None, report_interval_seconds=3600, logger=self.logger)
+        self.assertEqual(self.feed_blocks(transfer_progress, 1000, 3), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import unittest
+
+from Benchmarks.TransferTuningBenchmark import ftp_variants, sftp_variants
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from tests.ScannerTestCase import ScannerTestCase, sftp_host_types, write_remote_file
+
+
+class TransferTuningTests(object):
+    '''
+    Downloads under each read-ahead and block size setting the tuning
+    benchmark measures, run against each backend by the classes below
+    '''
+
+    def test_variants_land_same_file(self):
+
+        data = os.urandom(300000)
+        write_remote_file(self.root_path, 'in/f1.dat', data)
+
+        transfer_variants = sftp_variants if self.host_type in sftp_host_types else ftp_variants
+        for variant_label, scanner_attrs in transfer_variants:
+            with self.subTest(variant_label):
+                ftp_scanner = self.make_scanner(**scanner_attrs)
+                ftp_conn, err_str = ftp_scanner.borrow_connection()
+                self.assertIsNone(err_str)
+                try:
+                    self.assertEqual(ftp_conn.block_size,
+                                     scanner_attrs.get('ftp_block_size', ftp_scanner.sftp_block_size))
+                finally:
+                    ftp_scanner.return_connection(ftp_conn)
+
+                self.assertIsNone(self.run_scan(ftp_scanner, remove_remote_file_on_download=False))
+                self.assertEqual(self.read_local_file('in/f1.dat'), data)
+                os.remove(self.get_local_name('in/f1.dat'))
+
+
+class FtplibTransferTuningTest(TransferTuningTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+class FtputilTransferTuningTest(TransferTuningTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPUTIL
+
+
+class ParamikoTransferTuningTest(TransferTuningTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+class PysftpTransferTuningTest(TransferTuningTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PYSFTP
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import os
+import posixpath
+import unittest
+
+from FetcherClasses.Classes.EnumCommons import FtpLibNameEnum
+from FetcherClasses.Classes.TransportCommons import FtplibTransport, get_transport_class
+from tests.ScannerTestCase import ScannerTestCase, password, username, write_remote_file
+
+
+class TransportTests(object):
+    '''
+    The RemoteTransport operations, run against each backend by the classes below
+    '''
+
+    def setUp(self):
+
+        super().setUp()
+
+        transport_class = get_transport_class(self.host_type)
+        if transport_class.is_sftp:
+            self.ftp_conn = transport_class.connect('127.0.0.1', self.server_port, username, password,
+                                                    known_hosts_file=self.server.known_hosts_file)
+        else:
+            self.ftp_conn = transport_class.connect('127.0.0.1', self.server_port, username, password)
+
+
+    def tearDown(self):
+
+        self.ftp_conn.close_session()
+        super().tearDown()
+
+
+    def test_list_folder(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'x' * 1234)
+        write_remote_file(self.root_path, 'in/a/f2.dat', b'')
+        remote_mtime = os.path.getmtime(self.get_remote_name('in/f1.dat'))
+
+        remote_entries = dict((remote_entry.entity_name, remote_entry) for remote_entry in self.ftp_conn.list_folder('/in'))
+
+        self.assertEqual(sorted(remote_entries), ['a', 'f1.dat'])
+        self.assertTrue(remote_entries['a'].is_dir)
+        self.assertTrue(remote_entries['f1.dat'].is_file)
+        self.assertEqual(remote_entries['f1.dat'].entity_path, '/in/f1.dat')
+        self.assertEqual(remote_entries['f1.dat'].size, 1234)
+        self.assertAlmostEqual(remote_entries['f1.dat'].mtime, remote_mtime, delta=60)
+
+
+    def test_stat_entry(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'x' * 99)
+
+        remote_entry = self.ftp_conn.stat_entry('/in/f1.dat')
+
+        self.assertTrue(remote_entry.is_file)
+        self.assertEqual(remote_entry.size, 99)
+        self.assertTrue(self.ftp_conn.exists('/in/f1.dat'))
+        self.assertFalse(self.ftp_conn.exists('/in/missing.dat'))
+
+
+    def test_open_read_at_offset(self):
+
+        data = os.urandom(100000)
+        write_remote_file(self.root_path, 'in/f1.dat', data)
+
+        for offset in (0, 1, 65536, len(data)):
+            remote_file = self.ftp_conn.open_read('/in/f1.dat', offset=offset, file_size=len(data))
+            try:
+                data_blocks = []
+                while True:
+                    data_block = remote_file.read(self.ftp_conn.block_size)
+                    if not data_block:
+                        break
+                    data_blocks.append(data_block)
+            finally:
+                remote_file.close()
+            self.assertEqual(b''.join(data_blocks), data[offset:])
+
+
+    def test_remove(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'gone')
+
+        self.ftp_conn.remove('/in/f1.dat')
+        self.ftp_conn.clear_cache()
+
+        self.assertFalse(os.path.exists(self.get_remote_name('in/f1.dat')))
+        self.assertFalse(self.ftp_conn.exists('/in/f1.dat'))
+
+
+    def test_keep_alive(self):
+
+        self.ftp_conn.keep_alive()
+
+
+class FtplibTransportTest(TransportTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPLIB
+
+
+    def test_list_folder_without_mlsd(self):
+
+        write_remote_file(self.root_path, 'in/f1.dat', b'x' * 1234)
+        write_remote_file(self.root_path, 'in/a/f2.dat', b'')
+
+        self.ftp_conn.has_mlst = False
+        remote_entries = dict((remote_entry.entity_name, remote_entry) for remote_entry in self.ftp_conn.list_folder('/in'))
+
+        self.assertEqual(sorted(remote_entries), ['a', 'f1.dat'])
+        self.assertTrue(remote_entries['a'].is_dir)
+        self.assertEqual(remote_entries['f1.dat'].size, 1234)
+        self.assertEqual(self.ftp_conn.stat_entry('/in/f1.dat').size, 1234)
+
+
+class FtputilTransportTest(TransportTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.FTPUTIL
+
+
+class ParamikoTransportTest(TransportTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PARAMIKO
+
+
+class PysftpTransportTest(TransportTests, ScannerTestCase):
+
+    host_type = FtpLibNameEnum.PYSFTP
+
+
+class ListLineTest(unittest.TestCase):
+    '''
+    LIST lines of servers without MLSD, parsed without a connection
+    '''
+
+    def setUp(self):
+
+        self.ftp_transport = FtplibTransport.__new__(FtplibTransport)
+
+
+    def get_entry(self,
+                  list_line: str):
+
+        return self.ftp_transport._get_entry_from_list_line(list_line, '/in')
+
+
+    def test_unix_lines(self):
+
+        remote_entry = self.get_entry('-rw-r--r--    1 ftp      ftp          1234 Jan 15 03:45 report 1.csv')
+        self.assertEqual((remote_entry.entity_name, remote_entry.size, remote_entry.is_file), ('report 1.csv', 1234, True))
+        self.assertEqual(remote_entry.entity_path, posixpath.join('/in', 'report 1.csv'))
+
+        remote_entry = self.get_entry('drwxr-xr-x+   2 ftp ftp 4096 Mar  3  2021 archive')
+        self.assertTrue(remote_entry.is_dir)
+
+        # no group column
+        remote_entry = self.get_entry('-rw-r--r--.  1 owner  77 Dec 31 23:59 f.dat')
+        self.assertEqual((remote_entry.entity_name, remote_entry.size), ('f.dat', 77))
+
+        # a device shows "major, minor" in place of a size
+        remote_entry = self.get_entry('crw-rw-rw-   1 root root 1, 3 Jan  1  2020 null')
+        self.assertEqual(remote_entry.entity_name, 'null')
+        self.assertIsNone(remote_entry.size)
+        self.assertFalse(remote_entry.is_file)
+
+
+    def test_dos_lines(self):
+
+        remote_entry = self.get_entry('01-15-21  03:45PM                 1234 report.csv')
+        self.assertEqual((remote_entry.entity_name, remote_entry.size, remote_entry.is_file), ('report.csv', 1234, True))
+
+        remote_entry = self.get_entry('01-15-2021  15:45       <DIR>          reports')
+        self.assertEqual(remote_entry.entity_name, 'reports')
+        self.assertTrue(remote_entry.is_dir)
+
+
+    def test_unparsed_lines(self):
+
+        self.assertIsNone(self.get_entry('total 12'))
+        self.assertIsNone(self.get_entry('not a listing line'))
+
+
+if __name__ == '__main__':
+    unittest.main()